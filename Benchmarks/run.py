@@ -0,0 +1,176 @@
+# Benchmark suite, run from the repository root:
+#   python -m Benchmarks.run                        time every case and write Benchmarks/latest.json (not tracked)
+#   python -m Benchmarks.run --baseline FILE        also compare against a stored run (exit code 1 on regressions)
+#   python -m Benchmarks.run --kinds square sparse --sizes 20 80 --solver cbc
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from statistics import median
+from time import perf_counter
+
+import numpy
+from numpy.random import default_rng
+from pandas import DataFrame, Series
+
+from optikwh.backends import SOLVERS
+from optikwh.timing import record
+from utils import Transportation, GAZETTEER, FIGURE_MEMO
+from Pages.cities import make_cities_page
+from Pages.plants import make_plants_page
+from Pages.map import _make_globe
+
+HERE = os.path.dirname( os.path.abspath( __file__ ) )
+KINDS = [ 'square', 'tall', 'wide', 'sparse' ]
+SIZES = [ 10, 50, 100 ]
+
+# /----------------| Instances |----------------\
+def _names( count: int, offset: int = 0 ):
+    # Real places first so the globe has something to draw, then numbered ones
+    known = list( GAZETTEER.names )
+    return [
+        known[ offset + i ] if offset + i < len( known ) else f'Node {offset + i + 1}'
+        for i in range( count )
+    ]
+
+def make_instance( kind: str, size: int, seed: int = 0 ):
+    # Same kind, size and seed always give the same problem
+    rng = default_rng([ seed, KINDS.index( kind ), size ])
+    plants, cities = { 'square': ( size, size ), 'tall': ( 4 * size, size ), 'wide': ( size, 4 * size ), 'sparse': ( size, size ) }[ kind ]
+    costs = rng.uniform( 1, 20, ( plants, cities ) ).round( 2 )
+    if kind == 'sparse':
+        # About 80% of the routes missing, but every city keeps at least one
+        missing = rng.random(( plants, cities )) < 0.8
+        missing[ rng.integers( 0, plants, cities ), numpy.arange( cities ) ] = False
+        costs[ missing ] = numpy.nan
+    requirements = rng.integers( 10, 100, cities ).astype( float )
+    supply = rng.uniform( 0.5, 1.5, plants )
+    # Every plant that reaches a city shares its requirement, so sparse instances stay feasible
+    supply = ( supply / supply.sum() * requirements.sum() * 1.2 ).round( 0 ) + 1
+    if kind == 'sparse':
+        reach = numpy.isfinite( costs )
+        supply = supply + ( reach * requirements ).max( axis = 1 )
+
+    plant_names = _names( plants )
+    city_names = _names( cities, plants )
+    return (
+        DataFrame( costs, index=plant_names, columns=city_names ),
+        Series( supply, index=plant_names ),
+        Series( requirements, index=city_names )
+    )
+
+# /----------------| Measurements |----------------\
+def _solve( transportation: Transportation ):
+    with record() as timings:
+        transportation.touch()
+        transportation.solution = None
+        start = perf_counter()
+        transportation.solve()
+        timings['total'] = perf_counter() - start
+    return timings
+
+def _timed( fn ):
+    def run( transportation: Transportation ):
+        # Memoized figures would turn every repeat after the first into a lookup
+        FIGURE_MEMO.clear()
+        start = perf_counter()
+        fn( transportation )
+        return { 'total': perf_counter() - start }
+    return run
+
+STEPS = {
+    'solve': _solve,
+    'to_html': _timed( lambda transportation: transportation.to_html() ),
+    'cities_page': _timed( make_cities_page ),
+    'plants_page': _timed( make_plants_page ),
+    'globe': _timed( _make_globe )
+}
+
+def run_case( kind: str, size: int, solver: str, repeats: int, seed: int ):
+    costs, supply, requirements = make_instance( kind, size, seed )
+    # No solution cache, so every repeat really solves
+    transportation = Transportation( costs, supply, requirements, solver, cache = None )
+    result = { 'case': f'{ kind }-{ size }', 'shape': list( costs.shape ), 'status': transportation.status, 'steps': {} }
+
+    for name, step in STEPS.items():
+        runs = [ step( transportation ) for _ in range( repeats ) ]
+        timings = { key: median( run.get( key, 0.0 ) for run in runs ) for key in runs[0] }
+        # Peak memory comes from one extra run, since tracing allocations slows everything down
+        tracemalloc.start()
+        step( transportation )
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result['steps'][ name ] = { 'seconds': timings, 'peak_bytes': peak }
+    return result
+
+# /----------------| Comparison |----------------\
+def compare( results: dict, baseline: dict, threshold: float ):
+    # Rows of ( case, step, measure, baseline, current, ratio ) plus whether any ratio exceeds the threshold
+    old = { case['case']: case for case in baseline['results'] }
+    rows, regressed = [], False
+    for case in results['results']:
+        if case['case'] not in old: continue
+        for step, values in case['steps'].items():
+            before = old[ case['case'] ]['steps'].get( step )
+            if before is None: continue
+            measures = [ ( f'seconds.{ key }', value, before['seconds'].get( key ) ) for key, value in values['seconds'].items() ]
+            measures.append(( 'peak_bytes', values['peak_bytes'], before['peak_bytes'] ))
+            for measure, current, previous in measures:
+                if not previous: continue
+                ratio = current / previous
+                # Tiny timings are mostly noise
+                noisy = measure.startswith( 'seconds' ) and max( current, previous ) < 1e-3
+                worse = ratio > threshold and not noisy
+                regressed |= worse
+                rows.append(( case['case'], step, measure, previous, current, ratio, worse ))
+    return rows, regressed
+
+def print_comparison( rows: list, stream = sys.stdout ):
+    for case, step, measure, previous, current, ratio, worse in rows:
+        flag = '  <-- slower' if worse else ''
+        stream.write( f'{ case:<14}{ step:<13}{ measure:<20}{ previous:>14.6g}{ current:>14.6g}{ ratio:>8.2f}x{ flag }\n' )
+
+# /----------------| Command line |----------------\
+def main( argv: list = None ):
+    parser = ArgumentParser( prog='python -m Benchmarks.run', description='Time solving and page generation on seeded random instances.' )
+    parser.add_argument( '--kinds', nargs='+', choices=KINDS, default=KINDS )
+    parser.add_argument( '--sizes', nargs='+', type=int, default=SIZES )
+    parser.add_argument( '--solver', choices=sorted( SOLVERS ), default='simplex' )
+    parser.add_argument( '--repeats', type=int, default=3 )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '-o', '--output', default=os.path.join( HERE, 'latest.json' ) )
+    parser.add_argument( '--baseline', help='JSON file of an earlier run to compare against' )
+    parser.add_argument( '--threshold', type=float, default=1.25, help='ratio over the baseline reported as a regression' )
+    args = parser.parse_args( argv )
+
+    results = {
+        'created': datetime.now( timezone.utc ).isoformat( timespec='seconds' ),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.platform(),
+        'solver': args.solver,
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'results': []
+    }
+    for kind in args.kinds:
+        for size in args.sizes:
+            case = run_case( kind, size, args.solver, args.repeats, args.seed )
+            results['results'].append( case )
+            steps = '  '.join( f'{ name } { values["seconds"]["total"] * 1000:.1f} ms' for name, values in case['steps'].items() )
+            sys.stderr.write( f'{ case["case"]:<14}{ steps }\n' )
+
+    with open( args.output, 'w' ) as file: json.dump( results, file, indent=2 )
+
+    if args.baseline:
+        with open( args.baseline ) as file: baseline = json.load( file )
+        rows, regressed = compare( results, baseline, args.threshold )
+        print_comparison( rows )
+        return 1 if regressed else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit( main() )
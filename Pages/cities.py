@@ -1,18 +1,21 @@
-from dash import Dash, Input, Output, html, dcc, no_update, ALL
+from dash import Dash, Input, Output, State, html, dcc, no_update, ALL
 import dash_bootstrap_components as dbc
 
 import plotly.express as px
-from utils import Transportation, get_max, calculate_energy_received
+import plotly.graph_objects as go
+from utils import Transportation, Sessions, get_max, calculate_energy_received, calculate_money_spent, calculate_average_cost, FIGURE_MEMO, MAX_PIES, no_plan_heading
 from numpy import sum
 
 # /----------------| Utils. content |----------------\
 def _city_heading( transportation: Transportation ):
-    spent_by_city = sum( transportation.costs.values * transportation.supply, axis = 0 ) 
-    taxes_by_city = sum( transportation.costs.values, axis = 0 ) / len( transportation.plant_supply )
+    # Infeasible or rejected models, and models still solving after a shape edit, have no plan to describe
+    if not transportation.has_plan(): return no_plan_heading( 'City results', 'city-total-cost-plot' )
+    spent_by_city = calculate_money_spent( transportation.supply, transportation.costs.values ) 
+    taxes_by_city = calculate_average_cost( transportation.costs.values, axis = 0 )
     reqs_by_city = transportation.city_requirements.values
 
     spender = get_max( spent_by_city, transportation.city_requirements.index )
-    spent_prop = spender[1] * 100 / transportation.problem.objective.value()
+    spent_prop = spender[1] * 100 / transportation.objective
     taxed = get_max( taxes_by_city, transportation.city_requirements.index )
     req = get_max( reqs_by_city, transportation.city_requirements.index )
     req_prop = req[1] * 100 / sum(transportation.city_requirements.values)
@@ -51,6 +54,8 @@ def _city_heading( transportation: Transportation ):
     ], style={ 'margin':'32px' } )
 
 def _city_content( transportation: Transportation ):
+    if len( transportation.city_requirements ) > MAX_PIES:
+        return html.Div( dcc.Graph( id='energy-received-combined' ), style={'margin': '32px'} )
     cards = [ 
         dbc.Col([ dbc.Card([ dcc.Graph(
             id={ 'type': 'energy-received-plot', 'index': i }) 
@@ -60,7 +65,7 @@ def _city_content( transportation: Transportation ):
     return html.Div(rows, style={'margin': '32px'})
 
 def _city_cost_plot( transportation: Transportation, template: str ):
-    costs = sum( transportation.costs.values * transportation.supply, axis = 0 )
+    costs = calculate_money_spent( transportation.supply, transportation.costs.values )
     fig = px.bar(
         x = costs,
         y = transportation.city_requirements.index,
@@ -71,41 +76,84 @@ def _city_cost_plot( transportation: Transportation, template: str ):
     fig.update_layout(font={'family': 'Nunito Sans', 'color': 'black'})
     return fig
 
+def _city_pies( transportation: Transportation ):
+    energy_received_percentage = calculate_energy_received( transportation.supply, transportation.city_requirements.values )
+    figures = [
+        px.pie(
+            values=energy_received_percentage[ idx ], 
+            names=[ plant for plant in transportation.plant_supply.index ], 
+            title=f'{ city }: Percentage of requirement satisfied',
+            hole=0.4
+        ) for idx, city in enumerate(transportation.city_requirements.index)
+    ]
+    for fig in figures:
+        fig.update_layout( font = { 'family': 'Nunito Sans', 'color': 'black' })
+    return figures
+
+def _city_supply_plot( transportation: Transportation, template: str ):
+    # Every city as one stacked bar of the share of its requirement each plant satisfied
+    energy_received_percentage = calculate_energy_received( transportation.supply, transportation.city_requirements.values )
+    fig = go.Figure(
+        [
+            go.Bar( 
+                x=energy_received_percentage[ :, idx ], 
+                y=transportation.city_requirements.index, 
+                name=str( plant ), 
+                orientation='h' 
+            ) for idx, plant in enumerate(transportation.plant_supply.index)
+        ],
+        layout = go.Layout( 
+            barmode='stack', 
+            title='Percentage of requirement satisfied by plant', 
+            template=template,
+            height=max( 400, 24 * len( transportation.city_requirements ) )
+        )
+    )
+    fig.update_layout( font = { 'family': 'Nunito Sans', 'color': 'black' })
+    return fig
+
 # /----------------| Cities page generator |----------------\
 def make_cities_page( transportation: Transportation ):
     return html.Div( [ 
-        _city_heading( transportation ),
-        _city_content( transportation )
-    ], id = 'city-plots' )
+        FIGURE_MEMO.get( transportation, 'city-heading', _city_heading )
+    ] + ( [ _city_content( transportation ) ] if transportation.has_plan() else [] ), id = 'city-plots' )
 
-def load_cities_callbacks( app: Dash, transportation: Transportation, template: str ):
+def load_cities_callbacks( app: Dash, sessions: Sessions, template: str ):
 
     # //----------------| City tab main plot |----------------\\
     @app.callback(
         Output( 'city-total-cost-plot', 'figure' ),
-        [ Input('url', 'pathname') ]
+        [ Input('url', 'pathname') ],
+        State('session-id', 'data')
     )
-    def gen_cities_costs_plot( pathname ):
-        if pathname == '/cities': return _city_cost_plot( transportation, template )
-        return no_update
+    def gen_cities_costs_plot( pathname, session ):
+        if pathname != '/cities': return no_update
+        transportation = sessions.load( session )
+        # The heading shows no plan; its graph stays empty
+        if not transportation.has_plan(): return no_update
+        return FIGURE_MEMO.get( transportation, 'city-cost-plot', _city_cost_plot, template )
 
     # //----------------| City tab plots |----------------\\
     @app.callback(
         Output( {'type':'energy-received-plot', 'index':ALL }, 'figure' ),
-        [ Input('url', 'pathname') ]
+        [ Input('url', 'pathname') ],
+        State('session-id', 'data')
+    )
+    def gen_energy_received_plot( pathname, session ):
+        if pathname != '/cities': return no_update
+        transportation = sessions.load( session )
+        # Nothing to fill when the page shows the combined figure or no plan
+        if len( transportation.city_requirements ) > MAX_PIES or not transportation.has_plan(): return no_update
+        return FIGURE_MEMO.get( transportation, 'city-pies', _city_pies )
+
+    # //----------------| City tab combined plot |----------------\\
+    @app.callback(
+        Output( 'energy-received-combined', 'figure' ),
+        [ Input('url', 'pathname') ],
+        State('session-id', 'data')
     )
-    def gen_energy_received_plot( pathname ):
-        if pathname == '/cities':
-            energy_received_percentage = calculate_energy_received( transportation.supply, transportation.city_requirements.values )
-            figures = [
-                px.pie(
-                    values=energy_received_percentage[ idx ], 
-                    names=[ plant for plant in transportation.plant_supply.index ], 
-                    title=f'{ city }: Percentage of requirement satisfied',
-                    hole=0.4
-                ) for idx, city in enumerate(transportation.city_requirements.index)
-            ]
-            for fig in figures:
-                fig.update_layout( font = { 'family': 'Nunito Sans', 'color': 'black' })
-            return figures
-        return no_update
\ No newline at end of file
+    def gen_energy_received_combined( pathname, session ):
+        if pathname != '/cities': return no_update
+        transportation = sessions.load( session )
+        if not transportation.has_plan(): return no_update
+        return FIGURE_MEMO.get( transportation, 'city-supply-plot', _city_supply_plot, template )
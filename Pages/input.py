@@ -2,7 +2,13 @@ from dash import Dash, Input, Output, State, dcc, html, callback_context, no_upd
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 
-from utils import Transportation, save_uploaded_file
+from utils import Transportation, Sessions, solve_job, needs_job, FIGURE_MEMO, SCHEDULER
+from optikwh.heuristics import gap
+from optikwh.solution import NOT_SOLVED
+from optikwh.io import MAX_UPLOAD_BYTES
+from optikwh.backends import LIMITS
+from optikwh.jobs import JobManager, RUNNING, QUEUED, DONE, FAILED, CANCELLED
+from optikwh.metrics import UPLOADS, UPLOAD_BYTES
 from json import loads
 
 # /----------------| Utils. buttons |----------------\
@@ -52,110 +58,253 @@ def make_input_page( transportation: Transportation ):
             id = 'output-table' 
         )
         ] + data_input + [ 
+            dbc.Switch( id='balance-switch', label='Allow unmet requirements at a penalty cost', value=transportation.balance, className='mb-3' ),
+            dbc.Switch( id='fixed-switch', label='Charge a fixed cost for every plant that ships', value=transportation.fixed_costs is not None, className='mb-3' ),
+            dcc.Store( id='grid-edit' ),
+            dcc.Store( id='problem-version', data=transportation.version ),
+            dcc.Store( id='solve-job' ),
+            dcc.Interval( id='job-poll', interval=1000, disabled=True ),
             html.Div( id='problem-status' ), 
+            dbc.Button( 'Cancel solve', id='job-cancel', color='secondary', outline=True, style={ 'display': 'none' }, className='mb-3' ),
             html.Div( id='problem-results' ) 
         ], style = { 'padding': '48px'}
     )
 
 # /----------------| Results table |----------------\
+# The results grid shows shipments or, from the same solve, what each cost, supply and requirement is worth
+RESULT_VIEWS = {
+    'supply': ( 'Shipments', 'kWh sent on every route.' ),
+    'marginal': ( 'Marginal costs', 'Routes: how much cheaper an unused route must get before it is worth using. Supply and requirements: objective change per extra kWh.' ),
+    'lower': ( 'Lowest values', 'Lowest cost, supply or requirement for which the same routes stay optimal, one value changed at a time.' ),
+    'upper': ( 'Highest values', 'Highest cost, supply or requirement for which the same routes stay optimal, one value changed at a time; blank is unlimited.' )
+}
+PROVISIONAL_HELP = 'Provisional kWh from Vogel\'s approximation, replaced by the optimal plan when the background solve finishes.'
+
+def _provisional( transportation: Transportation ):
+    return transportation.shipments() is not transportation.supply
+
+def _result_values( transportation: Transportation, view: str ):
+    # Values, supply column and requirement row of the grid for a view
+    report = FIGURE_MEMO.get( transportation, 'sensitivity', Transportation.sensitivity ) if view != 'supply' else None
+    if report is None: return transportation.shipments(), None, None
+    return {
+        'marginal': ( report.reduced_costs, report.supply_duals, report.demand_duals ),
+        'lower': ( report.cost_lower, report.supply_lower, report.demand_lower ),
+        'upper': ( report.cost_upper, report.supply_upper, report.demand_upper )
+    }[ view ]
+
 def make_table_results( transportation: Transportation ):
+    available = FIGURE_MEMO.get( transportation, 'sensitivity', Transportation.sensitivity ) is not None
+    provisional = _provisional( transportation )
+    if not provisional and not transportation.has_plan():
+        # Nothing solved for the current plants and cities, e.g. a cancelled solve after a shape edit
+        return [
+            html.H3( 'Results table', style={ 'text-align':'center' } ),
+            dbc.Alert( 'There is no plan for the current inputs.', color='secondary' )
+        ]
+    return [
+        html.H3( 'Provisional results table' if provisional else 'Results table', style={ 'text-align':'center' } ),
+        dbc.RadioItems(
+            id = 'results-view',
+            options = [ 
+                { 'label': label, 'value': view, 'disabled': view != 'supply' and not available } 
+                for view, ( label, _ ) in RESULT_VIEWS.items() 
+            ],
+            value = 'supply',
+            inline = True,
+            className = 'mb-1'
+        ),
+        html.Small( PROVISIONAL_HELP if provisional else RESULT_VIEWS['supply'][1], id='results-view-help', className='text-muted d-block mb-2' ),
+        html.Div( transportation.to_html( id='results-grid', values=transportation.shipments() ), style = {'overflowX':'auto', 'maxWidth': '100%'} )
+    ]
+
+# /----------------| Status alerts |----------------\
+HIDDEN = { 'display': 'none' }
+
+def _alert( message: str, color: str ):
+    icon = { 'danger': 'bi-x-octagon-fill', 'warning': 'bi-exclamation-triangle-fill' }[ color ]
+    return dbc.Alert( [ html.I(className=f"bi { icon } me-2"), message ], color=color )
 
-    table_head = [ 
-        html.Th('') 
-    ] + [ 
-        html.Th(col) for col in transportation.costs.columns 
-    ] + [
-        html.Th('Plant supply')
+def _job_alert( state: str, elapsed: float, preview: float = None, progress: dict = None ):
+    message = 'Waiting for a free solver' if state == QUEUED else 'Solving in the background'
+    provisional = [] if preview is None else [ html.Br(), f'Provisional plan from Vogel\'s approximation: { preview:g}.' ]
+    if progress and progress.get( 'objective' ) is not None:
+        # Reported by fixed-charge searches on every better plan or bound
+        bound = progress['bound']
+        limit = '' if bound is None else f', no plan can cost less than { bound:g} ({ gap( progress["objective"], bound ):.2%} gap)'
+        provisional += [ html.Br(), f'Best plan so far: { progress["objective"]:g}{ limit }, { progress["nodes"] } nodes searched.' ]
+    return dbc.Alert( [ dbc.Spinner( size='sm', spinner_class_name='me-2' ), f'{ message }, { elapsed:.0f} s elapsed.' ] + provisional, color='info' )
+
+def _solution_alert( transportation: Transportation ):
+    if transportation.status == NOT_SOLVED and transportation.objective is not None:
+        # A search cut short by the time limit keeps its best plan
+        mip_gap = transportation.mip_gap()
+        bound = '' if mip_gap is None else f', at most { mip_gap:.2%} above the optimum'
+        return dbc.Alert( [
+            html.I(className="bi bi-exclamation-triangle-fill me-2"),
+            f'Time limit reached; the best plan found costs { transportation.objective }{ bound }.'
+        ], color='warning', style = { 'cursor':'pointer' } )
+    if transportation.status < 1: 
+        reasons = transportation.diagnosis.messages( transportation.costs.columns ) if transportation.diagnosis else []
+        if not reasons: return _alert( 'Problem cannot be solved with current inputs.', 'danger' )
+        return dbc.Alert( [
+            html.I(className="bi bi-x-octagon-fill me-2"),
+            'Problem cannot be solved with current inputs:',
+            html.Ul( [ html.Li( reason ) for reason in reasons ], className='mb-0' )
+        ], color='danger' )
+    unmet = [] if transportation.unmet is None or transportation.unmet.sum() <= 0 else [ 
+        html.Br(), f'{ transportation.unmet.sum():g} kWh of requirements are left unmet.' 
     ]
-    
-    table_content = [
-        html.Tr( 
-            [ html.Th( transportation.plant_supply.index[ idx ] ) ] +
-            [ html.Td( cell ) for cell in row ] +
-            [ html.Td( transportation.plant_supply.iloc[ idx ]) ]
-        ) for idx, row in enumerate(transportation.supply)
-    ] + [
-        html.Tr(
-            [ html.Th( 'City requirement' ) ] +
-            [ html.Td( cell ) for cell in transportation.city_requirements ]
-        )
+    gap = transportation.gap()
+    provisional = [] if gap is None else [ 
+        html.Br(), f'The provisional plan cost { transportation.provisional.objective:g}, { gap:.2%} above the optimum.' 
     ]
-    return [
-        html.H3( 'Results table', style={ 'text-align':'center' } ),
-        dbc.Table([
-        html.Thead( table_head ),
-        html.Tbody( table_content )
-        ], 
-        bordered=True
-    )]
+    mip_gap = transportation.mip_gap()
+    if mip_gap is not None and round( mip_gap, 4 ) > 0:
+        provisional += [ html.Br(), f'Within { mip_gap:.2%} of the best possible plan.' ]
+    return dbc.Alert(
+        [
+            html.I(className="bi bi-check-circle-fill me-2"),
+            f'Found minimal value of { transportation.objective }'
+        ] + unmet + provisional, color='success' if not unmet else 'warning', style = { 'cursor':'pointer' } )
 
 # /----------------| Callback hell generator |----------------\
-def load_input_callbacks( app: Dash, transportation: Transportation, max_size: int = 36  ):
+def load_input_callbacks( 
+    app: Dash, sessions: Sessions, max_size: int = 36, max_upload: int = MAX_UPLOAD_BYTES,
+    job_size: int = 100 * 100, jobs: JobManager = None
+):
+    # Models with more than job_size cost cells are solved as background jobs
+    jobs = jobs or JobManager()
     
     # //----------------| Table shape updater |----------------\\
     @app.callback(
         Output('output-table', 'children'),
         [
             Input('upload-data', 'contents'), 
-            Input({'type': 'table-edit', 'target': ALL, 'action': ALL}, 'n_clicks')
+            Input({'type': 'table-edit', 'target': ALL, 'action': ALL}, 'n_clicks'),
+            Input('fixed-switch', 'value')
         ],
-        [State('upload-data', 'filename')]
+        [State('upload-data', 'filename'), State('session-id', 'data')]
     )
-    def update_table( contents, n_clicks, filename ):
+    def update_table( contents, n_clicks, fixed, filename, session ):
         ctx = callback_context
         if not ctx.triggered:
             raise PreventUpdate
         triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
+        if 'upload-data' in triggered_id and contents is None:
+            raise PreventUpdate
+
+        with sessions.edit( session ) as transportation:
+            if 'upload-data' in triggered_id:
+                UPLOAD_BYTES.inc( amount = len( contents ) )
+                try: transportation.get_from_upload( contents, filename, max_upload, max_size )
+                except ValueError as error:
+                    UPLOADS.inc( 'rejected' )
+                    return [ dbc.Alert([
+                        html.I(className="bi bi-x-octagon-fill me-2"),
+                        f'Could not load { filename }: { error }'
+                    ], color='danger' ) ] + transportation.to_html()
+                UPLOADS.inc( 'loaded' )
+
+            elif 'table-edit' in triggered_id:
+                triggered_id = loads(triggered_id)
+                target = triggered_id['target']
+                action = triggered_id['action']
+                if action == 'add': transportation.add( int( target == 'city' ) )
+                elif action == 'del': transportation.delete( -1, int( target == 'city' ) )
 
-        if 'upload-data' in triggered_id:
-            if contents is None:
-                raise PreventUpdate
-            _, content_string = contents.split(',')
-            uploaded_file_path = save_uploaded_file(filename, content_string)
-            transportation.get_from_file(uploaded_file_path)
-
-        elif 'table-edit' in triggered_id:
-            triggered_id = loads(triggered_id)
-            target = triggered_id['target']
-            action = triggered_id['action']
-            if action == 'add': transportation.add( int( target == 'city' ) )
-            elif action == 'del': transportation.delete( -1, int( target == 'city' ) )
-
-        return transportation.to_html()
+            elif 'fixed-switch' == triggered_id:
+                # Adds or removes the fixed cost column
+                transportation.set_fixed_charge( fixed )
+
+            return transportation.to_html()
     
+    # //----------------| Grid paging |----------------\\
+    @app.callback(
+        [ Output('cost-grid', 'columns'), Output('cost-grid', 'data') ],
+        [ Input('cost-grid', 'page_current'), Input('cost-grid-columns', 'active_page') ],
+        State('session-id', 'data'),
+        prevent_initial_call=True
+    )
+    def page_grid( row_page, col_page, session ):
+        return sessions.load( session ).window( row_page or 0, ( col_page or 1 ) - 1 )
+
+    @app.callback(
+        [ Output('results-grid', 'columns'), Output('results-grid', 'data'), Output('results-view-help', 'children') ],
+        [ Input('results-grid', 'page_current'), Input('results-grid-columns', 'active_page'), Input('results-view', 'value') ],
+        State('session-id', 'data'),
+        prevent_initial_call=True
+    )
+    def page_results( row_page, col_page, view, session ):
+        transportation = sessions.load( session )
+        # A grid left over from before a shape edit has no plan to page through
+        if not _provisional( transportation ) and not transportation.has_plan(): raise PreventUpdate
+        values, supply, requirements = _result_values( transportation, view or 'supply' )
+        columns, data = transportation.window( row_page or 0, ( col_page or 1 ) - 1, values=values, supply=supply, requirements=requirements )
+        return columns, data, PROVISIONAL_HELP if _provisional( transportation ) else RESULT_VIEWS[ view or 'supply' ][1]
+
+    # //----------------| Edited cell |----------------\\
+    # Diffed in the browser so only the edited cell travels to the server
+    app.clientside_callback(
+        """
+        function( timestamp, data, previous ) {
+            if ( !timestamp || !data || !previous ) return window.dash_clientside.no_update;
+            for ( let r = 0; r < data.length; r++ ) {
+                for ( const key in data[ r ] ) {
+                    if ( key !== '__row__' && previous[ r ] && data[ r ][ key ] !== previous[ r ][ key ] )
+                        return { row: data[ r ].__row__, column: key, value: data[ r ][ key ], timestamp: timestamp };
+                }
+            }
+            return window.dash_clientside.no_update;
+        }
+        """,
+        Output('grid-edit', 'data'),
+        Input('cost-grid', 'data_timestamp'),
+        [ State('cost-grid', 'data'), State('cost-grid', 'data_previous') ]
+    )
+
     # //----------------| Table value updater |----------------\\
     @app.callback(
-        [
-            Input({'type': 'costs-cell', 'index': ALL}, 'value'),
-            Input({'type': 'city-cell', 'index': ALL}, 'value'),
-            Input({'type': 'plant-cell', 'index': ALL}, 'value')
-        ]   
+        [ Output('problem-version', 'data'), Output('cost-grid', 'data', allow_duplicate=True) ],
+        [ Input('grid-edit', 'data'), Input('balance-switch', 'value') ],
+        [ State('session-id', 'data'), State('cost-grid', 'page_current'), State('cost-grid-columns', 'active_page') ],
+        prevent_initial_call=True
     )
-    def update_problem(*cell_values):
+    def update_problem( edit, balance, session, row_page, col_page ):
         ctx = callback_context
-        if not ctx.triggered:
+        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else ''
+        if 'balance-switch' == triggered_id:
+            with sessions.edit( session ) as transportation:
+                version = transportation.version
+                transportation.set_balance( balance )
+            if transportation.version == version: return no_update, no_update
+            return transportation.version, no_update
+
+        if not edit:
             raise PreventUpdate
-        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
+        row, column, value = edit['row'], edit['column'], edit['value']
+        if isinstance( value, ( int, float ) ) and value < 0:
+            # Negative entries are refused and the page shows the stored values again
+            return no_update, sessions.load( session ).window( row_page or 0, ( col_page or 1 ) - 1 )[1]
+
+        with sessions.edit( session ) as transportation:
+            version = transportation.version
+            if row is not None and column == '__supply__':
+                transportation.set_supply( transportation.costs.index[ row ], value or 0 )
+
+            elif row is not None and column == '__fixed__':
+                transportation.set_fixed_cost( transportation.costs.index[ row ], value or 0 )
 
-        if 'costs-cell' in triggered_id:
-            row, col = loads( triggered_id )['index'].split('-')
-            columns = list(transportation.costs.columns)
-            rows = list(transportation.costs.index)
-            col_idx = columns.index(col)
-            row_idx = rows.index(row)
-            value = cell_values[0][ col_idx + row_idx * len( transportation.costs.columns ) ]
-            if value is None: value = 0
-            transportation.costs.loc[ rows[row_idx], columns[col_idx] ] = value
-
-        elif 'city-cell' in triggered_id:
-            idx = loads( triggered_id )['index']
-            cols = list(transportation.costs.columns)
-            transportation.city_requirements.loc[idx] = cell_values[1][ cols.index( idx ) ]
-
-        elif 'plant-cell' in triggered_id:
-            idx = loads( triggered_id )['index']
-            rows = list(transportation.costs.index)
-            transportation.plant_supply.loc[idx] = cell_values[2][ rows.index( idx ) ]
+            elif row is None and column not in ( '__supply__', '__fixed__' ):
+                transportation.set_requirement( transportation.costs.columns[ int( column ) ], value or 0 )
+
+            elif row is not None:
+                # A cleared cell is a route that does not exist
+                if value is None or value == '': value = float('nan')
+                transportation.set_cost( transportation.costs.index[ row ], transportation.costs.columns[ int( column ) ], value )
+
+        if transportation.version == version: return no_update, no_update
+        return transportation.version, no_update
 
     # //----------------| Max shape restrictions |----------------\\
     @app.callback(
@@ -165,9 +314,11 @@ def load_input_callbacks( app: Dash, transportation: Transportation, max_size: i
             Output({'type': 'table-edit', 'target': 'plant', 'action': 'add'}, 'disabled'),
             Output({'type': 'table-edit', 'target': 'city', 'action': 'add'}, 'disabled'),
         ],
-        Input('output-table', 'children')
+        Input('output-table', 'children'),
+        State('session-id', 'data')
     )
-    def disable_buttons(_):
+    def disable_buttons( _, session ):
+        transportation = sessions.load( session )
         return [
             len(transportation.plant_supply) <= 1,
             len(transportation.city_requirements) <= 1,
@@ -177,36 +328,74 @@ def load_input_callbacks( app: Dash, transportation: Transportation, max_size: i
     
     # //----------------| Problem status |----------------\\
     @app.callback(
-        Output( 'problem-status', 'children' ),
+        [ 
+            Output( 'problem-status', 'children' ),
+            Output( 'solve-job', 'data' ),
+            Output( 'job-poll', 'disabled' ),
+            Output( 'job-cancel', 'style' )
+        ],
         [
             Input('output-table', 'children'),
-            Input('upload-data', 'contents'),
-            Input({'type': 'table-edit', 'target': ALL, 'action': ALL}, 'n_clicks'),
-            Input({'type': 'costs-cell', 'index': ALL}, 'value'),
-            Input({'type': 'city-cell', 'index': ALL}, 'value'),
-            Input({'type': 'plant-cell', 'index': ALL}, 'value')
-        ]
+            Input('problem-version', 'data'),
+            Input('job-poll', 'n_intervals'),
+            Input('job-cancel', 'n_clicks')
+        ],
+        [ State('session-id', 'data'), State('solve-job', 'data') ]
     )
-    def problem_solve( *args ):
-        transportation.solve()
-        if transportation.problem.status < 1: 
-            return dbc.Alert(
-                [
-                    html.I(className="bi bi-x-octagon-fill me-2"),
-                    f'Problem cannot be solved with current inputs.'
-                ], color='danger' )
-        else:
-            return dbc.Alert(
-                [
-                    html.I(className="bi bi-check-circle-fill me-2"),
-                    f'Found minimal value of { transportation.problem.objective.value() }'
-                ], color='success', style = { 'cursor':'pointer' } )
+    def problem_solve( table, version, n_intervals, n_clicks, session, job ):
+        ctx = callback_context
+        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else ''
+        running = job is not None and job['state'] in ( RUNNING, QUEUED )
+
+        if 'job-cancel' == triggered_id:
+            if not running or not n_clicks: raise PreventUpdate
+            jobs.cancel( job['id'] )
+            return _alert( 'Solve cancelled.', 'warning' ), { 'id': job['id'], 'state': CANCELLED }, True, HIDDEN
+
+        if 'job-poll' == triggered_id:
+            if not running: raise PreventUpdate
+            state, elapsed, result = jobs.poll( job['id'] ) or ( CANCELLED, 0, None )
+            if state in ( RUNNING, QUEUED ): return _job_alert( state, elapsed, job.get( 'preview' ), result ), no_update, no_update, no_update
+            if state == FAILED: return _alert( f'Solve failed: { result }', 'danger' ), { 'id': job['id'], 'state': state }, True, HIDDEN
+            if state == CANCELLED: return _alert( 'Solve cancelled.', 'warning' ), { 'id': job['id'], 'state': state }, True, HIDDEN
+            # An edit made while the job ran started a job of its own
+            transportation = sessions.save_solution( session, result )
+            if transportation.solved_version != transportation.version: raise PreventUpdate
+            return _solution_alert( transportation ), { 'id': job['id'], 'state': DONE }, True, HIDDEN
+
+        transportation = sessions.load( session )
+        if needs_job( transportation, job_size ) and transportation.solved_version != transportation.version:
+            # Large instances and fixed-charge searches solve in a background process, polled until they finish and
+            # showing what the search has found so far; a heuristic plan is shown meanwhile and handed to the solve
+            # as its starting basis
+            with sessions.edit( session ) as transportation: preview = transportation.preview()
+            job_id = jobs.submit( solve_job, transportation, dict( LIMITS ), key = session )
+            preview = None if preview is None or preview.objective is None else preview.objective
+            return _job_alert( QUEUED, 0, preview ), { 'id': job_id, 'state': QUEUED, 'preview': preview }, False, {}
+
+        # Debounced, skipped when nothing changed since the last solve, and dropped when a newer request exists
+        if running: jobs.cancel( job['id'] )
+        if not SCHEDULER.request( transportation, session ):
+            raise PreventUpdate
+        # Another request edited the session while this one solved; its own solve reports the result
+        transportation = sessions.save_solution( session, transportation )
+        if transportation.solved_version != transportation.version:
+            raise PreventUpdate
+        return _solution_alert( transportation ), None, True, HIDDEN
         
     # //----------------| Problem result |----------------\\
     @app.callback(
         Output( 'problem-results','children' ),
-        Input( 'problem-status','n_clicks' )
+        [ Input( 'problem-status','n_clicks' ), Input( 'solve-job', 'data' ) ],
+        State( 'session-id', 'data' )
     )
-    def problem_results( n_clicks ):
-        if n_clicks: return make_table_results( transportation )
-        return no_update
\ No newline at end of file
+    def problem_results( n_clicks, job, session ):
+        ctx = callback_context
+        triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else ''
+        # Background solves show their provisional plan when they start and fill in the results as soon as they finish
+        if 'solve-job' == triggered_id:
+            if job is not None and job['state'] == DONE: return make_table_results( sessions.load( session ) )
+            if job is not None and job['state'] == QUEUED and job.get( 'preview' ) is not None: return make_table_results( sessions.load( session ) )
+            return no_update
+        if n_clicks: return make_table_results( sessions.load( session ) )
+        return no_update
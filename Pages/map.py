@@ -1,15 +1,17 @@
-from dash import Dash, Input, Output, State, dcc, html, callback_context, no_update, ALL
+from dash import Dash, Input, Output, State, dcc, html, callback_context, no_update, ALL, MATCH
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 
-from utils import Transportation, haversine, CITIES
+from utils import Transportation, Sessions, GAZETTEER, SCHEDULER, needs_job
+from optikwh.distance import distance_matrix
+from optikwh.timing import phase
 from json import loads
-from pandas import DataFrame
+from numpy import nonzero, minimum
 
 # /----------------| Utils. dropdowns |----------------\
 def _make_input_tab( cities: list, title: str ):
-    locations = [ loc for loc in CITIES['city'] ]
+    # Options are searched on the server, so the page never ships the whole gazetteer
     return dbc.Tab(
         dbc.Card([ 
             dbc.CardBody( 
@@ -17,8 +19,8 @@ def _make_input_tab( cities: list, title: str ):
                     dbc.Col( html.P(city) ),
                     dbc.Col( 
                         dcc.Dropdown(
-                            options=locations,
-                            value=( cities[ idx ] if cities[ idx ] in locations else None ),
+                            options=( [ city ] if city in GAZETTEER else [] ),
+                            value=( city if city in GAZETTEER else None ),
                             placeholder='Choose city',
                             id={ 'type':'dropdown', 'target':title, 'index':idx }
                         )
@@ -28,62 +30,85 @@ def _make_input_tab( cities: list, title: str ):
         ], className="mt-3" ), label=title
     )
 
+# /----------------| Utils. distance costs |----------------\
+def _make_distance_card():
+    return dbc.Card([
+        dbc.CardHeader( 'Costs from distance' ),
+        dbc.CardBody([
+            dbc.InputGroup([ dbc.InputGroupText( 'Cost per km' ), dbc.Input( id='distance-per-km', type='number', min=0, value=1 ) ], className='mb-2' ),
+            dbc.InputGroup([ dbc.InputGroupText( 'Fixed fee' ), dbc.Input( id='distance-fee', type='number', min=0, value=0 ) ], className='mb-2' ),
+            dbc.Button( 'Use distance costs', id='distance-apply', color='primary', n_clicks=0 )
+        ])
+    ], className='mt-3' )
+
 # /----------------| Utils. globe |----------------\
-def _make_globe( transportation: Transportation ):
-    globe_data = []
-    locations = [ loc for loc in CITIES['city'] ]
-    registered_cities = list( set(transportation.city_requirements.index) & set(locations) )
-    # Add markers for each city
-    city_coords = {}
-    for name in registered_cities:
-        if name: 
-            row = CITIES[CITIES['city'] == name].iloc[0]
-            lat, lon = row['lat'], row['lng']
-            city_coords[name] = (lat, lon)
-            globe_data.append(go.Scattergeo(
-                lon=[lon],
-                lat=[lat],
-                mode='markers',
-                marker=dict(size=10, color='red'),
-                text=name,
-                name=name
-            ))
-
-    registered_plants = list( set(transportation.plant_supply.index) & set(locations) )
-    # Add markers for each plant
-    plant_coords = {}
-    for name in registered_plants:
-        if name:
-            row = CITIES[CITIES['city'] == name].iloc[0]
-            lat, lon = row['lat'], row['lng']
-            plant_coords[name] = (lat, lon)
-            globe_data.append(go.Scattergeo(
-                lon=[lon],
-                lat=[lat],
-                mode='markers',
-                marker=dict(size=10, color='blue'),
-                text=name,
-                name=name
-            ))
-    
-    conections = DataFrame( transportation.supply, index=transportation.costs.index, columns=transportation.costs.columns )
-
-    for city, (city_lat, city_lon) in city_coords.items():
-        for plant, (plant_lat, plant_lon) in plant_coords.items():
-            if conections.loc[ plant, city ] > 0:
-                distance = haversine(city_lat, city_lon, plant_lat, plant_lon)
-                globe_data.append(go.Scattergeo(
-                    lon=[city_lon, plant_lon],
-                    lat=[city_lat, plant_lat],
-                    mode='lines+markers+text',
-                    line=dict(width=2, color='#d90429'),
-                    text=[f"{distance:.2f} km"],
-                    textposition='middle center',
-                    name=f"{plant} to {city}"
-                ))
+ROUTE_WIDTHS = [ 1.5, 3, 4.5, 6 ]
+
+def _make_markers( names, color: str, label: str ):
+    # One trace for every located node of a kind; unknown names are not drawn
+    rows = GAZETTEER.lookup( names )
+    known = rows >= 0
+    names = [ name for name, ok in zip( names, known ) if ok ]
+    return go.Scattergeo(
+        lon=GAZETTEER.lng[ rows[ known ] ],
+        lat=GAZETTEER.lat[ rows[ known ] ],
+        mode='markers',
+        marker=dict(size=10, color=color),
+        text=names,
+        hoverinfo='text',
+        name=label
+    )
+
+def _make_routes( transportation: Transportation ):
+    # Active routes grouped into a few width classes by kWh, each class drawn as one trace of None separated segments
+    plants, cities = transportation.costs.index, transportation.costs.columns
+    plant_rows, city_rows = GAZETTEER.lookup( plants ), GAZETTEER.lookup( cities )
+    distances = distance_matrix( plants, cities, GAZETTEER )
+    shipped = transportation.supply
+
+    active = ( shipped > 0 ) & ( plant_rows[ :, None ] >= 0 ) & ( city_rows[ None, : ] >= 0 )
+    routes = list( zip( *nonzero( active ) ) )
+    if not routes: return []
+    kwh = shipped[ active ]
+    classes = minimum(( kwh / kwh.max() * len( ROUTE_WIDTHS ) ).astype( int ), len( ROUTE_WIDTHS ) - 1 )
+
+    traces = []
+    for width_class, width in enumerate( ROUTE_WIDTHS ):
+        lon, lat, text = [], [], []
+        for ( i, j ), amount, route_class in zip( routes, kwh, classes ):
+            if route_class != width_class: continue
+            plant, city = plant_rows[ i ], city_rows[ j ]
+            hover = f"{plants[ i ]} to {cities[ j ]}<br>{amount:,.2f} kWh<br>{distances[ i, j ]:,.2f} km"
+            lon += [ GAZETTEER.lng[ city ], GAZETTEER.lng[ plant ], None ]
+            lat += [ GAZETTEER.lat[ city ], GAZETTEER.lat[ plant ], None ]
+            text += [ hover, hover, None ]
+        if not text: continue
+        traces.append(go.Scattergeo(
+            lon=lon,
+            lat=lat,
+            mode='lines',
+            line=dict(width=width, color='#d90429'),
+            text=text,
+            hoverinfo='text',
+            name=f"Routes {width_class * 100 // len( ROUTE_WIDTHS )}-{( width_class + 1 ) * 100 // len( ROUTE_WIDTHS )}% of max kWh"
+        ))
+    return traces
+
+def _make_globe( transportation: Transportation, routes: bool = True ):
+    # A fixed handful of traces, so the figure grows with the data and not with the number of routes; a model
+    # without a plan for its current shape gets none
+    routes = routes and transportation.has_plan()
+    with phase( 'globe' ):
+        globe_data = [
+            _make_markers( list( transportation.city_requirements.index ), 'red', 'Cities' ),
+            _make_markers( list( transportation.plant_supply.index ), 'blue', 'Plants' )
+        ] + ( _make_routes( transportation ) if routes else [] )
 
     layout = go.Layout(
-        title='Globe of Cities and Plants',
+        title=(
+            'Globe of Cities and Plants' if routes or transportation.solved_version == transportation.version
+            else 'Globe of Cities and Plants (routes appear once the Input page has solved)'
+        ),
         showlegend=True,
         geo=dict(
             scope='world',
@@ -133,13 +158,25 @@ def make_map_page( transportation: Transportation ):
                 dbc.Tabs([
                     _make_input_tab( transportation.city_requirements.index,'Cities'),
                     _make_input_tab( transportation.plant_supply.index,'Plants')
-                ])
+                ]),
+                _make_distance_card()
             ], width=4)
         ])
     ], style={ 'margin':'24px' })
 
 # /----------------| Callback hell generator |----------------\
-def load_map_callbacks( app: Dash, transportation: Transportation ):
+def load_map_callbacks( app: Dash, sessions: Sessions, job_size: int = 100 * 100 ):
+
+    # //----------------| Location search |----------------\\
+    @app.callback(
+        Output( {'type':'dropdown', 'target': MATCH, 'index': MATCH}, 'options' ),
+        Input( {'type':'dropdown', 'target': MATCH, 'index': MATCH}, 'search_value' ),
+        State( {'type':'dropdown', 'target': MATCH, 'index': MATCH}, 'value' )
+    )
+    def search_locations( search_value, value ):
+        if not search_value: raise PreventUpdate
+        found = GAZETTEER.search( search_value )
+        return found if value is None or value in found else [ value ] + found
 
     # //----------------| Name replacer |----------------\\
     @app.callback(
@@ -147,32 +184,42 @@ def load_map_callbacks( app: Dash, transportation: Transportation ):
         [ 
             Input( {'type':'dropdown', 'target': 'Cities', 'index':ALL}, 'value' ),
             Input( {'type':'dropdown', 'target': 'Plants', 'index':ALL}, 'value' ),
-            Input('url', 'pathname')
-        ]
-
+            Input('url', 'pathname'),
+            Input('distance-apply', 'n_clicks')
+        ],
+        [ State('distance-per-km', 'value'), State('distance-fee', 'value'), State('session-id', 'data') ]
     )
-    def set_city_names( changed_cities, changed_plants, pathname ):
+    def set_city_names( changed_cities, changed_plants, pathname, n_clicks, per_km, fee, session ):
         ctx = callback_context
         if not ctx.triggered:
             raise PreventUpdate
         
         triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
         if 'url' == triggered_id:
-            if pathname == '/map': return _make_globe( transportation )
+            if pathname == '/map': return _make_globe( sessions.load( session ) )
+
+        elif 'distance-apply' == triggered_id:
+            # Replaces the whole cost matrix, so the routes shown are re-solved under the Input page's rules
+            if not n_clicks: raise PreventUpdate
+            with sessions.edit( session ) as transportation:
+                transportation.set_distance_costs( per_km or 0, fee or 0 )
+            # Background jobs are started and followed by the Input page; the old routes no longer apply meanwhile
+            if needs_job( transportation, job_size ): return _make_globe( transportation, routes = False )
+            if not SCHEDULER.request( transportation, session ): raise PreventUpdate
+            return _make_globe( sessions.save_solution( session, transportation ) )
             
         elif 'dropdown' in triggered_id:
-            changed_cities = [
-                name if name is not None else transportation.city_requirements.index[idx] 
-                for idx, name in enumerate(changed_cities)
-            ]
-            changed_plants = [
-                name if name is not None else transportation.plant_supply.index[idx] 
-                for idx, name in enumerate(changed_plants)
-            ]
-            transportation.costs.columns = changed_cities
-            transportation.costs.index = changed_plants
-            transportation.city_requirements.index = changed_cities
-            transportation.plant_supply.index = changed_plants
+            with sessions.edit( session ) as transportation:
+                changed_cities = [
+                    name if name is not None else transportation.city_requirements.index[idx] 
+                    for idx, name in enumerate(changed_cities)
+                ]
+                changed_plants = [
+                    name if name is not None else transportation.plant_supply.index[idx] 
+                    for idx, name in enumerate(changed_plants)
+                ]
+                # Renamed nodes also invalidate the figures memoized for the result pages
+                transportation.rename( changed_plants, changed_cities )
             return _make_globe( transportation )
         
-        return no_update
\ No newline at end of file
+        return no_update
@@ -1,14 +1,17 @@
-from dash import Dash, Input, Output, html, dcc, no_update, ALL
+from dash import Dash, Input, Output, State, html, dcc, no_update, ALL
 import dash_bootstrap_components as dbc
 
 import plotly.express as px
-from utils import Transportation, get_max, calculate_energy_sent, get_min
+import plotly.graph_objects as go
+from utils import Transportation, Sessions, get_max, calculate_energy_sent, get_min, calculate_average_cost, FIGURE_MEMO, MAX_PIES, no_plan_heading
 from numpy import sum
 
 # /----------------| Utils. content |----------------\
 def _plant_heading( transportation: Transportation ):
+    # Infeasible or rejected models, and models still solving after a shape edit, have no plan to describe
+    if not transportation.has_plan(): return no_plan_heading( 'Plant results', 'plant-total-supply-plot' )
     supplied_by_plant = sum( transportation.supply, axis = 1 ) 
-    savings_by_plant = sum( transportation.costs.values, axis = 1 ) / len( transportation.city_requirements )
+    savings_by_plant = calculate_average_cost( transportation.costs.values, axis = 1 )
     capacity_by_plant = transportation.plant_supply.values - supplied_by_plant
 
     supplier = get_max( supplied_by_plant, transportation.plant_supply.index )
@@ -51,6 +54,8 @@ def _plant_heading( transportation: Transportation ):
     ], style={ 'margin':'32px' } )
 
 def _plant_content( transportation: Transportation ):
+    if len( transportation.plant_supply ) > MAX_PIES:
+        return html.Div( dcc.Graph( id='energy-sent-combined' ), style={'margin': '32px'} )
 
     cards = [ 
         dbc.Col([ dbc.Card([ dcc.Graph(
@@ -72,41 +77,84 @@ def _plant_supply_plot( transportation: Transportation, template: str ):
     fig.update_layout(font={'family': 'Nunito Sans', 'color': 'black'})
     return fig
 
+def _plant_pies( transportation: Transportation ):
+    energy_sent_percentage = calculate_energy_sent( transportation.supply, transportation.plant_supply.values )
+    figures = [
+        px.pie(
+            values=energy_sent_percentage[ idx ],
+            names=[ city for city in transportation.city_requirements.index ], 
+            title=f'{ plant }: Percentage of Capacity Used',
+            hole=0.4
+        ) for idx, plant in enumerate(transportation.plant_supply.index)
+    ]
+    for fig in figures:
+        fig.update_layout( font = { 'family': 'Nunito Sans', 'color': 'black' })
+    return figures
+
+def _plant_sent_plot( transportation: Transportation, template: str ):
+    # Every plant as one stacked bar of the share of its capacity sent to each city
+    energy_sent_percentage = calculate_energy_sent( transportation.supply, transportation.plant_supply.values )
+    fig = go.Figure(
+        [
+            go.Bar( 
+                x=energy_sent_percentage[ :, idx ], 
+                y=transportation.plant_supply.index, 
+                name=str( city ), 
+                orientation='h' 
+            ) for idx, city in enumerate(transportation.city_requirements.index)
+        ],
+        layout = go.Layout( 
+            barmode='stack', 
+            title='Percentage of capacity used by city', 
+            template=template,
+            height=max( 400, 24 * len( transportation.plant_supply ) )
+        )
+    )
+    fig.update_layout( font = { 'family': 'Nunito Sans', 'color': 'black' })
+    return fig
+
 # /----------------| Plants page generator |----------------\
 def make_plants_page( transportation: Transportation ):
     return html.Div( [ 
-        _plant_heading( transportation ),
-        _plant_content( transportation )
-    ], id = 'plant-plots' )
+        FIGURE_MEMO.get( transportation, 'plant-heading', _plant_heading )
+    ] + ( [ _plant_content( transportation ) ] if transportation.has_plan() else [] ), id = 'plant-plots' )
 
-def load_plants_callbacks( app: Dash, transportation: Transportation, template: str ):
+def load_plants_callbacks( app: Dash, sessions: Sessions, template: str ):
 
     # //----------------| Plant tab main plot |----------------\\
     @app.callback(
         Output( 'plant-total-supply-plot', 'figure' ),
-        [ Input('url', 'pathname') ]
+        [ Input('url', 'pathname') ],
+        State('session-id', 'data')
     )
-    def gen_plants_costs_plot( pathname ):
-        if pathname == '/plants': return _plant_supply_plot( transportation, template )
-        return no_update
+    def gen_plants_costs_plot( pathname, session ):
+        if pathname != '/plants': return no_update
+        transportation = sessions.load( session )
+        # The heading shows no plan; its graph stays empty
+        if not transportation.has_plan(): return no_update
+        return FIGURE_MEMO.get( transportation, 'plant-supply-plot', _plant_supply_plot, template )
 
     # //----------------| Plant tab plots |----------------\\
     @app.callback(
         Output( {'type':'energy-sent-plot', 'index':ALL }, 'figure' ),
-        [ Input('url', 'pathname') ]
+        [ Input('url', 'pathname') ],
+        State('session-id', 'data')
+    )
+    def gen_energy_sent_plot( pathname, session ):
+        if pathname != '/plants': return no_update
+        transportation = sessions.load( session )
+        # Nothing to fill when the page shows the combined figure or no plan
+        if len( transportation.plant_supply ) > MAX_PIES or not transportation.has_plan(): return no_update
+        return FIGURE_MEMO.get( transportation, 'plant-pies', _plant_pies )
+
+    # //----------------| Plant tab combined plot |----------------\\
+    @app.callback(
+        Output( 'energy-sent-combined', 'figure' ),
+        [ Input('url', 'pathname') ],
+        State('session-id', 'data')
     )
-    def gen_energy_sent_plot( pathname ):
-        if pathname == '/plants':
-            energy_sent_percentage = calculate_energy_sent( transportation.supply, transportation.plant_supply.values )
-            figures = [
-                px.pie(
-                    values=energy_sent_percentage[ idx ],
-                    names=[ city for city in transportation.city_requirements.index ], 
-                    title=f'{ plant }: Percentage of Capacity Used',
-                    hole=0.4
-                ) for idx, plant in enumerate(transportation.plant_supply.index)
-            ]
-            for fig in figures:
-                fig.update_layout( font = { 'family': 'Nunito Sans', 'color': 'black' })
-            return figures
-        else: return no_update
\ No newline at end of file
+    def gen_energy_sent_combined( pathname, session ):
+        if pathname != '/plants': return no_update
+        transportation = sessions.load( session )
+        if not transportation.has_plan(): return no_update
+        return FIGURE_MEMO.get( transportation, 'plant-sent-plot', _plant_sent_plot, template )
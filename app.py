@@ -1,19 +1,49 @@
-from dash import Dash, Input, Output, html, dcc
+import os
+from uuid import uuid4
+
+from dash import Dash, Input, Output, State, html, dcc
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
 
-from utils import Transportation, costs, plant_supply, city_requirements, CITIES
+from utils import Transportation, Sessions, costs, plant_supply, city_requirements
+from optikwh.store import make_store
+from optikwh.jobs import JobManager
+from optikwh.metrics import instrument
+from optikwh.backends import configure
 from Pages.input import make_input_page, load_input_callbacks
 from Pages.cities import make_cities_page, load_cities_callbacks
 from Pages.plants import make_plants_page, load_plants_callbacks
 from Pages.map import make_map_page, load_map_callbacks
 
 app = Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.LUX, dbc.icons.BOOTSTRAP])
+server = app.server
+# Callback timings and response sizes, solver counters and cache statistics on /metrics
+instrument( server )
 template = 'flatly'
 load_figure_template( [template] )
-max_size = 100
+max_size = 500
+max_upload = 10 * 2**20
+# auto picks a backend from the instance's size and routes, race runs several in parallel processes on instances
+# of RACE_MIN_CELLS or more (a command line and batch option: inline solves are smaller than that)
+solver = os.environ.get( 'OPTIKWH_SOLVER', 'auto' )
+# Seconds per solve, CBC threads and the relative gap at which CBC stops branching (fixed-charge solves);
+# unset leaves them unlimited and at CBC's defaults
+configure(
+    float( os.environ['OPTIKWH_TIME_LIMIT'] ) if os.environ.get( 'OPTIKWH_TIME_LIMIT' ) else None,
+    int( os.environ['OPTIKWH_THREADS'] ) if os.environ.get( 'OPTIKWH_THREADS' ) else None,
+    float( os.environ['OPTIKWH_MIP_GAP'] ) if os.environ.get( 'OPTIKWH_MIP_GAP' ) else None
+)
+# memory for a single process; disk:<directory> or sqlite:<file> when several workers share sessions
+session_store = os.environ.get( 'OPTIKWH_STORE', 'memory' )
+# Problems with more cost cells than this are solved in background processes; workers on one host can share a job directory
+job_size = 100 * 100
+jobs = JobManager( os.environ.get( 'OPTIKWH_JOBS' ), preload = ( 'utils', ) )
 
-transportation = Transportation(costs, plant_supply, city_requirements)
+# Every browser session starts from its own copy of the example problem
+sessions = Sessions(
+    lambda: Transportation(costs.copy(), plant_supply.copy(), city_requirements.copy(), solver),
+    make_store( session_store )
+)
 
 navbar = dbc.Navbar(
     dbc.Container(
@@ -37,30 +67,37 @@ navbar = dbc.Navbar(
     dark = True
 )
 
-app.layout = html.Div([
-    navbar,
-    dcc.Location(id='url', refresh=False),
-    html.Div(id='page-content')
-])
+def serve_layout():
+    # A new id per page load; the browser keeps its first one for the rest of the tab's session
+    return html.Div([
+        navbar,
+        dcc.Store(id='session-id', data=uuid4().hex, storage_type='session'),
+        dcc.Location(id='url', refresh=False),
+        html.Div(id='page-content')
+    ])
+
+app.layout = serve_layout
 
 # /!\---------------/!\ CALLBACK HELL! DO NOT TOUCH! /!\---------------/!\
 
 # Navbar Urls
 @app.callback(
     Output('page-content', 'children'),
-    Input('url', 'pathname')
+    Input('url', 'pathname'),
+    State('session-id', 'data')
 )
-def display_page(pathname):
+def display_page(pathname, session):
+    transportation = sessions.load( session )
     if pathname == '/cities': return make_cities_page( transportation )
     if pathname == '/plants': return make_plants_page( transportation )
     elif pathname == '/map': return make_map_page( transportation )
     else: return make_input_page( transportation )
 
 
-load_input_callbacks( app, transportation, max_size )
-load_cities_callbacks( app, transportation, template )
-load_plants_callbacks( app, transportation, template )
-load_map_callbacks( app, transportation )
+load_input_callbacks( app, sessions, max_size, max_upload = max_upload, job_size = job_size, jobs = jobs )
+load_cities_callbacks( app, sessions, template )
+load_plants_callbacks( app, sessions, template )
+load_map_callbacks( app, sessions, job_size = job_size )
 
 if __name__ == '__main__':
     app.run_server()
@@ -0,0 +1,3 @@
+from optikwh.cli import main
+
+raise SystemExit( main() )
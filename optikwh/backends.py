@@ -0,0 +1,222 @@
+import multiprocessing
+from multiprocessing.connection import wait
+from time import perf_counter
+
+from numpy import array, asarray, isfinite, where, zeros, sum
+
+from optikwh.solution import Solution, OPTIMAL, NOT_SOLVED, INFEASIBLE, UNBOUNDED
+from optikwh.simplex import transportation_simplex
+from optikwh.model import Model, build_model
+from optikwh.network import network_from_matrix, solve_network
+from optikwh.timing import phase
+from optikwh.jobs import process_context
+
+# scipy.optimize.linprog status -> PuLP status
+LINPROG_STATUS = { 0: OPTIMAL, 1: NOT_SOLVED, 2: INFEASIBLE, 3: UNBOUNDED, 4: NOT_SOLVED }
+
+# /----------------| Limits |----------------\
+# Per deployment; None leaves a solver unlimited or at its own default. Threads only reach CBC:
+# linprog does not expose HiGHS threads and the simplex runs on one. The relative MIP gap stops CBC's branching
+LIMITS = { 'time_limit': None, 'threads': None, 'mip_gap': None }
+
+def configure( time_limit: float = None, threads: int = None, mip_gap: float = None ):
+    if time_limit is not None and time_limit <= 0: raise ValueError( 'Time limit must be positive' )
+    if threads is not None and threads < 1: raise ValueError( 'Thread count must be at least 1' )
+    if mip_gap is not None and mip_gap < 0: raise ValueError( 'MIP gap must not be negative' )
+    LIMITS.update( time_limit = time_limit, threads = threads, mip_gap = mip_gap )
+
+def cbc_command( **options ):
+    # options go to PULP_CBC_CMD as well, e.g. a logPath to follow the search
+    from pulp import PULP_CBC_CMD
+    return PULP_CBC_CMD( msg=False, timeLimit=LIMITS['time_limit'], threads=LIMITS['threads'], gapRel=LIMITS['mip_gap'], **options )
+
+# /----------------| CBC through PuLP |----------------\
+def solve_cbc( costs, plant_supply, city_requirements, warm_start: Solution = None, capacities = None ):
+    from pulp import LpProblem, LpMinimize, LpVariable, LpContinuous
+
+    costs = asarray( costs, dtype=float )
+    routes = isfinite( costs )
+    cities = len( city_requirements )
+    plants = len( plant_supply )
+
+    def upper( i, j ):
+        if capacities is None or not isfinite( capacities[ i ][ j ] ): return None
+        return capacities[ i ][ j ]
+
+    with phase( 'build' ):
+        problem = LpProblem( 'Min_supply', LpMinimize )
+
+        # Missing routes get no variable at all
+        kwh = array([ 
+            [ 
+                LpVariable( f'Plant{i+1}ToCity{j+1}', lowBound=0, upBound=upper( i, j ), cat=LpContinuous ) if routes[ i, j ] else 0 
+                for j in range( cities ) 
+            ] 
+            for i in range( plants ) 
+        ], dtype=object )
+
+        f = sum( kwh*where( routes, costs, 0 ) )
+        problem += f
+
+        supplies = sum( kwh, axis = 1 )
+        for i, supply in enumerate( supplies ):
+          if routes[ i ].any(): problem += supply <= plant_supply[ i ]
+
+        supplies = sum( kwh, axis = 0 )
+        for i, supply in enumerate( supplies ):
+          if routes[ :, i ].any(): problem += supply >= city_requirements[ i ]
+          # A city without routes can only be served when it requires nothing
+          elif city_requirements[ i ] > 0: return Solution( INFEASIBLE, None, zeros(( plants, cities )) )
+
+    with phase( 'solve' ):
+        problem.solve( cbc_command() )
+
+    with phase( 'extract' ):
+        supply = get_supply( kwh )
+    # Without a single route the objective has no variables and no value
+    objective = problem.objective.value()
+    if objective is None and problem.status == OPTIMAL: objective = 0.0
+    return Solution( problem.status, objective, supply, model = problem )
+
+# /----------------| In-process transportation simplex |----------------\
+def solve_simplex( costs, plant_supply, city_requirements, warm_start: Solution = None, capacities = None ):
+    # The dense transportation simplex has no notion of missing or capacitated routes
+    if capacities is not None or not isfinite( costs ).all():
+        return solve_highs( costs, plant_supply, city_requirements, capacities = capacities )
+    return transportation_simplex( costs, plant_supply, city_requirements, warm_start = warm_start, time_limit = LIMITS['time_limit'] )
+
+# /----------------| HiGHS through scipy |----------------\
+def solve_model( model: Model ):
+    from scipy.optimize import linprog
+
+    if not len( model.c ):
+        # No route left, which linprog refuses: nothing ships, so only cities requiring nothing are served
+        status = OPTIMAL if ( model.b_ub[ model.shape[0]: ] >= 0 ).all() else INFEASIBLE
+        return status, 0.0 if status == OPTIMAL else None, zeros( 0 )
+    with phase( 'solve' ):
+        options = {} if LIMITS['time_limit'] is None else { 'time_limit': LIMITS['time_limit'] }
+        result = linprog( model.c, A_ub=model.A_ub, b_ub=model.b_ub, bounds=model.bounds(), method='highs', options=options )
+    status = LINPROG_STATUS.get( result.status, NOT_SOLVED )
+    if result.x is None: return status, None, zeros( len( model.c ) )
+    return status, float( result.fun ), result.x
+
+def solve_highs( costs, plant_supply, city_requirements, warm_start: Solution = None, capacities = None ):
+    with phase( 'build' ):
+        model = build_model( costs, plant_supply, city_requirements, capacities )
+    status, objective, flows = solve_model( model )
+
+    with phase( 'extract' ):
+        supply = zeros( model.shape )
+        supply[ model.rows, model.cols ] = flows
+    return Solution( status, objective, supply, model = model )
+
+# /----------------| Network simplex |----------------\
+def solve_network_matrix( costs, plant_supply, city_requirements, warm_start: Solution = None, capacities = None ):
+    # The plant x city matrix as a network without hubs; missing routes are no arcs and capacities bound them
+    costs = asarray( costs, dtype=float )
+    with phase( 'build' ):
+        network = network_from_matrix( costs, plant_supply, city_requirements, capacities )
+    solution = solve_network( network, time_limit = LIMITS['time_limit'] )
+    supply = zeros( costs.shape )
+    supply[ network.tails, network.heads - costs.shape[0] ] = solution.supply
+    return Solution( solution.status, solution.objective, supply, duals = solution.duals, solver = 'network' )
+
+# /----------------| Automatic choice |----------------\
+# Past this many cells HiGHS on the sparse arc model overtakes the dense simplex
+AUTO_SIMPLEX_CELLS = 200_000
+
+def _simplex_fits( costs, capacities = None ):
+    # Every route present and none capacitated
+    costs = asarray( costs, dtype=float )
+    return isfinite( costs ).all() and ( capacities is None or not isfinite( asarray( capacities, dtype=float ) ).any() )
+
+def choose_solver( costs, capacities = None ):
+    if _simplex_fits( costs, capacities ) and asarray( costs ).size <= AUTO_SIMPLEX_CELLS: return 'simplex'
+    # Missing routes, capacities or size: the arc model only holds existing routes
+    return 'highs'
+
+def solve_auto( costs, plant_supply, city_requirements, warm_start: Solution = None, capacities = None ):
+    name = choose_solver( costs, capacities )
+    solution = SOLVERS[ name ]( costs, plant_supply, city_requirements, warm_start = warm_start, capacities = capacities )
+    solution.solver = name
+    return solution
+
+# /----------------| Racing |----------------\
+RACE_BACKENDS = ( 'simplex', 'highs', 'cbc' )
+# How long past the time limit the race waits for a backend to give up on its own
+RACE_GRACE = 5.0
+# Below this many cells starting the racers takes longer than any backend (a dense 300 x 300 instance solves in
+# about 0.25 s, its race takes over a second), so smaller instances get the automatic choice instead
+RACE_MIN_CELLS = AUTO_SIMPLEX_CELLS
+
+def _race( connection, name: str, args: tuple, warm_start: Solution, capacities, limits: dict ):
+    # Runs in its own process; solver models stay behind since they do not always pickle
+    LIMITS.update( limits )
+    try:
+        solution = SOLVERS[ name ]( *args, warm_start = warm_start, capacities = capacities )
+        connection.send( Solution( solution.status, solution.objective, solution.supply, solution.basis, solution.duals, solver = name ) )
+    except Exception: connection.send( None )
+    finally: connection.close()
+
+def solve_race( costs, plant_supply, city_requirements, warm_start: Solution = None, capacities = None, backends: tuple = None ):
+    # Every backend solves in a process of its own; the first definite answer wins and the others are stopped.
+    # Meant for large instances from the command line and batches: small ones, and daemonic processes (e.g.
+    # background jobs) that cannot start any, solve with the automatic choice
+    if multiprocessing.current_process().daemon or asarray( costs ).size < RACE_MIN_CELLS:
+        return solve_auto( costs, plant_supply, city_requirements, warm_start, capacities )
+    backends = [ 
+        name for name in ( backends or RACE_BACKENDS ) 
+        if name in SOLVERS and ( name != 'simplex' or _simplex_fits( costs, capacities ) ) 
+    ]
+    if warm_start is not None: 
+        warm_start = Solution( warm_start.status, warm_start.objective, warm_start.supply, warm_start.basis, warm_start.duals )
+    context = process_context()
+    racers, fallback = {}, None
+    deadline = None if LIMITS['time_limit'] is None else perf_counter() + LIMITS['time_limit'] + RACE_GRACE
+    with phase( 'solve' ):
+        try:
+            for name in backends:
+                receiver, sender = context.Pipe( duplex=False )
+                process = context.Process( 
+                    target=_race, args=( sender, name, ( costs, plant_supply, city_requirements ), warm_start, capacities, dict( LIMITS ) ), 
+                    daemon=True 
+                )
+                process.start()
+                sender.close()
+                racers[ receiver ] = process
+            while racers:
+                ready = wait( list( racers ), None if deadline is None else max( deadline - perf_counter(), 0 ) )
+                if not ready: break
+                for receiver in ready:
+                    racers.pop( receiver )
+                    # A backend that crashed closes its end without sending
+                    try: solution = receiver.recv()
+                    except EOFError: solution = None
+                    if solution is None: continue
+                    if solution.status != NOT_SOLVED: return solution
+                    fallback = fallback or solution
+        finally:
+            for process in racers.values(): process.terminate()
+            for process in racers.values(): process.join()
+    return fallback or Solution( NOT_SOLVED, None, zeros(( len( plant_supply ), len( city_requirements ) )), solver = 'race' )
+
+# /----------------| Registry |----------------\
+SOLVERS = {
+    'cbc': solve_cbc,
+    'simplex': solve_simplex,
+    'highs': solve_highs
+}
+
+def register( name: str, solver ):
+    # solver( costs, plant_supply, city_requirements, warm_start = None, capacities = None ) -> Solution;
+    # registered backends can be chosen anywhere a solver name is taken and can join races
+    SOLVERS[ name ] = solver
+    return solver
+
+register( 'auto', solve_auto )
+register( 'race', solve_race )
+register( 'network', solve_network_matrix )
+
+def get_supply( kwh: array ):
+    from pulp import value
+    return array([ [ value(item) for item in column ] for column in kwh ], dtype=float )
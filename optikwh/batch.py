@@ -0,0 +1,70 @@
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+
+from numpy import asarray, broadcast_to, full, zeros, nan, float64, int64
+
+from optikwh.backends import SOLVERS
+from optikwh.solution import Solution, OPTIMAL
+
+# /----------------| Scenario stacks |----------------\
+def _stack( costs, plant_supply, city_requirements ):
+    # Broadcasts shared inputs so every scenario gets its own (plants, cities) costs, supply and requirements
+    costs = asarray( costs, dtype=float64 )
+    plant_supply = asarray( plant_supply, dtype=float64 )
+    city_requirements = asarray( city_requirements, dtype=float64 )
+    plants, cities = costs.shape[ -2: ]
+    scenarios = max( 
+        costs.shape[0] if costs.ndim == 3 else 1, 
+        plant_supply.shape[0] if plant_supply.ndim == 2 else 1, 
+        city_requirements.shape[0] if city_requirements.ndim == 2 else 1 
+    )
+    return (
+        broadcast_to( costs, ( scenarios, plants, cities ) ),
+        broadcast_to( plant_supply, ( scenarios, plants ) ),
+        broadcast_to( city_requirements, ( scenarios, cities ) )
+    )
+
+def _solve_chunk( solver: str, costs, plant_supply, city_requirements, base: Solution = None ):
+    scenarios, plants, cities = costs.shape
+    objectives, statuses = full( scenarios, nan ), zeros( scenarios, dtype=int64 )
+    supplies = zeros(( scenarios, plants, cities ))
+    for k in range( scenarios ):
+        # Every scenario starts from the same base plan: starting from the chunk's previous scenario would make
+        # the optimum picked for a degenerate scenario depend on how the scenarios were split between workers
+        solution = SOLVERS[ solver ]( costs[ k ], plant_supply[ k ], city_requirements[ k ], warm_start = base )
+        statuses[ k ] = solution.status
+        if solution.status == OPTIMAL: objectives[ k ], supplies[ k ] = solution.objective, solution.supply
+    return objectives, statuses, supplies
+
+# /----------------| Batch solver |----------------\
+def solve_batch( costs, plant_supply, city_requirements, solver: str = 'simplex', workers: int = None, chunksize: int = None ):
+    # costs: (S, plants, cities) or (plants, cities); plant_supply: (S, plants) or (plants,); city_requirements: (S, cities) or (cities,)
+    costs, plant_supply, city_requirements = _stack( costs, plant_supply, city_requirements )
+    scenarios = costs.shape[0]
+    workers = max( 1, min( workers or cpu_count() or 1, scenarios ) )
+    chunksize = chunksize or max( 1, -( -scenarios // ( workers * 4 ) ) )
+    chunks = [ slice( start, start + chunksize ) for start in range( 0, scenarios, chunksize ) ]
+
+    # The first scenario's optimum is the base every scenario warm-starts from; solver models stay behind since
+    # they do not always pickle
+    base = SOLVERS[ solver ]( costs[0], plant_supply[0], city_requirements[0] )
+    base = Solution( base.status, base.objective, base.supply, base.basis, base.duals ) if base.status == OPTIMAL else None
+
+    if workers == 1:
+        results = [ _solve_chunk( solver, costs[ chunk ], plant_supply[ chunk ], city_requirements[ chunk ], base ) for chunk in chunks ]
+    else:
+        with ProcessPoolExecutor( max_workers=workers ) as pool:
+            # map keeps submission order, so results line up with the scenario axis
+            results = list( pool.map( 
+                _solve_chunk, 
+                [ solver ] * len( chunks ),
+                [ costs[ chunk ] for chunk in chunks ],
+                [ plant_supply[ chunk ] for chunk in chunks ],
+                [ city_requirements[ chunk ] for chunk in chunks ],
+                [ base ] * len( chunks )
+            ))
+
+    objectives, statuses, supplies = full( scenarios, nan ), zeros( scenarios, dtype=int64 ), zeros( costs.shape )
+    for chunk, ( objective, status, supply ) in zip( chunks, results ):
+        objectives[ chunk ], statuses[ chunk ], supplies[ chunk ] = objective, status, supply
+    return objectives, statuses, supplies
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+
+from numpy import ascontiguousarray, float64
+
+from optikwh.solution import Solution
+
+# /----------------| Solved instances LRU |----------------\
+class SolutionCache:
+    def __init__( self, max_entries: int = 256, max_bytes: int = 64 * 2**20 ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits, self.misses = 0, 0
+        self.lock = Lock()
+
+    @staticmethod
+    def key( costs, plant_supply, city_requirements, capacities = None ):
+        digest = blake2b( digest_size=16 )
+        for item in ( costs, plant_supply, city_requirements ) + ( () if capacities is None else ( capacities, ) ):
+            item = ascontiguousarray( item, dtype=float64 )
+            digest.update( str( item.shape ).encode() )
+            digest.update( item.tobytes() )
+        return digest.hexdigest()
+
+    def get( self, key: str ):
+        with self.lock:
+            entry = self.entries.get( key )
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end( key )
+            self.hits += 1
+            return entry[0]
+
+    def put( self, key: str, solution: Solution ):
+        # Solver models (e.g. the PuLP problem) are not kept, only the arrays needed to answer again
+        solution = Solution( solution.status, solution.objective, solution.supply, solution.basis, solution.duals )
+        size = _nbytes( solution )
+        if size > self.max_bytes: return
+        with self.lock:
+            if key in self.entries: self.size -= self.entries.pop( key )[1]
+            self.entries[ key ] = ( solution, size )
+            self.size += size
+            while len( self.entries ) > self.max_entries or self.size > self.max_bytes:
+                self.size -= self.entries.popitem( last=False )[1][1]
+
+    def clear( self ):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats( self ):
+        return {
+            'entries': len( self.entries ),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+def _nbytes( solution: Solution ):
+    arrays = [ solution.supply ] + list( solution.basis or () ) + list( solution.duals or () )
+    return sum( getattr( item, 'nbytes', 0 ) for item in arrays )
+
+SOLUTION_CACHE = SolutionCache()
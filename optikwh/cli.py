@@ -0,0 +1,204 @@
+import csv
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+from pandas import read_csv
+
+from optikwh.backends import SOLVERS, LIMITS, configure
+from optikwh.io import FORMATS, read_table, split_table, read_problem, is_problem_table
+from optikwh.network import is_network_list, network_from_edges, solve_network
+from optikwh.periods import solve_periods
+from optikwh.routes import is_edge_list, routes_from_edges, solve_routes
+from optikwh.solution import STATUS
+
+# /----------------| Inputs |----------------\
+def find_files( paths: list ):
+    # ( path, found ) pairs: found in a directory rather than named, so tables that are not problems are skipped
+    files = []
+    for path in paths:
+        if os.path.isdir( path ):
+            files += sorted( 
+                ( os.path.join( path, name ), True ) for name in os.listdir( path ) 
+                if name.split('.')[-1] in FORMATS 
+            )
+        else: files.append(( path, False ))
+    return files
+
+def solve_file( file_path: str, solver: str, found: bool = False ):
+    try:
+        data = read_table( file_path, file_path.split('.')[-1] )
+        if found and not is_problem_table( data ):
+            # e.g. the Data/cities.csv gazetteer next to the problems
+            return { 'file': file_path, 'status': 'Skipped', 'objective': None, 'error': 'Not a problem table' }
+        if is_network_list( data.columns ):
+            # Arc lists may route through hubs; shipments are the flows on every arc
+            network = network_from_edges( data )
+            solution = solve_network( network, time_limit = LIMITS['time_limit'] )
+            shipments = zip( network.nodes[ network.tails ], network.nodes[ network.heads ], solution.supply )
+        elif is_edge_list( data.columns ):
+            # Edge lists are solved on their routes only, without a dense matrix
+            routes = routes_from_edges( data )
+            solution = solve_routes( routes )
+            shipments = zip( routes.plants[ routes.rows ], routes.cities[ routes.cols ], solution.supply )
+        else:
+            costs, plant_supply, city_requirements, capacities = split_table( data )
+            solution = SOLVERS[ solver ]( 
+                costs.values, plant_supply.values, city_requirements.values, 
+                capacities = None if capacities is None else capacities.values 
+            )
+            shipments = (
+                ( plant, city, kwh ) for plant, row in zip( costs.index, solution.supply )
+                for city, kwh in zip( costs.columns, row )
+            )
+    except Exception as error:
+        return { 'file': file_path, 'status': 'Error', 'objective': None, 'error': str( error ) }
+    return {
+        'file': file_path,
+        'status': STATUS.get( solution.status, str( solution.status ) ),
+        'objective': solution.objective,
+        'shipments': [ { 'plant': plant, 'city': city, 'kwh': float( kwh ) } for plant, city, kwh in shipments if kwh > 0 ]
+    }
+
+# /----------------| Outputs |----------------\
+class CsvWriter:
+    def __init__( self, stream, shipments: bool, key: str = 'file' ):
+        self.shipments = shipments
+        self.key = key
+        self.writer = csv.writer( stream )
+        self.writer.writerow([ key, 'status', 'objective' ] + ( [ 'plant', 'city', 'kwh' ] if shipments else [] ))
+
+    def write( self, result: dict ):
+        head = [ result[ self.key ], result['status'], result['objective'] ]
+        if not self.shipments or not result.get( 'shipments' ): 
+            self.writer.writerow( head + ( [ '', '', '' ] if self.shipments else [] ) )
+            return
+        for item in result['shipments']:
+            self.writer.writerow( head + [ item['plant'], item['city'], item['kwh'] ] )
+
+class JsonLinesWriter:
+    def __init__( self, stream, shipments: bool, key: str = 'file' ):
+        self.stream = stream
+        self.shipments = shipments
+
+    def write( self, result: dict ):
+        if not self.shipments: result = { key: item for key, item in result.items() if key != 'shipments' }
+        self.stream.write( json.dumps( result, default=str ) + '\n' )
+
+WRITERS = { 'csv': CsvWriter, 'jsonl': JsonLinesWriter }
+
+# /----------------| Commands |----------------\
+def solve( args ):
+    files = find_files( args.paths )
+    stream = open( args.output, 'w', newline='' ) if args.output else sys.stdout
+    writer = WRITERS[ args.format ]( stream, args.shipments )
+    failed = False
+    try:
+        if args.workers == 1:
+            results = ( solve_file( path, args.solver, found ) for path, found in files )
+            for result in results:
+                writer.write( result ); stream.flush()
+                failed |= result['status'] == 'Error'
+        else:
+            # Limits are handed to every worker explicitly, whatever the process start method
+            with ProcessPoolExecutor( max_workers=args.workers, initializer=configure, initargs=( LIMITS['time_limit'], LIMITS['threads'], LIMITS['mip_gap'] ) ) as pool:
+                # Results are streamed in input order as soon as each one is ready
+                paths, found = [ path for path, _ in files ], [ found for _, found in files ]
+                for result in pool.map( solve_file, paths, [ args.solver ] * len( files ), found ):
+                    writer.write( result ); stream.flush()
+                    failed |= result['status'] == 'Error'
+    finally:
+        if stream is not sys.stdout: stream.close()
+    return int( failed )
+
+# /----------------| Periods |----------------\
+PERIOD_CHUNK = 1024
+
+def _read_profile( path: str, names, what: str ):
+    # One row per period with a column per plant or city; read in chunks so long horizons never sit in memory
+    for chunk in read_csv( path, index_col=0, chunksize=PERIOD_CHUNK ):
+        chunk.columns = chunk.columns.astype( str )
+        missing = [ name for name in names if name not in chunk.columns ]
+        if missing: raise ValueError( f'{ path } has no column for { what } ' + ', '.join( missing ) )
+        values = chunk[ list( names ) ].to_numpy( dtype=float )
+        yield from zip( chunk.index, values )
+
+def periods( args ):
+    costs, plant_supply, city_requirements, capacities = read_problem( args.problem )
+    plants, cities = [ str( name ) for name in costs.index ], [ str( name ) for name in costs.columns ]
+    demand = _read_profile( args.demand, cities, 'city' )
+    # Both profiles are walked in step, so the period labels come from the demand file
+    labels = []
+    def requirements():
+        for label, values in demand:
+            labels.append( label )
+            yield values
+    supplies = None if args.supply is None else ( values for _, values in _read_profile( args.supply, plants, 'plant' ) )
+
+    stream = open( args.output, 'w', newline='' ) if args.output else sys.stdout
+    writer = WRITERS[ args.format ]( stream, args.shipments, 'period' )
+    failed = False
+    try:
+        solutions = solve_periods( 
+            costs.values, plant_supply.values, requirements(), args.solver, 
+            None if capacities is None else capacities.values, supplies 
+        )
+        for solution in solutions:
+            status = STATUS.get( solution.status, str( solution.status ) )
+            writer.write({
+                'period': labels.pop(),
+                'status': status,
+                'objective': solution.objective,
+                'shipments': [ 
+                    { 'plant': plant, 'city': city, 'kwh': float( kwh ) } 
+                    for plant, row in zip( plants, solution.supply ) for city, kwh in zip( cities, row ) if kwh > 0 
+                ] if args.shipments else []
+            })
+            failed |= status != 'Optimal'
+        stream.flush()
+    except ValueError as error:
+        # Profiles that do not match the problem or each other; the periods solved before are already written
+        stream.flush()
+        print( f'python -m optikwh periods: error: { error }', file=sys.stderr )
+        return 2
+    finally:
+        if stream is not sys.stdout: stream.close()
+    return int( failed )
+
+def _add_limits( parser ):
+    parser.add_argument( '--time-limit', type=float, help='Seconds a solver may run on one problem before giving up' )
+    parser.add_argument( '--threads', type=int, help='Threads per CBC solve' )
+    parser.add_argument( '--mip-gap', type=float, help='Relative gap between plan and bound at which CBC stops branching' )
+
+def make_parser():
+    parser = ArgumentParser( prog='python -m optikwh', description='Headless kWh transportation solver' )
+    commands = parser.add_subparsers( dest='command', required=True )
+
+    solver = commands.add_parser( 'solve', help='Solve input files in the Data/sample.csv layout or plant,city,cost[,capacity] edge lists' )
+    solver.add_argument( 'paths', nargs='+', help='Input files (.csv, .xlsx, .xls) or directories of them; tables in a directory that are not problems are skipped' )
+    solver.add_argument( '--solver', choices=sorted( SOLVERS ), default='simplex' )
+    _add_limits( solver )
+    solver.add_argument( '--workers', type=int, default=1, help='Parallel worker processes' )
+    solver.add_argument( '--format', choices=sorted( WRITERS ), default='csv' )
+    solver.add_argument( '--output', '-o', help='Output file, standard output by default' )
+    solver.add_argument( '--shipments', action='store_true', help='Include the non-zero shipments of every solution' )
+    solver.set_defaults( run=solve )
+
+    horizon = commands.add_parser( 'periods', help='Solve one problem for every period of a demand profile, reusing the model between periods' )
+    horizon.add_argument( 'problem', help='Problem file in the Data/sample.csv layout or an edge list; its supplies are used unless --supply is given' )
+    horizon.add_argument( '--demand', required=True, help='CSV with a period column followed by one column per city' )
+    horizon.add_argument( '--supply', help='CSV with a period column followed by one column per plant' )
+    horizon.add_argument( '--solver', choices=sorted( SOLVERS ), default='simplex' )
+    _add_limits( horizon )
+    horizon.add_argument( '--format', choices=sorted( WRITERS ), default='csv' )
+    horizon.add_argument( '--output', '-o', help='Output file, standard output by default' )
+    horizon.add_argument( '--shipments', action='store_true', help='Include the non-zero shipments of every period' )
+    horizon.set_defaults( run=periods )
+    return parser
+
+def main( argv: list = None ):
+    args = make_parser().parse_args( argv )
+    configure( args.time_limit, args.threads, args.mip_gap )
+    return args.run( args )
@@ -0,0 +1,34 @@
+from functools import lru_cache
+
+from numpy import asarray, radians, sin, cos, arcsin, sqrt, float64
+
+from optikwh.locations import Gazetteer, load_gazetteer
+
+EARTH_RADIUS = 6371.0
+
+# /----------------| Great circle distances |----------------\
+def haversine_matrix( lat1, lng1, lat2, lng2 ):
+    # Kilometres from every point of the first set (rows) to every point of the second set (columns)
+    lat1, lng1 = radians( asarray( lat1, dtype=float64 ) )[ :, None ], radians( asarray( lng1, dtype=float64 ) )[ :, None ]
+    lat2, lng2 = radians( asarray( lat2, dtype=float64 ) )[ None, : ], radians( asarray( lng2, dtype=float64 ) )[ None, : ]
+    a = sin(( lat2 - lat1 ) / 2 ) ** 2 + cos( lat1 ) * cos( lat2 ) * sin(( lng2 - lng1 ) / 2 ) ** 2
+    return 2 * EARTH_RADIUS * arcsin( sqrt( a.clip( 0, 1 ) ) )
+
+@lru_cache( maxsize=32 )
+def _distances( plants: tuple, cities: tuple, gazetteer: Gazetteer ):
+    # Unknown locations have no coordinates, so their distances are NaN
+    nan = float( 'nan' )
+    distances = haversine_matrix( *gazetteer.coordinates( plants, nan ), *gazetteer.coordinates( cities, nan ) )
+    # Shared between callers through the cache
+    distances.setflags( write=False )
+    return distances
+
+def distance_matrix( plants, cities, gazetteer: Gazetteer = None ):
+    # Cached per set of plant and city names
+    return _distances( tuple( plants ), tuple( cities ), gazetteer or load_gazetteer() )
+
+# /----------------| Distance derived costs |----------------\
+def distance_costs( plants, cities, per_km: float = 1.0, fee: float = 0.0, gazetteer: Gazetteer = None ):
+    # Cost of a route is a fixed fee plus a rate per km; routes to unknown locations are left out (NaN)
+    if per_km < 0 or fee < 0: raise ValueError( 'Cost per km and fixed fee must not be negative' )
+    return fee + per_km * distance_matrix( plants, cities, gazetteer )
@@ -0,0 +1,146 @@
+import os
+import re
+import tempfile
+from threading import Event, Thread
+
+from numpy import array, asarray, isfinite, where, zeros, sum, float64
+
+from optikwh.backends import cbc_command, get_supply
+from optikwh.solution import Solution, OPTIMAL, NOT_SOLVED, INFEASIBLE
+from optikwh.timing import phase
+
+# Seconds between reads of the CBC log while it searches
+LOG_INTERVAL = 0.25
+
+# /----------------| CBC log |----------------\
+# Lines CBC writes while it branches: new plans, node counts with the bound, and how the search ended
+_INCUMBENT = re.compile( r'Cbc0012I Integer solution of (\S+) found .* after \d+ iterations and (\d+) nodes' )
+_NODES = re.compile( r'Cbc0010I After (\d+) nodes, \d+ on tree, (\S+) best solution, best possible (\S+)' )
+_PARTIAL = re.compile( r'Cbc0005I Partial search - best objective (\S+) \(best possible (\S+)\), took \d+ iterations and (\d+) nodes' )
+_GAP = re.compile( r'Cbc0011I Exiting as integer gap of (\S+) less than' )
+_COMPLETE = re.compile( r'Cbc0001I Search completed - best objective (\S+), took \d+ iterations and (\d+) nodes' )
+
+def _number( text: str ):
+    try: value = float( text )
+    except ValueError: return None
+    # CBC writes 1e+50 before it has a plan
+    return value if abs( value ) < 1e49 else None
+
+class _Search:
+    # Best plan, bound and node count read so far
+    def __init__( self ):
+        self.objective, self.bound, self.nodes = None, None, 0
+        self.gap = None
+
+    def read( self, line: str ):
+        if match := _INCUMBENT.search( line ):
+            self.objective, self.nodes = _number( match[1] ), int( match[2] )
+        elif match := _NODES.search( line ):
+            self.nodes, self.objective, self.bound = int( match[1] ), _number( match[2] ) or self.objective, _number( match[3] )
+        elif match := _PARTIAL.search( line ):
+            self.objective, self.bound, self.nodes = _number( match[1] ), _number( match[2] ), int( match[3] )
+        elif match := _GAP.search( line ):
+            self.gap = _number( match[1] )
+        elif match := _COMPLETE.search( line ):
+            # Complete up to the MIP gap when the search stopped on it
+            self.objective, self.nodes = _number( match[1] ), int( match[2] )
+            self.bound = self.objective - ( self.gap or 0.0 )
+
+class _Log:
+    # Where CBC writes its log, read back while it runs. Written to a file, CBC's output is block buffered and would
+    # arrive in bursts; a pseudo-terminal gets every line as it happens. Without one (Windows) a file is followed
+    def __init__( self ):
+        self.file, self.pending = None, b''
+        try:
+            self.fd, self.terminal = os.openpty()
+            os.set_blocking( self.fd, False )
+            self.path = os.ttyname( self.terminal )
+        except ( AttributeError, OSError ):
+            self.fd, self.path = tempfile.mkstemp( prefix='optikwh-cbc-', suffix='.log' )
+            self.terminal, self.file = None, self.path
+
+    def lines( self ):
+        # Complete lines written since the last call
+        chunks = [ self.pending ]
+        while True:
+            # Nothing to read yet, or the terminal is closed on CBC's side
+            try: chunk = os.read( self.fd, 65536 )
+            except OSError: break
+            if not chunk: break
+            chunks.append( chunk )
+        *lines, self.pending = b''.join( chunks ).split( b'\n' )
+        return [ line.decode( errors='replace' ) for line in lines ]
+
+    def close( self ):
+        for fd in ( self.fd, self.terminal ):
+            if fd is not None: os.close( fd )
+        if self.file is not None: os.remove( self.file )
+
+def _watch( log: _Log, search: _Search, progress, done: Event ):
+    # Follows the log until the solve ends, calling progress( objective, bound, nodes ) on every better plan or bound
+    reported = None
+    while True:
+        finished = done.wait( LOG_INTERVAL )
+        for line in log.lines(): search.read( line )
+        if progress is not None and search.objective is not None and ( search.objective, search.bound ) != reported:
+            reported = search.objective, search.bound
+            progress( search.objective, search.bound, search.nodes )
+        if finished: return
+
+# /----------------| Fixed-charge model |----------------\
+def solve_fixed_charge( costs, plant_supply, city_requirements, fixed_costs, capacities = None, progress = None ):
+    # Every plant that ships anything pays its fixed cost, through a binary open variable per plant; CBC branches on
+    # them within the configured time limit, threads and MIP gap. Optimal within the gap, Not Solved with the best
+    # plan and its bound when the time limit stops the search first
+    from pulp import LpProblem, LpMinimize, LpVariable, LpContinuous, LpBinary, LpSolutionIntegerFeasible, value
+
+    costs = asarray( costs, dtype=float64 )
+    fixed_costs = asarray( fixed_costs, dtype=float64 )
+    if ( fixed_costs < 0 ).any() or not isfinite( fixed_costs ).all(): raise ValueError( 'Fixed costs must be finite and not negative' )
+    routes = isfinite( costs )
+    plants, cities = costs.shape
+
+    def upper( i, j ):
+        if capacities is None or not isfinite( capacities[ i ][ j ] ): return None
+        return capacities[ i ][ j ]
+
+    with phase( 'build' ):
+        problem = LpProblem( 'Min_supply_fixed_charge', LpMinimize )
+        kwh = array([
+            [
+                LpVariable( f'Plant{i+1}ToCity{j+1}', lowBound=0, upBound=upper( i, j ), cat=LpContinuous ) if routes[ i, j ] else 0
+                for j in range( cities )
+            ]
+            for i in range( plants )
+        ], dtype=object )
+        # Plants without a fixed cost are always open
+        opened = [ LpVariable( f'Open{i+1}', cat=LpBinary ) if fixed_costs[ i ] > 0 else 1 for i in range( plants ) ]
+        problem += sum( kwh*where( routes, costs, 0 ) ) + sum([ fixed_costs[ i ] * opened[ i ] for i in range( plants ) if fixed_costs[ i ] > 0 ])
+
+        for i, supply in enumerate( sum( kwh, axis = 1 ) ):
+            if routes[ i ].any(): problem += supply <= plant_supply[ i ] * opened[ i ]
+        for j, supply in enumerate( sum( kwh, axis = 0 ) ):
+            if routes[ :, j ].any(): problem += supply >= city_requirements[ j ]
+            # A city without routes can only be served when it requires nothing
+            elif city_requirements[ j ] > 0: return Solution( INFEASIBLE, None, zeros(( plants, cities )), solver = 'fixed-charge' )
+
+    # CBC only reports its progress to the log, which is followed from another thread while it runs
+    log, search, done = _Log(), _Search(), Event()
+    watcher = Thread( target=_watch, args=( log, search, progress, done ), daemon=True )
+    watcher.start()
+    try:
+        with phase( 'solve' ):
+            problem.solve( cbc_command( logPath=log.path ) )
+    finally:
+        done.set()
+        watcher.join()
+        log.close()
+
+    if problem.status != OPTIMAL:
+        status = INFEASIBLE if problem.status == INFEASIBLE else NOT_SOLVED
+        return Solution( status, None, zeros(( plants, cities )), model = problem, solver = 'fixed-charge' )
+    with phase( 'extract' ):
+        supply = get_supply( kwh )
+    # PuLP calls a plan cut short by the time limit optimal as well
+    status = NOT_SOLVED if problem.sol_status == LpSolutionIntegerFeasible else OPTIMAL
+    return Solution( status, value( problem.objective ), supply, model = problem, solver = 'fixed-charge', bound = search.bound )
@@ -0,0 +1,81 @@
+from numpy import array, asarray, concatenate, cumsum, diff, arange, argsort, isfinite, ones, zeros, float64, int64
+
+from optikwh.simplex import balance, vogel, TOLERANCE
+from optikwh.solution import Solution, NOT_SOLVED, INFEASIBLE
+from optikwh.timing import phase
+
+# Construction heuristics for the balanced problem (surplus column included). Each returns a spanning tree basis
+# of plants + cities - 1 cells and their flows, so the transportation simplex can start from it
+
+# /----------------| Northwest corner |----------------\
+def northwest_corner( costs, supply, demand ):
+    # Walking from the top left cell, reaching a row or column total moves one step down or right;
+    # merging the running totals gives every step at once. Ties close the row first, the last row and column close together
+    plants, cities = costs.shape
+    ends = concatenate([ cumsum( supply )[ :-1 ], cumsum( demand )[ :-1 ] ])
+    closes_row = concatenate([ ones( plants - 1, dtype=bool ), zeros( cities - 1, dtype=bool ) ])
+    order = argsort( ends, kind='stable' )
+    basis_rows = concatenate([ [ 0 ], cumsum( closes_row[ order ] ) ]).astype( int64 )
+    basis_cols = arange( plants + cities - 1, dtype=int64 ) - basis_rows
+    flows = diff( concatenate([ [ 0.0 ], ends[ order ], [ supply.sum() ] ]) ).clip( 0 )
+    return basis_rows, basis_cols, flows
+
+# /----------------| Least cost |----------------\
+def least_cost( costs, supply, demand ):
+    # Cells are filled cheapest first; each allocation crosses out one line, and the last line takes what is left
+    plants, cities = costs.shape
+    supply, demand = supply.tolist(), demand.tolist()
+    rows, cols = [ True ] * plants, [ True ] * cities
+    left_rows, left_cols = plants, cities
+    basis_rows, basis_cols, flows = [], [], []
+
+    def allocate( i, j ):
+        amount = min( supply[ i ], demand[ j ] )
+        supply[ i ] -= amount
+        demand[ j ] -= amount
+        basis_rows.append( i ); basis_cols.append( j ); flows.append( amount )
+
+    for cell in argsort( costs, axis=None, kind='stable' ).tolist():
+        if left_rows == 1 or left_cols == 1: break
+        i, j = divmod( cell, cities )
+        if not rows[ i ] or not cols[ j ]: continue
+        allocate( i, j )
+        if supply[ i ] <= demand[ j ]: rows[ i ], left_rows = False, left_rows - 1
+        else: cols[ j ], left_cols = False, left_cols - 1
+
+    if left_rows == 1:
+        i = rows.index( True )
+        for j in range( cities ):
+            if cols[ j ]: allocate( i, j )
+    else:
+        j = cols.index( True )
+        for i in range( plants ):
+            if rows[ i ]: allocate( i, j )
+    return array( basis_rows, dtype=int64 ), array( basis_cols, dtype=int64 ), array( flows )
+
+HEURISTICS = {
+    'vogel': vogel,
+    'least_cost': least_cost,
+    'northwest': northwest_corner
+}
+
+# /----------------| Plans |----------------\
+def heuristic_solution( costs, supply, demand, method: str = 'vogel' ):
+    # A feasible plan, optimal only by chance: its status is Not Solved, and its basis is a valid warm start.
+    # Needs every route present, like the dense simplex
+    costs = asarray( costs, dtype=float64 )
+    if not isfinite( costs ).all(): raise ValueError( 'Heuristic plans need a cost for every route' )
+    plants, cities = costs.shape
+    balanced, supply, demand, surplus = balance( costs, supply, demand )
+    if surplus < -TOLERANCE: return Solution( INFEASIBLE, None, zeros(( plants, cities )), solver = method )
+    with phase( 'heuristic' ):
+        basis_rows, basis_cols, flows = HEURISTICS[ method ]( balanced, supply, demand )
+        shipped = zeros( balanced.shape )
+        shipped[ basis_rows, basis_cols ] = flows
+        shipped = shipped[ :, :cities ]
+    return Solution( NOT_SOLVED, float(( shipped * costs ).sum() ), shipped, ( basis_rows, basis_cols, flows ), solver = method )
+
+def gap( objective: float, bound: float ):
+    # Relative distance of a plan's cost from the optimum
+    if objective is None or bound is None: return None
+    return ( objective - bound ) / max( abs( bound ), TOLERANCE )
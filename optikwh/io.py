@@ -0,0 +1,142 @@
+import binascii
+import csv
+import zlib
+from base64 import b64decode
+from io import BytesIO
+
+from pandas import read_csv, read_excel, isna, Series, DataFrame
+from pandas.api.types import is_numeric_dtype
+
+from optikwh.network import is_network_list
+from optikwh.routes import is_edge_list, routes_from_edges
+
+FORMATS = ( 'csv', 'xlsx', 'xls' )
+# Hubs have no place in the plant x city model
+NETWORK_ONLY = 'Network lists (from, to, cost) can only be solved with python -m optikwh solve'
+
+# /----------------| Problem files |----------------\
+def read_table( source, format: str ):
+    match format:
+        case 'csv': data = read_csv( source, index_col=0 )
+        case 'xlsx': data = read_excel( source, index_col=0 )
+        case 'xls': data = read_excel( source, index_col=0 )
+        case _: raise ValueError("Unsupported file format")
+    # Edge lists keep their plant column, arc lists their from column
+    columns = [ data.index.name ] + list( data.columns )
+    if is_edge_list( columns ) or is_network_list( columns ): data = data.reset_index()
+    return data
+
+def split_table( data: DataFrame ):
+    # Returns costs, plant supply, city requirements and route capacities (None when uncapacitated);
+    # blank or infinite costs are missing routes
+    if is_edge_list( data.columns ): return routes_from_edges( data ).to_frames()
+    if is_network_list( data.columns ): raise ValueError( NETWORK_ONLY )
+
+    # Layout of Data/sample.csv: plant x city costs, supply as the last column, requirements as the last row
+    city_requirements = Series( data.iloc[-1,:-1], name='City requirements' )
+    plant_supply = Series(data.iloc[:-1, -1], name='Plant supply')
+    costs = data.drop(data.index[-1]).drop(data.columns[-1], axis=1)
+    return costs, plant_supply, city_requirements, None
+
+def is_problem_table( data: DataFrame ):
+    # Edge and arc lists by their columns; the matrix layout by a numeric body whose requirements row leaves the
+    # supply cell blank, which tells it apart from other tables of numbers such as Data/cities.csv
+    if is_edge_list( data.columns ) or is_network_list( data.columns ): return True
+    if data.shape[0] < 2 or data.shape[1] < 2 or not all( is_numeric_dtype( dtype ) for dtype in data.dtypes ): return False
+    return isna( data.iloc[ -1, -1 ] )
+
+def read_problem( file_path: str ):
+    return split_table( read_table( file_path, file_path.split('.')[-1] ) )
+
+# /----------------| Uploads |----------------\
+MAX_UPLOAD_BYTES = 10 * 2**20
+CHUNK = 1 << 16
+
+class UploadError( ValueError ):
+    pass
+
+EMPTY_TABLE = 'No plants or cities in the table'
+
+class _TableLimits:
+    # Counts plant rows and city columns of a CSV as it is decoded so oversized tables stop early
+    def __init__( self, max_rows: int, max_cols: int ):
+        self.max_rows, self.max_cols = max_rows, max_cols
+        self.lines, self.header = 0, b''
+
+    def feed( self, data: bytes ):
+        if self.lines == 0:
+            end = data.find( b'\n' )
+            self.header += data if end < 0 else data[ :end ]
+            columns = next( csv.reader([ self.header.decode( 'utf-8-sig', 'replace' ) ]) )
+            if end >= 0 and is_network_list( columns ): raise UploadError( NETWORK_ONLY )
+            if end >= 0 and is_edge_list( columns ):
+                # Edge lists have a line per route plus the supply and requirement lines
+                if self.max_rows and self.max_cols: self.max_rows = self.max_rows * self.max_cols + self.max_rows + self.max_cols
+                self.max_cols = None
+            # Index and supply columns around the cities
+            if self.max_cols and len( columns ) - 2 > self.max_cols: 
+                raise UploadError( f'Too many cities: {len( columns ) - 2} > {self.max_cols}' )
+        self.lines += data.count( b'\n' )
+        # Header and requirements lines around the plants
+        if self.max_rows and self.lines - 2 > self.max_rows: 
+            raise UploadError( f'Too many plants: more than {self.max_rows}' )
+
+def _decode( content: str, compressed: bool, max_bytes: int, limits: _TableLimits = None ):
+    buffer = BytesIO()
+    inflater = zlib.decompressobj( 16 + zlib.MAX_WBITS ) if compressed else None
+    # CHUNK is a multiple of 4, so every slice of the base64 string decodes on its own
+    for start in range( 0, len( content ), CHUNK ):
+        try: data = b64decode( content[ start:start + CHUNK ], validate=True )
+        except binascii.Error as error: raise UploadError( f'Invalid upload encoding: {error}' )
+        if inflater is not None:
+            try: data = inflater.decompress( data, max_bytes - buffer.tell() + 1 )
+            except zlib.error as error: raise UploadError( f'Invalid gzip data: {error}' )
+            if inflater.unconsumed_tail: raise UploadError( f'Upload larger than {max_bytes} bytes once decompressed' )
+        if buffer.tell() + len( data ) > max_bytes: raise UploadError( f'Upload larger than {max_bytes} bytes' )
+        if limits is not None: limits.feed( data )
+        buffer.write( data )
+    buffer.seek( 0 )
+    return buffer
+
+def read_upload( contents: str, filename: str, max_bytes: int = MAX_UPLOAD_BYTES, max_rows: int = None, max_cols: int = None ):
+    # contents is the 'data:<mime>;base64,<payload>' string of a dcc.Upload
+    _, content = contents.split( ',', 1 )
+    parts = filename.lower().split( '.' )
+    compressed = parts[-1] == 'gz'
+    format = parts[-2] if compressed and len( parts ) > 2 else parts[-1]
+    if format not in FORMATS: raise UploadError( 'Unsupported file format' )
+    # The decoded size is known from the base64 length before decoding anything
+    if not compressed and len( content ) * 3 // 4 > max_bytes + 2:
+        raise UploadError( f'Upload larger than {max_bytes} bytes' )
+
+    if format == 'csv':
+        limits = _TableLimits( max_rows, max_cols )
+        data = read_table( _decode( content, compressed, max_bytes, limits ), format )
+    else:
+        buffer = _decode( content, compressed, max_bytes )
+        if format == 'xlsx':
+            from openpyxl import load_workbook
+            sheet = load_workbook( buffer, read_only=True ).active
+            header = next( sheet.iter_rows( max_row=1, values_only=True ), () )
+            if not is_edge_list( header ):
+                _check_shape( ( sheet.max_row or 1 ) - 2, ( sheet.max_column or 1 ) - 2, max_rows, max_cols )
+            buffer.seek( 0 )
+        data = read_table( buffer, format )
+
+    if is_network_list( data.columns ): raise UploadError( NETWORK_ONLY )
+    if data.empty: raise UploadError( EMPTY_TABLE )
+    if is_edge_list( data.columns ):
+        # Checked before the routes are spread into a dense matrix
+        routes = routes_from_edges( data )
+        _check_shape( len( routes.plants ), len( routes.cities ), max_rows, max_cols )
+        return routes.to_frames()
+    problem = split_table( data )
+    # A requirements row or supply column alone leaves no costs
+    if problem[0].empty: raise UploadError( EMPTY_TABLE )
+    _check_shape( problem[0].shape[0], problem[0].shape[1], max_rows, max_cols )
+    return problem
+
+def _check_shape( rows: int, cols: int, max_rows: int, max_cols: int ):
+    # Limits count plants and cities, i.e. without the requirements row and supply column
+    if max_rows and rows > max_rows: raise UploadError( f'Too many plants: {rows} > {max_rows}' )
+    if max_cols and cols > max_cols: raise UploadError( f'Too many cities: {cols} > {max_cols}' )
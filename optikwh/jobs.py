@@ -0,0 +1,164 @@
+import atexit
+import json
+import os
+import pickle
+import shutil
+import signal
+import tempfile
+import multiprocessing
+from threading import Lock
+from time import time
+from uuid import uuid4
+
+RUNNING, DONE, FAILED, CANCELLED, QUEUED = 'running', 'done', 'failed', 'cancelled', 'queued'
+
+# /----------------| Process start |----------------\
+def process_context( preload: tuple = None ):
+    # Forking a threaded web server could copy a lock some other thread holds: processes start from a fork server
+    # (spawned where there is none), which imports the preload modules once for every process it starts. The fork
+    # server is shared by the whole process, so the first preload given is the one it keeps
+    if 'forkserver' not in multiprocessing.get_all_start_methods(): return multiprocessing.get_context( 'spawn' )
+    context = multiprocessing.get_context( 'forkserver' )
+    if preload is not None: context.set_forkserver_preload( list( preload ) )
+    return context
+
+# /----------------| Job process |----------------\
+# Progress file of the job running in this process, None outside jobs
+_progress = None
+
+def report( **values ):
+    # Called by job functions while they run: the latest values are what poll returns until the result is in
+    if _progress is None: return
+    temporary = _progress + '.tmp'
+    with open( temporary, 'w' ) as file: json.dump( values, file )
+    os.replace( temporary, _progress )
+
+def _run( path: str, fn, args: tuple, progress: str = None ):
+    # Results are written next to the job's metadata, atomically, so any process can pick them up
+    global _progress
+    _progress = progress
+    try: outcome = ( DONE, fn( *args ) )
+    except Exception as error: outcome = ( FAILED, f'{ type( error ).__name__ }: { error }' )
+    temporary = path + '.tmp'
+    with open( temporary, 'wb' ) as file: pickle.dump( outcome, file, protocol=pickle.HIGHEST_PROTOCOL )
+    os.replace( temporary, path )
+
+# /----------------| Background jobs |----------------\
+class JobManager:
+    # One process per job, at most max_running at a time; job state lives in a directory shared by local workers
+    def __init__( self, directory: str = None, max_running: int = 2, preload: tuple = () ):
+        # A directory of our own is removed on exit, a shared one only loses this process's jobs
+        self.owned, self._directory = directory is None, directory
+        self.max_running = max_running
+        self.processes, self.pending, self.keys = {}, [], {}
+        self.lock = Lock()
+        self.context = process_context( preload )
+        if directory is not None: os.makedirs( directory, exist_ok=True )
+        atexit.register( self.shutdown )
+
+    @property
+    def directory( self ):
+        # Made on first use: job processes import the main module again, and would each leave one behind
+        if self._directory is None: self._directory = tempfile.mkdtemp( prefix='optikwh-jobs-' )
+        return self._directory
+
+    def _path( self, job: str, suffix: str ):
+        if not job.isalnum(): raise ValueError( f'Invalid job id {job!r}' )
+        return os.path.join( self.directory, job + suffix )
+
+    def _write_meta( self, job: str, **meta ):
+        temporary = self._path( job, '.json.tmp' )
+        with open( temporary, 'w' ) as file: json.dump( meta, file )
+        os.replace( temporary, self._path( job, '.json' ) )
+
+    def _read_meta( self, job: str ):
+        try:
+            with open( self._path( job, '.json' ) ) as file: return json.load( file )
+        except FileNotFoundError: return None
+
+    def _start( self, job: str, fn, args: tuple ):
+        process = self.context.Process( target=_run, args=( self._path( job, '.pkl' ), fn, args, self._path( job, '.progress' ) ), daemon=True )
+        process.start()
+        self.processes[ job ] = process
+        self._write_meta( job, state=RUNNING, pid=process.pid, started=time() )
+
+    def _start_pending( self ):
+        # Also reaps finished processes so they do not linger as zombies
+        multiprocessing.active_children()
+        running = sum( process.is_alive() for process in self.processes.values() )
+        while self.pending and running < self.max_running:
+            self._start( *self.pending.pop( 0 ) )
+            running += 1
+
+    def submit( self, fn, *args, key: str = None ):
+        # A new job for the same key (e.g. a session) replaces the one still running
+        with self.lock:
+            previous = self.keys.get( key ) if key is not None else None
+        if previous is not None: self.cancel( previous )
+
+        job = uuid4().hex
+        with self.lock:
+            if key is not None: self.keys[ key ] = job
+            self._write_meta( job, state=QUEUED, pid=None, started=time() )
+            self.pending.append(( job, fn, args ))
+            self._start_pending()
+        return job
+
+    def poll( self, job: str ):
+        # Returns ( state, elapsed seconds, result or error message ), or the job's last report while it runs
+        with self.lock: self._start_pending()
+        meta = self._read_meta( job )
+        if meta is None: return None
+        elapsed = time() - meta['started']
+        if meta['state'] == CANCELLED: return CANCELLED, elapsed, None
+
+        path = self._path( job, '.pkl' )
+        if os.path.exists( path ):
+            with open( path, 'rb' ) as file: state, result = pickle.load( file )
+            self._forget( job )
+            return state, elapsed, result
+
+        process = self.processes.get( job )
+        if process is not None and not process.is_alive() and not os.path.exists( path ):
+            # The process died without writing a result (killed, out of memory, ...)
+            self._forget( job )
+            return FAILED, elapsed, f'Solver process exited with code { process.exitcode }'
+        try:
+            with open( self._path( job, '.progress' ) ) as file: return meta['state'], elapsed, json.load( file )
+        except ( FileNotFoundError, ValueError ): return meta['state'], elapsed, None
+
+    def cancel( self, job: str ):
+        with self.lock:
+            self.pending = [ item for item in self.pending if item[0] != job ]
+            process = self.processes.pop( job, None )
+        meta = self._read_meta( job )
+        if meta is None or meta['state'] == CANCELLED: return False
+        if process is not None:
+            process.terminate()
+            # Waited for, so a result written just before the signal is not left behind
+            process.join( 1 )
+        elif meta['pid']:
+            # Started by another worker process on this machine
+            try: os.kill( meta['pid'], signal.SIGTERM )
+            except ( ProcessLookupError, PermissionError, OSError ): pass
+        # Polling a job whose files are gone reports nothing, which callers take as cancelled
+        self._remove( job )
+        return True
+
+    def _forget( self, job: str ):
+        with self.lock:
+            process = self.processes.pop( job, None )
+            self.keys = { key: value for key, value in self.keys.items() if value != job }
+        if process is not None: process.join( 1 )
+        self._remove( job )
+
+    def _remove( self, job: str ):
+        for suffix in ( '.pkl', '.progress', '.json' ):
+            try: os.remove( self._path( job, suffix ) )
+            except FileNotFoundError: pass
+
+    def shutdown( self ):
+        for job in list( self.processes ): self.cancel( job )
+        for job, _, _ in self.pending: self._remove( job )
+        self.pending = []
+        if self.owned and self._directory is not None: shutil.rmtree( self._directory, ignore_errors=True )
@@ -0,0 +1,49 @@
+import os
+from bisect import bisect_left
+from functools import lru_cache
+
+from numpy import array, where, float64, int64
+from pandas import read_csv
+
+CITIES_PATH = os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ), 'Data', 'cities.csv' )
+
+# /----------------| Location index |----------------\
+class Gazetteer:
+    # Name -> row dict over NumPy coordinate arrays; the first row wins for repeated names
+    def __init__( self, frame ):
+        self.frame = frame
+        self.names = frame['city'].astype( str ).to_numpy( dtype=object )
+        self.lat = frame['lat'].to_numpy( dtype=float64 )
+        self.lng = frame['lng'].to_numpy( dtype=float64 )
+        self.rows = {}
+        for row, name in enumerate( self.names ): self.rows.setdefault( name, row )
+        # Lowercase names sorted once for prefix search
+        self.keys = sorted( ( name.lower(), row ) for name, row in self.rows.items() )
+
+    def __contains__( self, name ):
+        return name in self.rows
+
+    def __len__( self ):
+        return len( self.rows )
+
+    def lookup( self, names ):
+        # Row of every name, -1 when unknown
+        return array([ self.rows.get( name, -1 ) for name in names ], dtype=int64 )
+
+    def coordinates( self, names, default: float = 0.0 ):
+        rows = self.lookup( names )
+        known = rows >= 0
+        return where( known, self.lat[ rows ], default ), where( known, self.lng[ rows ], default )
+
+    def search( self, prefix: str, limit: int = 25 ):
+        prefix = ( prefix or '' ).lower()
+        start = bisect_left( self.keys, ( prefix, -1 ) )
+        found = []
+        for key, row in self.keys[ start:start + limit ]:
+            if not key.startswith( prefix ): break
+            found.append( self.names[ row ] )
+        return found
+
+@lru_cache( maxsize=None )
+def load_gazetteer( path: str = CITIES_PATH ):
+    return Gazetteer( read_csv( path ) )
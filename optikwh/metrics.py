@@ -0,0 +1,156 @@
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from optikwh.timing import observe
+
+# Per process metrics in the Prometheus text format; every worker process serves its own /metrics
+TIME_BUCKETS = ( 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0 )
+SIZE_BUCKETS = ( 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216 )
+
+def _escape( value ):
+    return str( value ).replace( '\\', '\\\\' ).replace( '"', '\\"' ).replace( '\n', '\\n' )
+
+def _labels( names: tuple, values: tuple, extra: str = '' ):
+    pairs = [ f'{ name }="{ _escape( value ) }"' for name, value in zip( names, values ) ] + ( [ extra ] if extra else [] )
+    return '{' + ','.join( pairs ) + '}' if pairs else ''
+
+def _number( value: float ):
+    return repr( float( value ) ) if value != int( value ) or abs( value ) >= 1e15 else str( int( value ) )
+
+# /----------------| Metric types |----------------\
+class Counter:
+    def __init__( self, name: str, help: str, labels: tuple = () ):
+        self.name, self.help, self.label_names = name, help, tuple( labels )
+        self.values = {}
+        self.lock = Lock()
+
+    def inc( self, *labels, amount: float = 1 ):
+        with self.lock: self.values[ labels ] = self.values.get( labels, 0 ) + amount
+
+    def render( self ):
+        lines = [ f'# HELP { self.name } { self.help }', f'# TYPE { self.name } counter' ]
+        with self.lock: values = list( self.values.items() )
+        lines += [ f'{ self.name }{ _labels( self.label_names, labels ) } { _number( value ) }' for labels, value in values ]
+        return lines
+
+class Histogram:
+    def __init__( self, name: str, help: str, labels: tuple = (), buckets: tuple = TIME_BUCKETS ):
+        self.name, self.help, self.label_names = name, help, tuple( labels )
+        self.buckets = tuple( buckets )
+        # labels -> [ per bucket counts (last one is +Inf), sum ]
+        self.values = {}
+        self.lock = Lock()
+
+    def observe( self, value: float, *labels ):
+        index = bisect_left( self.buckets, value )
+        with self.lock:
+            entry = self.values.get( labels )
+            if entry is None: entry = self.values[ labels ] = [ [ 0 ] * ( len( self.buckets ) + 1 ), 0.0 ]
+            entry[0][ index ] += 1
+            entry[1] += value
+
+    def time( self, *labels ):
+        return _Timer( self, labels )
+
+    def render( self ):
+        lines = [ f'# HELP { self.name } { self.help }', f'# TYPE { self.name } histogram' ]
+        with self.lock: values = [ ( labels, list( counts ), total ) for labels, ( counts, total ) in self.values.items() ]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip( self.buckets + ( '+Inf', ), counts ):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{ bound }"'
+                lines.append( f'{ self.name }_bucket{ _labels( self.label_names, labels, le ) } { cumulative }' )
+            lines.append( f'{ self.name }_sum{ _labels( self.label_names, labels ) } { _number( total ) }' )
+            lines.append( f'{ self.name }_count{ _labels( self.label_names, labels ) } { cumulative }' )
+        return lines
+
+class _Timer:
+    def __init__( self, histogram: Histogram, labels: tuple ):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__( self ):
+        self.start = perf_counter()
+        return self
+
+    def __exit__( self, *exc ):
+        self.histogram.observe( perf_counter() - self.start, *self.labels )
+
+class Gauge:
+    # Read when scraped from a function returning { labels: value }, e.g. cache statistics
+    kind = 'gauge'
+
+    def __init__( self, name: str, help: str, labels: tuple, read ):
+        self.name, self.help, self.label_names = name, help, tuple( labels )
+        self.read = read
+
+    def render( self ):
+        lines = [ f'# HELP { self.name } { self.help }', f'# TYPE { self.name } { self.kind }' ]
+        lines += [ f'{ self.name }{ _labels( self.label_names, labels ) } { _number( value ) }' for labels, value in self.read().items() ]
+        return lines
+
+class CounterView( Gauge ):
+    # A running total kept elsewhere (cache hits, scheduler solves), read when scraped
+    kind = 'counter'
+
+# /----------------| Registry |----------------\
+class Registry:
+    def __init__( self ):
+        self.metrics = []
+
+    def add( self, metric ):
+        self.metrics.append( metric )
+        return metric
+
+    def render( self ):
+        lines = []
+        for metric in self.metrics: lines += metric.render()
+        return '\n'.join( lines ) + '\n'
+
+REGISTRY = Registry()
+SOLVES = REGISTRY.add( Counter( 'optikwh_solves_total', 'Model solves by solver and status.', ( 'solver', 'status' ) ) )
+PHASE_SECONDS = REGISTRY.add( Histogram( 'optikwh_phase_seconds', 'Time spent in solve and rendering phases.', ( 'phase', ) ) )
+CALLBACK_SECONDS = REGISTRY.add( Histogram( 'optikwh_callback_seconds', 'Dash callback request time, serialization included.', ( 'callback', ) ) )
+CALLBACK_BYTES = REGISTRY.add( Histogram( 'optikwh_callback_response_bytes', 'Dash callback response sizes.', ( 'callback', ), SIZE_BUCKETS ) )
+UPLOADS = REGISTRY.add( Counter( 'optikwh_uploads_total', 'Uploaded problem files by outcome.', ( 'outcome', ) ) )
+UPLOAD_BYTES = REGISTRY.add( Counter( 'optikwh_upload_bytes_total', 'Encoded size of uploaded problem files.' ) )
+
+# Every phase() span feeds the phase histogram
+observe( lambda name, seconds: PHASE_SECONDS.observe( seconds, name ) )
+
+# Keys of stats() dictionaries that go up and down; every other key is a running total
+LEVELS = ( 'entries', 'bytes' )
+
+def stats_metrics( name: str, stats, totals: str, levels: str = None ):
+    # One stats() dictionary, labelled by key: running totals as the name_total counter, LEVELS as the name gauge
+    def read( counted: bool ):
+        return lambda: { ( key, ): value for key, value in stats().items() if ( key not in LEVELS ) == counted }
+    metrics = [ REGISTRY.add( CounterView( f'{ name }_total', totals, ( 'stat', ), read( True ) ) ) ]
+    if levels is not None: metrics.append( REGISTRY.add( Gauge( name, levels, ( 'stat', ), read( False ) ) ) )
+    return metrics
+
+# /----------------| Flask wiring |----------------\
+DASH_UPDATE = '/_dash-update-component'
+
+def instrument( server, registry: Registry = REGISTRY, path: str = '/metrics' ):
+    # Times every Dash callback request by its output, records response sizes and serves the registry
+    from flask import Response, g, request
+
+    @server.before_request
+    def _start_timer():
+        if request.path.endswith( DASH_UPDATE ): g.metrics_start = perf_counter()
+
+    @server.after_request
+    def _record_callback( response ):
+        start = g.pop( 'metrics_start', None )
+        if start is not None:
+            payload = request.get_json( silent=True ) or {}
+            callback = payload.get( 'output', 'unknown' )
+            CALLBACK_SECONDS.observe( perf_counter() - start, callback )
+            if not response.direct_passthrough: CALLBACK_BYTES.observe( response.calculate_content_length() or 0, callback )
+        return response
+
+    @server.route( path )
+    def _metrics():
+        return Response( registry.render(), mimetype='text/plain; version=0.0.4' )
@@ -0,0 +1,43 @@
+from numpy import arange, asarray, isfinite, nonzero, ones, concatenate, full, inf, float64
+
+# /----------------| Matrix-form model |----------------\
+class Model:
+    # min c @ x  s.t.  A_ub @ x <= b_ub,  0 <= x <= upper,  with one x per existing plant -> city route (arc)
+    def __init__( self, c, A_ub, b_ub, upper, rows, cols, shape: tuple ):
+        self.c = c
+        self.A_ub = A_ub
+        self.b_ub = b_ub
+        self.upper = upper
+        self.rows = rows
+        self.cols = cols
+        self.shape = shape
+
+    def bounds( self ):
+        if not isfinite( self.upper ).any(): return ( 0, None )
+        return [ ( 0, None if upper == inf else upper ) for upper in self.upper ]
+
+def build_arc_model( rows, cols, costs, plant_supply, city_requirements, capacities = None ):
+    from scipy.sparse import csr_array
+
+    plant_supply = asarray( plant_supply, dtype=float64 )
+    city_requirements = asarray( city_requirements, dtype=float64 )
+    plants, cities, arcs = len( plant_supply ), len( city_requirements ), len( rows )
+
+    # Plant rows sum x[i, :] <= supply, city rows sum -x[:, j] <= -requirement
+    constraint = concatenate([ rows, plants + asarray( cols ) ])
+    arc = concatenate([ arange( arcs ), arange( arcs ) ])
+    data = concatenate([ ones( arcs ), -ones( arcs ) ])
+    A_ub = csr_array(( data, ( constraint, arc ) ), shape=( plants + cities, arcs ))
+
+    b_ub = concatenate([ plant_supply, -city_requirements ])
+    upper = full( arcs, inf ) if capacities is None else asarray( capacities, dtype=float64 )
+    return Model( asarray( costs, dtype=float64 ), A_ub, b_ub, upper, rows, cols, ( plants, cities ) )
+
+def build_model( costs, plant_supply, city_requirements, capacities = None ):
+    # Blank (NaN) or infinite cells of the dense matrix are routes that do not exist
+    costs = asarray( costs, dtype=float64 )
+    rows, cols = nonzero( isfinite( costs ) )
+    if capacities is not None: 
+        capacities = asarray( capacities, dtype=float64 )[ rows, cols ]
+        capacities[ ~isfinite( capacities ) ] = inf
+    return build_arc_model( rows, cols, costs[ rows, cols ], plant_supply, city_requirements, capacities )
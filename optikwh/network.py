@@ -0,0 +1,191 @@
+from math import ceil, sqrt
+from time import perf_counter
+
+from numpy import asarray, append, arange, argmin, concatenate, full, isfinite, nonzero, ones, where, zeros, float64, int64, inf
+from pandas import DataFrame, Index, factorize
+
+from optikwh.solution import Solution, OPTIMAL, NOT_SOLVED, INFEASIBLE, UNBOUNDED
+from optikwh.timing import phase
+
+TOLERANCE = 1e-9
+NETWORK_COLUMNS = ( 'from', 'to', 'cost' )
+
+# /----------------| Network |----------------\
+class Network:
+    # Nodes are plants (positive supply, shipped at most), cities (negative supply, their requirement, met exactly)
+    # and hubs (zero, everything in goes out). Arc k goes from nodes[tails[k]] to nodes[heads[k]] at costs[k] per kWh,
+    # carrying at most capacities[k] (inf when unlimited)
+    def __init__( self, nodes: Index, supply, tails, heads, costs, capacities = None ):
+        self.nodes = nodes
+        self.supply = asarray( supply, dtype=float64 )
+        self.tails = asarray( tails, dtype=int64 )
+        self.heads = asarray( heads, dtype=int64 )
+        self.costs = asarray( costs, dtype=float64 )
+        capacities = full( len( self.costs ), inf ) if capacities is None else asarray( capacities, dtype=float64 ).copy()
+        capacities[ ~isfinite( capacities ) ] = inf
+        self.capacities = capacities
+
+def network_from_matrix( costs, plant_supply, city_requirements, capacities = None ):
+    # The transportation problem as a network: plants first, then cities, one arc per existing route
+    costs = asarray( costs, dtype=float64 )
+    plants, cities = costs.shape
+    rows, cols = nonzero( isfinite( costs ) )
+    if capacities is not None: capacities = asarray( capacities, dtype=float64 )[ rows, cols ]
+    supply = concatenate([ asarray( plant_supply, dtype=float64 ), -asarray( city_requirements, dtype=float64 ) ])
+    return Network( Index( arange( plants + cities ) ), supply, rows, plants + cols, costs[ rows, cols ], capacities )
+
+def is_network_list( columns ):
+    return set( NETWORK_COLUMNS ) <= { str( column ).strip().lower() for column in columns }
+
+def network_from_edges( data: DataFrame ):
+    # One arc per row: from, to, cost and an optional capacity. As with route lists, rows without a 'to' give
+    # a plant's supply and rows without a 'from' a city's requirement, both in the cost column; other nodes are hubs
+    data = data.rename( columns=lambda column: str( column ).strip().lower() )
+    tail, head = data['from'], data['to']
+    arcs = data[ tail.notna() & head.notna() ]
+    supply = data[ tail.notna() & head.isna() ].groupby( 'from' )['cost'].sum()
+    requirements = data[ tail.isna() & head.notna() ].groupby( 'to' )['cost'].sum()
+
+    ends, nodes = factorize( Index( arcs['from'] ).append( Index( arcs['to'] ) ).append( supply.index ).append( requirements.index ), sort=False )
+    count = len( arcs )
+    costs = arcs['cost'].astype( float64 ).values
+    # Blank or infinite costs are no arc either
+    keep = isfinite( costs )
+    capacities = arcs['capacity'].astype( float64 ).values[ keep ] if 'capacity' in arcs else None
+    balance = supply.reindex( nodes, fill_value=0 ).values - requirements.reindex( nodes, fill_value=0 ).values
+    return Network( nodes, balance, ends[ :count ][ keep ], ends[ count:2 * count ][ keep ], costs[ keep ], capacities )
+
+# /----------------| Network simplex |----------------\
+def network_simplex( balance, tails, heads, costs, capacities = None, max_iter: int = None, deadline: float = None ):
+    # Min cost flow with exact node balances (positive supplies, negative demands, summing to zero).
+    # Starts from a big-M tree of artificial arcs to an extra root, keeps the tree strongly feasible by leaving on the
+    # last blocking arc of each cycle (which rules out cycling), and prices arcs block by block.
+    # Returns ( status, objective, flows, potentials )
+    balance = asarray( balance, dtype=float64 )
+    costs = asarray( costs, dtype=float64 )
+    nodes, arcs = len( balance ), len( costs )
+    capacities = full( arcs, inf ) if capacities is None else asarray( capacities, dtype=float64 )
+    if abs( balance.sum() ) > TOLERANCE * max( 1.0, abs( balance ).sum() ): raise ValueError( 'Supplies and demands must balance' )
+    if ( capacities < 0 ).any(): raise ValueError( 'Capacities must not be negative' )
+
+    # Artificial arc k = arcs + i joins node i and the root, pointing away from the node when it supplies
+    root = nodes
+    big = 1.0 + ( abs( costs ).max() if arcs else 0.0 ) * ( nodes + 1 )
+    supplies = balance >= 0
+    node_range = arange( nodes )
+    S = concatenate([ asarray( tails, dtype=int64 ), where( supplies, node_range, root ) ])
+    T = concatenate([ asarray( heads, dtype=int64 ), where( supplies, root, node_range ) ])
+    C = concatenate([ costs, full( nodes, big ) ])
+    U = concatenate([ capacities, full( nodes, inf ) ])
+    x = concatenate([ zeros( arcs ), abs( balance ) ])
+    # 1 at the lower bound, -1 at the upper bound, 0 in the tree
+    state = concatenate([ ones( arcs ), zeros( nodes ) ])
+    tails_, heads_ = S.tolist(), T.tolist()
+
+    parent = [ root ] * nodes + [ -1 ]
+    parent_arc = list( range( arcs, arcs + nodes ) ) + [ -1 ]
+    depth = [ 1 ] * nodes + [ 0 ]
+    adjacency = [ { root: arcs + i } for i in range( nodes ) ] + [ { i: arcs + i for i in range( nodes ) } ]
+    potential = concatenate([ where( supplies, big, -big ), [ 0.0 ] ])
+
+    total = arcs + nodes
+    block = max( int( ceil( sqrt( total ) ) ), 1 )
+    blocks = ceil( total / block )
+    start = 0
+    max_iter = max_iter or 100 * total
+    status = NOT_SOLVED
+
+    for _ in range( max_iter ):
+        if deadline is not None and perf_counter() > deadline: break
+        # The most violated arc of the first block that has one
+        entering = None
+        for _ in range( blocks ):
+            end = min( start + block, total )
+            reduced = state[ start:end ] * ( C[ start:end ] - potential[ S[ start:end ] ] + potential[ T[ start:end ] ] )
+            k = int( argmin( reduced ) )
+            found, start = start + k, ( end if end < total else 0 )
+            if reduced[ k ] < -TOLERANCE:
+                entering = found
+                break
+        if entering is None:
+            status = OPTIMAL
+            break
+
+        # Flow is pushed from u to v along the entering arc and back through the tree
+        e = entering
+        forward_entering = state[ e ] == 1
+        u, v = ( tails_[ e ], heads_[ e ] ) if forward_entering else ( heads_[ e ], tails_[ e ] )
+        a, b, up_u, up_v = u, v, [], []
+        while depth[ a ] > depth[ b ]: up_u.append( a ); a = parent[ a ]
+        while depth[ b ] > depth[ a ]: up_v.append( b ); b = parent[ b ]
+        while a != b:
+            up_u.append( a ); a = parent[ a ]
+            up_v.append( b ); b = parent[ b ]
+
+        # The cycle from the join: down to u, across the entering arc, up from v; ( arc, pushed along it, node below )
+        cycle = [ ( parent_arc[ w ], heads_[ parent_arc[ w ] ] == w, w ) for w in reversed( up_u ) ]
+        cycle.append(( e, forward_entering, -1 ))
+        cycle += [ ( parent_arc[ w ], tails_[ parent_arc[ w ] ] == w, w ) for w in up_v ]
+        residuals = [ U[ arc ] - x[ arc ] if forward else x[ arc ] for arc, forward, _ in cycle ]
+        delta = min( residuals )
+        if delta == inf:
+            status = UNBOUNDED
+            break
+        # The last blocking arc keeps zero flow arcs pointing away from the root
+        leaving = max( k for k, residual in enumerate( residuals ) if residual == delta )
+
+        if delta > 0:
+            for arc, forward, _ in cycle: x[ arc ] += delta if forward else -delta
+        l, filled, below = cycle[ leaving ]
+        if l == e:
+            state[ e ] = -state[ e ]
+            continue
+        # A blocking arc pushed forward is full, one pushed backward is empty
+        x[ l ], state[ l ] = ( U[ l ], -1 ) if filled else ( 0.0, 1 )
+        state[ e ] = 0
+
+        # The subtree cut off below the leaving arc hangs from the entering arc instead
+        top, bottom = ( u, v ) if leaving < len( up_u ) else ( v, u )
+        del adjacency[ below ][ parent[ below ] ], adjacency[ parent[ below ] ][ below ]
+        adjacency[ top ][ bottom ] = adjacency[ bottom ][ top ] = e
+        # Arcs inside the subtree keep their zero reduced cost, so all its potentials move by the same amount
+        shift = ( potential[ bottom ] - C[ e ] if tails_[ e ] == bottom else potential[ bottom ] + C[ e ] ) - potential[ top ]
+        parent[ top ], parent_arc[ top ], depth[ top ] = bottom, e, depth[ bottom ] + 1
+        stack, members = [ top ], []
+        while stack:
+            node = stack.pop()
+            members.append( node )
+            above, level = parent[ node ], depth[ node ] + 1
+            for child, arc in adjacency[ node ].items():
+                if child == above: continue
+                parent[ child ], parent_arc[ child ], depth[ child ] = node, arc, level
+                stack.append( child )
+        potential[ members ] += shift
+
+    # Flow left on artificial arcs is supply that cannot reach any demand
+    if status == OPTIMAL and x[ arcs: ].max( initial=0.0 ) > TOLERANCE * max( 1.0, abs( balance ).max() ): status = INFEASIBLE
+    flows = x[ :arcs ]
+    objective = float( costs @ flows ) if status == OPTIMAL else None
+    return status, objective, flows, potential[ :nodes ] - potential[ root ]
+
+def solve_network( network: Network, max_iter: int = None, time_limit: float = None ):
+    # Plants may ship less than their supply: the rest goes to an extra node over free arcs.
+    # The returned supply holds the flow of every arc, in the order of network.tails / network.heads
+    supply = network.supply
+    arcs = len( network.costs )
+    surplus = supply.clip( 0 ).sum() + supply.clip( max = 0 ).sum()
+    if surplus < -TOLERANCE * max( 1.0, abs( supply ).sum() ): return Solution( INFEASIBLE, None, zeros( arcs ), solver = 'network' )
+
+    with phase( 'build' ):
+        sources = nonzero( supply > 0 )[0]
+        sink = len( supply )
+        balance = append( supply, -max( surplus, 0.0 ) )
+        balance[ -1 ] -= balance.sum()
+        tails = concatenate([ network.tails, sources ])
+        heads = concatenate([ network.heads, full( len( sources ), sink ) ])
+        costs = concatenate([ network.costs, zeros( len( sources ) ) ])
+        capacities = concatenate([ network.capacities, full( len( sources ), inf ) ])
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    with phase( 'solve' ):
+        status, objective, flows, potentials = network_simplex( balance, tails, heads, costs, capacities, max_iter, deadline )
+    return Solution( status, objective, flows[ :arcs ], duals = potentials[ :-1 ], solver = 'network' )
@@ -0,0 +1,112 @@
+from itertools import zip_longest
+
+from numpy import asarray, isfinite, zeros, append, concatenate, float64
+
+from optikwh.model import build_model
+from optikwh.backends import SOLVERS, solve_model, choose_solver, cbc_command, LIMITS
+from optikwh.simplex import solve_balanced
+from optikwh.solution import Solution, INFEASIBLE, OPTIMAL
+from optikwh.timing import phase
+
+# /----------------| Fixed network, changing right-hand sides |----------------\
+class PeriodModel:
+    # Built once for a cost matrix (and capacities); every period only changes supplies and requirements
+    def __init__( self, costs, solver: str = 'simplex', capacities = None ):
+        self.costs = asarray( costs, dtype=float64 )
+        self.plants, self.cities = self.costs.shape
+        self.routes = isfinite( self.costs )
+        self.previous = None
+        self.capacities = capacities
+        # A race per period would cost more in processes than it saves
+        if solver in ( 'auto', 'race' ): solver = choose_solver( self.costs, capacities )
+        # The dense simplex handles every route being present and uncapacitated; the rest goes through the arc model
+        self.dense = solver == 'simplex' and capacities is None and self.routes.all()
+        with phase( 'build' ):
+            if self.dense:
+                self.balanced = append( self.costs, zeros(( self.plants, 1 )), axis = 1 )
+                self.demand = zeros( self.cities + 1 )
+            elif solver in ( 'simplex', 'highs' ):
+                self.model = build_model( self.costs, zeros( self.plants ), zeros( self.cities ), capacities )
+            elif solver == 'cbc':
+                self.problem, self.kwh, self.supply_rows, self.city_rows = _build_cbc( self.costs, self.routes, capacities )
+        self.solver = 'dense' if self.dense else ( 'highs' if solver == 'simplex' else solver )
+
+    def solve( self, plant_supply, city_requirements ):
+        plant_supply = asarray( plant_supply, dtype=float64 )
+        city_requirements = asarray( city_requirements, dtype=float64 )
+        if self.solver == 'dense':
+            self.demand[ :self.cities ] = city_requirements
+            # Each period starts from the last optimal basis, which stays dual feasible since only right-hand sides change
+            solution = solve_balanced( self.balanced, plant_supply, self.demand, warm_start = self.previous, time_limit = LIMITS['time_limit'] )
+            if solution.status == OPTIMAL: self.previous = solution
+            return solution
+        if self.solver == 'highs': return self._solve_highs( plant_supply, city_requirements )
+        if self.solver == 'cbc': return self._solve_cbc( plant_supply, city_requirements )
+        # Other registered backends get no model to reuse and solve every period from scratch
+        return SOLVERS[ self.solver ]( self.costs, plant_supply, city_requirements, capacities = self.capacities )
+
+    def _solve_highs( self, plant_supply, city_requirements ):
+        model = self.model
+        model.b_ub = concatenate([ plant_supply, -city_requirements ])
+        status, objective, flows = solve_model( model )
+        with phase( 'extract' ):
+            supply = zeros( model.shape )
+            supply[ model.rows, model.cols ] = flows
+        return Solution( status, objective, supply )
+
+    def _solve_cbc( self, plant_supply, city_requirements ):
+        from pulp import value
+
+        # A city without routes can only be served when it requires nothing
+        if ( city_requirements[ ~self.routes.any( axis = 0 ) ] > 0 ).any():
+            return Solution( INFEASIBLE, None, zeros(( self.plants, self.cities )) )
+        for i, constraint in self.supply_rows.items(): constraint.constant = -plant_supply[ i ]
+        for j, constraint in self.city_rows.items(): constraint.constant = -city_requirements[ j ]
+        with phase( 'solve' ):
+            self.problem.solve( cbc_command() )
+        with phase( 'extract' ):
+            supply = zeros(( self.plants, self.cities ))
+            for ( i, j ), variable in self.kwh.items(): supply[ i, j ] = value( variable ) or 0.0
+        # CBC still reports the objective and flows of the last point it reached in an infeasible period
+        if self.problem.status != OPTIMAL: return Solution( self.problem.status, None, zeros(( self.plants, self.cities )) )
+        # Without a single route the objective has no variables and no value
+        return Solution( self.problem.status, self.problem.objective.value() or 0.0, supply )
+
+def _build_cbc( costs, routes, capacities ):
+    from pulp import LpProblem, LpMinimize, LpVariable, LpContinuous, lpSum
+
+    problem = LpProblem( 'Min_supply', LpMinimize )
+    kwh = {}
+    for i, j in zip( *routes.nonzero() ):
+        upper = None if capacities is None or not isfinite( capacities[ i ][ j ] ) else capacities[ i ][ j ]
+        kwh[ i, j ] = LpVariable( f'Plant{i+1}ToCity{j+1}', lowBound=0, upBound=upper, cat=LpContinuous )
+    problem += lpSum( costs[ i, j ] * variable for ( i, j ), variable in kwh.items() )
+
+    # Right-hand sides start at zero and are set per period through each constraint's constant
+    supply_rows, city_rows = {}, {}
+    for i in range( costs.shape[0] ):
+        if routes[ i ].any():
+            supply_rows[ i ] = lpSum( kwh[ i, j ] for j in routes[ i ].nonzero()[0] ) <= 0
+            problem += supply_rows[ i ], f'Supply{i+1}'
+    for j in range( costs.shape[1] ):
+        if routes[ :, j ].any():
+            city_rows[ j ] = lpSum( kwh[ i, j ] for i in routes[ :, j ].nonzero()[0] ) >= 0
+            problem += city_rows[ j ], f'Requirement{j+1}'
+    return problem, kwh, supply_rows, city_rows
+
+# /----------------| Horizons |----------------\
+# Stands in for the periods a shorter profile lacks
+_MISSING = object()
+
+def solve_periods( costs, plant_supply, city_requirements, solver: str = 'simplex', capacities = None, supplies = None ):
+    # city_requirements (and supplies, when plant supply changes too) are iterables of one vector per period;
+    # solutions are yielded one at a time, so nothing grows with the horizon
+    model = PeriodModel( costs, solver, capacities )
+    if supplies is None:
+        for requirements in city_requirements: yield model.solve( plant_supply, requirements )
+        return
+    # Both profiles are streamed, so a length mismatch only shows once the shorter one runs out
+    for requirements, period_supply in zip_longest( city_requirements, supplies, fillvalue = _MISSING ):
+        if requirements is _MISSING or period_supply is _MISSING:
+            raise ValueError( 'Supply and requirement profiles must cover the same number of periods' )
+        yield model.solve( period_supply, requirements )
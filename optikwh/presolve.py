@@ -0,0 +1,75 @@
+from numpy import asarray, isfinite, isnan, where, append, full, float64, nan, inf
+
+TOLERANCE = 1e-9
+
+# /----------------| Feasibility diagnosis |----------------\
+class Diagnosis:
+    # Reasons a problem cannot be solved, found from totals and routes alone
+    def __init__( self, supply: float, demand: float, negative: bool, unreachable: list, short: list ):
+        self.supply = supply
+        self.demand = demand
+        self.negative = negative
+        # Cities with a requirement but no usable route, and cities whose reachable supply or capacity is too small
+        self.unreachable = unreachable
+        self.short = short
+
+    @property
+    def shortfall( self ):
+        return max( self.demand - self.supply, 0.0 )
+
+    @property
+    def feasible( self ):
+        return not ( self.negative or self.shortfall > TOLERANCE or self.unreachable or self.short )
+
+    def messages( self, cities = None ):
+        name = ( lambda j: str( cities[ j ] ) ) if cities is not None else str
+        messages = []
+        if self.negative: messages.append( 'Costs, supplies and requirements must not be negative.' )
+        if self.shortfall > TOLERANCE:
+            messages.append( f'Total requirement ({ self.demand:g} kWh) exceeds total supply ({ self.supply:g} kWh) by { self.shortfall:g} kWh.' )
+        if self.unreachable:
+            messages.append( 'No route reaches ' + ', '.join( name( j ) for j in self.unreachable ) + '.' )
+        if self.short:
+            messages.append( 'Reachable supply or route capacity is too small for ' + ', '.join( name( j ) for j in self.short ) + '.' )
+        return messages
+
+def diagnose( costs, supply, reqs, capacities = None ):
+    # One pass over the routes; never builds or solves a model
+    costs = asarray( costs, dtype=float64 )
+    supply = asarray( supply, dtype=float64 )
+    reqs = asarray( reqs, dtype=float64 )
+    routes = isfinite( costs )
+    if capacities is not None:
+        # Blank capacities are unlimited
+        capacities = asarray( capacities, dtype=float64 )
+        capacities = where( routes, where( isnan( capacities ), inf, capacities ), 0.0 )
+        routes &= capacities > 0
+
+    needed = reqs > TOLERANCE
+    unreachable = where( needed & ~routes.any( axis = 0 ) )[0].tolist()
+    # A city can get at most what its reachable plants hold, and at most the sum of its route capacities
+    reachable = supply.clip( 0 ) @ routes
+    limit = reachable if capacities is None else reachable.clip( max = capacities.sum( axis = 0 ) )
+    short = where( needed & routes.any( axis = 0 ) & ( limit < reqs - TOLERANCE ) )[0].tolist()
+
+    # Negative costs too: the simplex meets requirements exactly while CBC and HiGHS would over-deliver on such routes
+    negative = bool(( supply < 0 ).any() or ( reqs < 0 ).any() or ( costs[ routes ] < 0 ).any() )
+    return Diagnosis( float( supply.sum() ), float( reqs.sum() ), negative, unreachable, short )
+
+# /----------------| Balancing |----------------\
+def penalty_cost( costs ):
+    # Dearer than rerouting along any path of real routes, so unmet demand is only used when nothing else works
+    costs = asarray( costs, dtype=float64 )
+    finite = costs[ isfinite( costs ) ]
+    largest = float( abs( finite ).max() ) if finite.size else 0.0
+    return 1.0 + largest * sum( costs.shape )
+
+def add_dummy_plant( costs, supply, reqs, capacities = None, penalty: float = None ):
+    # A last plant with enough supply for every requirement, reaching every city at the penalty cost
+    costs = asarray( costs, dtype=float64 )
+    penalty = penalty_cost( costs ) if penalty is None else penalty
+    costs = append( costs, full(( 1, costs.shape[1] ), penalty ), axis = 0 )
+    supply = append( asarray( supply, dtype=float64 ), max( float( asarray( reqs ).clip( 0 ).sum() ), 0.0 ) )
+    if capacities is not None:
+        capacities = append( asarray( capacities, dtype=float64 ), full(( 1, costs.shape[1] ), nan ), axis = 0 )
+    return costs, supply, asarray( reqs, dtype=float64 ), capacities
@@ -0,0 +1,82 @@
+from numpy import asarray, isfinite, nonzero, full, nan, inf, float64
+from pandas import DataFrame, Series, Index, factorize
+
+from optikwh.solution import Solution
+from optikwh.model import build_arc_model
+from optikwh.backends import solve_model
+
+EDGE_COLUMNS = ( 'plant', 'city', 'cost' )
+
+# /----------------| Sparse route network |----------------\
+class Routes:
+    # Only existing plant -> city routes (arcs) are stored: arc k goes from plants[rows[k]] to cities[cols[k]]
+    def __init__( self, plants: Index, cities: Index, rows, cols, costs, plant_supply, city_requirements, capacities = None ):
+        self.plants = plants
+        self.cities = cities
+        self.rows = asarray( rows )
+        self.cols = asarray( cols )
+        self.costs = asarray( costs, dtype=float64 )
+        self.plant_supply = asarray( plant_supply, dtype=float64 )
+        self.city_requirements = asarray( city_requirements, dtype=float64 )
+        self.capacities = None if capacities is None else asarray( capacities, dtype=float64 )
+
+    def to_frames( self ):
+        # Dense plant x city frames, NaN where there is no route; only sensible for small networks
+        costs = full(( len( self.plants ), len( self.cities ) ), nan )
+        costs[ self.rows, self.cols ] = self.costs
+        capacities = None
+        if self.capacities is not None and isfinite( self.capacities ).any():
+            capacities = full( costs.shape, nan )
+            capacities[ self.rows, self.cols ] = self.capacities
+            capacities[ ~isfinite( capacities ) ] = nan
+            capacities = DataFrame( capacities, index=self.plants, columns=self.cities )
+        return (
+            DataFrame( costs, index=self.plants, columns=self.cities ),
+            Series( self.plant_supply, index=self.plants, name='Plant supply' ),
+            Series( self.city_requirements, index=self.cities, name='City requirements' ),
+            capacities
+        )
+
+def routes_from_matrix( costs: DataFrame, plant_supply: Series, city_requirements: Series, capacities: DataFrame = None ):
+    values = costs.values.astype( float64 )
+    rows, cols = nonzero( isfinite( values ) )
+    if capacities is not None: capacities = capacities.values.astype( float64 )[ rows, cols ]
+    return Routes( costs.index, costs.columns, rows, cols, values[ rows, cols ], plant_supply.values, city_requirements.values, capacities )
+
+def is_edge_list( columns ):
+    return set( EDGE_COLUMNS ) <= { str( column ).strip().lower() for column in columns }
+
+def routes_from_edges( data: DataFrame ):
+    # One route per row: plant, city, cost and an optional capacity. Like the blank supply header of
+    # the matrix layout, rows without a city give the plant supply and rows without a plant the
+    # city requirement, both in the cost column.
+    data = data.rename( columns=lambda column: str( column ).strip().lower() )
+    plant, city = data['plant'], data['city']
+    edges = data[ plant.notna() & city.notna() ]
+    supply = data[ plant.notna() & city.isna() ].groupby( 'plant' )['cost'].sum()
+    requirements = data[ plant.isna() & city.notna() ].groupby( 'city' )['cost'].sum()
+
+    rows, plants = factorize( Index( edges['plant'] ).append( supply.index ), sort=False )
+    cols, cities = factorize( Index( edges['city'] ).append( requirements.index ), sort=False )
+    arcs = len( edges )
+    costs = edges['cost'].astype( float64 ).values
+    # Blank or infinite costs are no route either
+    keep = isfinite( costs )
+    capacities = None
+    if 'capacity' in edges:
+        capacities = edges['capacity'].astype( float64 ).values[ keep ]
+        capacities[ ~isfinite( capacities ) ] = inf
+
+    return Routes(
+        plants, cities, rows[ :arcs ][ keep ], cols[ :arcs ][ keep ], costs[ keep ],
+        supply.reindex( plants, fill_value=0 ).values, 
+        requirements.reindex( cities, fill_value=0 ).values,
+        capacities
+    )
+
+# /----------------| Sparse solver |----------------\
+def solve_routes( routes: Routes ):
+    # The returned supply holds the flow of every arc, in the order of routes.rows / routes.cols
+    model = build_arc_model( routes.rows, routes.cols, routes.costs, routes.plant_supply, routes.city_requirements, routes.capacities )
+    status, objective, flows = solve_model( model )
+    return Solution( status, objective, flows, model = model )
@@ -0,0 +1,53 @@
+from itertools import count
+from threading import Lock
+from time import sleep
+
+# /----------------| Solve coalescing |----------------\
+class SolveScheduler:
+    # Models only need a version counter, the version of their last solve and a solve() method.
+    # The debounce sleeps in the calling request thread and requests are only coalesced within one process: run the
+    # app with threaded workers (the Flask default, or gunicorn --threads), and with several worker processes expect
+    # requests routed to different workers to be solved separately
+    def __init__( self, delay: float = 0.25 ):
+        self.delay = delay
+        # Newest ticket and solve lock per key, kept only while a request for that key is in flight; requests for
+        # different keys solve side by side
+        self.latest, self.locks = {}, {}
+        self.tickets = count()
+        # Held only while the tables and counters are read and updated, never through a solve
+        self.keys = Lock()
+        self.solves, self.skipped, self.dropped = 0, 0, 0
+
+    def _count( self, outcome: str ):
+        with self.keys: setattr( self, outcome, getattr( self, outcome ) + 1 )
+
+    def request( self, model, key = None ):
+        with self.keys:
+            ticket = next( self.tickets )
+            self.latest[ key ] = ticket
+            lock = self.locks.setdefault( key, Lock() )
+
+        # Debounce: a newer request arriving within the delay supersedes this one
+        if self.delay: sleep( self.delay )
+        if self.latest.get( key ) != ticket:
+            self._count( 'dropped' )
+            return False
+
+        with lock:
+            # Requests queued behind a running solve of the same key are stale once a newer one exists
+            if self.latest.get( key ) != ticket:
+                self._count( 'dropped' )
+                return False
+            if model.solved_version == model.version: self._count( 'skipped' )
+            else:
+                model.solve()
+                self._count( 'solves' )
+
+        # The newest request forgets its key once done, so keys of closed sessions do not pile up
+        with self.keys:
+            if self.latest.get( key ) != ticket: return False
+            del self.latest[ key ], self.locks[ key ]
+        return True
+
+    def stats( self ):
+        return { 'solves': self.solves, 'skipped': self.skipped, 'dropped': self.dropped }
@@ -0,0 +1,100 @@
+from numpy import asarray, isfinite, where, zeros, ones, full, append, ix_, maximum, float64, nan, inf
+
+from optikwh.presolve import penalty_cost
+from optikwh.simplex import balance, solve_balanced, _Tree, TOLERANCE
+from optikwh.solution import Solution, OPTIMAL
+
+# /----------------| Report |----------------\
+class Sensitivity:
+    # Everything read off one optimal basis. Duals are the objective change per extra kWh of supply or requirement,
+    # ranges are the values a single cost, supply or requirement can take while that basis stays optimal
+    def __init__( self, costs, supply, demand, objective: float, shipped, duals: tuple, reduced_costs, cost_range: tuple, supply_range: tuple, demand_range: tuple ):
+        self.costs, self.supply, self.demand = costs, supply, demand
+        self.objective = objective
+        self.shipped = shipped
+        self.supply_duals, self.demand_duals = duals
+        # Zero on used routes, NaN on missing ones
+        self.reduced_costs = reduced_costs
+        self.cost_lower, self.cost_upper = cost_range
+        self.supply_lower, self.supply_upper = supply_range
+        self.demand_lower, self.demand_upper = demand_range
+
+    # What-ifs on one value; each returns the new objective, or None outside its range where a re-solve is needed
+    def cost_change( self, plant: int, city: int, delta: float ):
+        if not _within( self.costs[ plant, city ] + delta, self.cost_lower[ plant, city ], self.cost_upper[ plant, city ] ): return None
+        return self.objective + delta * self.shipped[ plant, city ]
+
+    def supply_change( self, plant: int, delta: float ):
+        if not _within( self.supply[ plant ] + delta, self.supply_lower[ plant ], self.supply_upper[ plant ] ): return None
+        return self.objective + delta * self.supply_duals[ plant ]
+
+    def requirement_change( self, city: int, delta: float ):
+        if not _within( self.demand[ city ] + delta, self.demand_lower[ city ], self.demand_upper[ city ] ): return None
+        return self.objective + delta * self.demand_duals[ city ]
+
+def _within( value: float, lower: float, upper: float ):
+    return lower - TOLERANCE <= value <= upper + TOLERANCE
+
+# /----------------| Analysis |----------------\
+def analyse( costs, supply, demand, solution: Solution = None ):
+    # Reads the report off the transportation simplex basis; a simplex solution of the same problem is reused as is,
+    # anything else (another solver, an older basis) is re-solved from it. None when there is no optimum to read.
+    costs = asarray( costs, dtype=float64 )
+    supply, demand = asarray( supply, dtype=float64 ), asarray( demand, dtype=float64 )
+    plants, cities = costs.shape
+    # Missing routes become too dear to use, so they stay out of the basis and out of every range
+    routes = isfinite( costs )
+    priced = where( routes, costs, penalty_cost( costs ) )
+    balanced, supply_, demand_, surplus = balance( priced, supply, demand )
+    result = solve_balanced( balanced, supply_, demand_, warm_start = solution )
+    if result.status != OPTIMAL or result.supply[ ~routes ].sum() > TOLERANCE: return None
+
+    basis_rows, basis_cols, flows = result.basis
+    tree = _Tree( balanced, basis_rows.copy(), basis_cols.copy() )
+    u, v = result.duals
+    # Shifted so the surplus column has a zero dual: supply duals then price one more kWh at a plant,
+    # requirement duals one more kWh at a city, with the surplus taking up the difference
+    u, v = u + v[ cities ], v - v[ cities ]
+    reduced = balanced - u[ :, None ] - v[ None, : ]
+    candidates = where( append( routes, ones(( plants, 1 ), dtype=bool ), axis = 1 ), reduced, inf )
+    candidates[ basis_rows, basis_cols ] = inf
+
+    # Non-basic routes can get dearer without limit and cheaper by their reduced cost
+    cost_lower, cost_upper = costs - reduced[ :, :cities ], full( costs.shape, inf )
+    for edge, ( i, j ) in enumerate( zip( basis_rows.tolist(), basis_cols.tolist() ) ):
+        if j == cities: continue
+        # Changing a basic cost shifts the duals beyond it: cells from the plant's side to the city's side get cheaper
+        cut, below = tree.below( edge )
+        plant_side = below if cut == i else ~below
+        near, far = plant_side[ :plants ], ~plant_side[ plants: ]
+        up = candidates[ ix_( near, far ) ]
+        down = candidates[ ix_( ~near, ~far ) ]
+        cost_upper[ i, j ] = costs[ i, j ] + ( up.min() if up.size else inf )
+        cost_lower[ i, j ] = costs[ i, j ] - ( down.min() if down.size else inf )
+    # Costs are never negative, so a range with no lower limit stops at zero
+    cost_lower = maximum( cost_lower, 0.0 )
+    cost_lower[ ~routes ], cost_upper[ ~routes ] = nan, nan
+
+    # One more kWh at a plant or city moves along its tree path to the surplus column; the path's cells alternate
+    # between gaining and losing, and the first cell to run dry ends the range
+    surplus_node = plants + cities
+    def rhs_range( node: int, value: float, gains_first: bool ):
+        path = tree.path( node, surplus_node )
+        gaining, losing = ( path[ 0::2 ], path[ 1::2 ] ) if gains_first else ( path[ 1::2 ], path[ 0::2 ] )
+        up = min(( flows[ k ] for k in losing ), default = inf )
+        down = min(( flows[ k ] for k in gaining ), default = inf )
+        return value - down, value + up
+    supply_range = zeros(( 2, plants ))
+    demand_range = zeros(( 2, cities ))
+    for i in range( plants ): supply_range[ :, i ] = rhs_range( i, supply[ i ], True )
+    for j in range( cities ): demand_range[ :, j ] = rhs_range( plants + j, demand[ j ], False )
+    # Requirements and supplies never go below zero
+    supply_range[0] = supply_range[0].clip( 0 )
+    demand_range[0] = demand_range[0].clip( 0 )
+
+    reduced = where( routes, reduced[ :, :cities ], nan )
+    reduced[ abs( reduced ) < TOLERANCE ] = 0.0
+    return Sensitivity(
+        costs, supply, demand, result.objective, result.supply, ( u, v[ :cities ] ), reduced,
+        ( cost_lower, cost_upper ), ( supply_range[0], supply_range[1] ), ( demand_range[0], demand_range[1] )
+    )
@@ -0,0 +1,316 @@
+from time import perf_counter
+
+from numpy import array, asarray, zeros, full, inf, argmin, argmax, where, append, allclose, bincount, unravel_index, ix_, float64, int64
+
+from optikwh.solution import Solution, OPTIMAL, NOT_SOLVED, INFEASIBLE
+from optikwh.timing import phase
+
+TOLERANCE = 1e-9
+
+# /----------------| Balancing |----------------\
+def balance( costs, supply, demand ):
+    # Plants may ship less than their supply, so the surplus goes to a zero cost dummy city
+    costs = asarray( costs, dtype=float64 )
+    supply = asarray( supply, dtype=float64 )
+    demand = asarray( demand, dtype=float64 )
+    surplus = supply.sum() - demand.sum()
+    costs = append( costs, zeros(( costs.shape[0], 1 )), axis = 1 )
+    demand = append( demand, max( surplus, 0.0 ) )
+    return costs, supply, demand, surplus
+
+# /----------------| Vogel initial basis |----------------\
+class _Lines:
+    # Keeps the two cheapest active cells of every row (or column) of the cost matrix
+    def __init__( self, costs ):
+        self.costs = costs.tolist()
+        self.order = costs.argsort( axis = 1, kind = 'stable' ).tolist()
+        self.position = [ 0 ] * costs.shape[0]
+        self.first = full( costs.shape[0], -1 )
+        self.second = full( costs.shape[0], -1 )
+        self.penalty = full( costs.shape[0], -inf )
+
+    def update( self, line: int, active: list ):
+        order, position = self.order[ line ], self.position[ line ]
+        while not active[ order[ position ] ]: position += 1
+        second = position + 1
+        while second < len( order ) and not active[ order[ second ] ]: second += 1
+        self.position[ line ], self.first[ line ] = position, order[ position ]
+        costs = self.costs[ line ]
+        if second < len( order ):
+            self.second[ line ] = order[ second ]
+            self.penalty[ line ] = costs[ order[ second ] ] - costs[ order[ position ] ]
+        else:
+            self.second[ line ] = -1
+            self.penalty[ line ] = costs[ order[ position ] ]
+
+    def remove( self, crossed: int, active: list ):
+        # Only lines whose two cheapest cells used the crossed out line change their penalty
+        for line in where(( self.first == crossed ) | ( self.second == crossed ))[0]:
+            if self.penalty[ line ] > -inf: self.update( line, active )
+
+def vogel( costs, supply, demand ):
+    plants, cities = costs.shape
+    supply, demand = supply.tolist(), demand.tolist()
+    rows, cols = [ True ] * plants, [ True ] * cities
+    by_row, by_col = _Lines( costs ), _Lines( costs.T )
+    for i in range( plants ): by_row.update( i, cols )
+    for j in range( cities ): by_col.update( j, rows )
+    left_rows, left_cols = plants, cities
+    basis_rows, basis_cols, flows = [], [], []
+
+    def allocate( i, j ):
+        amount = min( supply[ i ], demand[ j ] )
+        supply[ i ] -= amount
+        demand[ j ] -= amount
+        basis_rows.append( i ); basis_cols.append( j ); flows.append( amount )
+
+    while True:
+        # A single line left takes every remaining cell, which closes the spanning tree
+        if left_rows == 1:
+            i = rows.index( True )
+            for j in range( cities ):
+                if cols[ j ]: allocate( i, j )
+            break
+        if left_cols == 1:
+            j = cols.index( True )
+            for i in range( plants ):
+                if rows[ i ]: allocate( i, j )
+            break
+
+        r, c = int( argmax( by_row.penalty ) ), int( argmax( by_col.penalty ) )
+        if by_row.penalty[ r ] >= by_col.penalty[ c ]: i, j = r, by_row.first[ r ]
+        else: i, j = by_col.first[ c ], c
+        allocate( i, j )
+
+        # Only one line is crossed out per step so degenerate steps still add a basic cell
+        if supply[ i ] <= demand[ j ]:
+            rows[ i ], left_rows = False, left_rows - 1
+            by_row.penalty[ i ] = -inf
+            by_col.remove( i, rows )
+        else:
+            cols[ j ], left_cols = False, left_cols - 1
+            by_col.penalty[ j ] = -inf
+            by_row.remove( j, cols )
+
+    return array( basis_rows, dtype=int64 ), array( basis_cols, dtype=int64 ), array( flows )
+
+# /----------------| Spanning tree utils. |----------------\
+class _Tree:
+    # Basis spanning tree over plants 0..m-1 and cities m..m+n-1, rooted at plant 0
+    def __init__( self, costs, basis_rows, basis_cols ):
+        self.costs = costs
+        self.plants = costs.shape[0]
+        nodes = self.plants + costs.shape[1]
+        self.rows, self.cols = basis_rows, basis_cols
+        self.edge_costs = costs[ basis_rows, basis_cols ].tolist()
+        self.adjacency = [ {} for _ in range( nodes ) ]
+        for edge, ( i, j ) in enumerate( zip( basis_rows.tolist(), basis_cols.tolist() ) ):
+            self.adjacency[ i ][ self.plants + j ] = edge
+            self.adjacency[ self.plants + j ][ i ] = edge
+        self.potential = [ 0.0 ] * nodes
+        self.parent, self.parent_edge, self.depth = [ -1 ] * nodes, [ -1 ] * nodes, [ -1 ] * nodes
+        self.depth[ 0 ] = 0
+        self._hang( 0 )
+
+    def _hang( self, top: int ):
+        # Recomputes depth and duals below top; basic cells have zero reduced cost: c_ij = u_i + v_j
+        stack = [ top ]
+        while stack:
+            node = stack.pop()
+            for child, edge in self.adjacency[ node ].items():
+                if child == self.parent[ node ]: continue
+                self.parent[ child ], self.parent_edge[ child ] = node, edge
+                self.depth[ child ] = self.depth[ node ] + 1
+                self.potential[ child ] = self.edge_costs[ edge ] - self.potential[ node ]
+                stack.append( child )
+
+    def flows( self, supply, demand ):
+        # Peels the tree from its leaves: each node's parent cell carries what its subtree leaves unbalanced
+        net = supply.tolist() + demand.tolist()
+        order, stack = [], [ 0 ]
+        while stack:
+            node = stack.pop()
+            order.append( node )
+            stack.extend( child for child in self.adjacency[ node ] if child != self.parent[ node ] )
+        flows = zeros( len( self.edge_costs ) )
+        for node in reversed( order[ 1: ] ):
+            flows[ self.parent_edge[ node ] ] = net[ node ]
+            net[ self.parent[ node ] ] -= net[ node ]
+        return flows
+
+    def duals( self ):
+        potential = array( self.potential )
+        return potential[ :self.plants ], potential[ self.plants: ]
+
+    def path( self, a: int, b: int ):
+        # Tree edges from node b back to node a, in walking order
+        parent, parent_edge, depth = self.parent, self.parent_edge, self.depth
+        head, tail = [], []
+        while depth[ b ] > depth[ a ]:
+            head.append( parent_edge[ b ] ); b = parent[ b ]
+        while depth[ a ] > depth[ b ]:
+            tail.append( parent_edge[ a ] ); a = parent[ a ]
+        while a != b:
+            head.append( parent_edge[ b ] ); b = parent[ b ]
+            tail.append( parent_edge[ a ] ); a = parent[ a ]
+        return head + tail[ ::-1 ]
+
+    def below( self, leaving: int ):
+        # The endpoint of a basic cell further from the root, and a mask of the nodes hanging under it
+        r, c = int( self.rows[ leaving ] ), self.plants + int( self.cols[ leaving ] )
+        cut = r if self.parent_edge[ r ] == leaving else c
+        mask = zeros( len( self.adjacency ), dtype=bool )
+        stack = [ cut ]
+        while stack:
+            node = stack.pop()
+            mask[ node ] = True
+            stack.extend( child for child in self.adjacency[ node ] if child != self.parent[ node ] )
+        return cut, mask
+
+    def pivot( self, i: int, j: int, leaving: int ):
+        # The entering cell (i, j) takes the slot of the leaving cell
+        a, b = i, self.plants + j
+        r, c = int( self.rows[ leaving ] ), self.plants + int( self.cols[ leaving ] )
+        cut = r if self.parent_edge[ r ] == leaving else c
+
+        del self.adjacency[ r ][ c ], self.adjacency[ c ][ r ]
+        self.adjacency[ a ][ b ] = self.adjacency[ b ][ a ] = leaving
+        self.rows[ leaving ], self.cols[ leaving ] = i, j
+        self.edge_costs[ leaving ] = float( self.costs[ i, j ] )
+
+        # Only the subtree cut off by the leaving cell is re-hung under the entering cell
+        node = a
+        while node != cut and node != 0: node = self.parent[ node ]
+        top, bottom = ( a, b ) if node == cut else ( b, a )
+        self.parent[ top ], self.parent_edge[ top ] = bottom, leaving
+        self.depth[ top ] = self.depth[ bottom ] + 1
+        self.potential[ top ] = self.edge_costs[ leaving ] - self.potential[ bottom ]
+        self._hang( top )
+
+# /----------------| MODI iterations |----------------\
+def modi( costs, basis_rows, basis_cols, flows, max_iter: int = None, tree: _Tree = None, deadline: float = None ):
+    plants, cities = costs.shape
+    max_iter = max_iter or 50 * ( plants + cities ) ** 2
+    tree = tree or _Tree( costs, basis_rows, basis_cols )
+    for _ in range( max_iter ):
+        if deadline is not None and perf_counter() > deadline: break
+        u, v = tree.duals()
+        reduced = costs - u[ :, None ] - v[ None, : ]
+        entering = argmin( reduced )
+        if reduced.flat[ entering ] >= -TOLERANCE:
+            return OPTIMAL, basis_rows, basis_cols, flows, ( u, v )
+
+        i, j = ( int( k ) for k in unravel_index( entering, costs.shape ) )
+        cycle = array( tree.path( i, plants + j ) )
+        # Walking from city j back to plant i, the cycle cells alternate between losing and gaining flow
+        losing, gaining = cycle[ 0::2 ], cycle[ 1::2 ]
+        leaving = int( losing[ argmin( flows[ losing ] ) ] )
+        theta = flows[ leaving ]
+
+        flows[ losing ] -= theta
+        flows[ gaining ] += theta
+        flows[ leaving ] = theta
+        tree.pivot( i, j, leaving )
+
+    return NOT_SOLVED, basis_rows, basis_cols, flows, tree.duals()
+
+def dual_modi( costs, tree: _Tree, flows, max_iter: int = None ):
+    # From a basis that is still optimal for the costs but carries negative flows after the supplies or
+    # requirements changed: the most negative cell leaves, and the cheapest cell reconnecting the tree so
+    # that the leaving cell gains flow enters, which keeps every reduced cost non negative.
+    # Returns the feasible (hence optimal) flows, or None when no cell can enter
+    plants, cities = costs.shape
+    max_iter = max_iter or 50 * ( plants + cities ) ** 2
+    for _ in range( max_iter ):
+        leaving = int( argmin( flows ) )
+        if flows[ leaving ] >= -TOLERANCE: return flows.clip( 0 )
+
+        # The leaving cell gains along the cycle of any cell from a plant on its city's side to a city on its plant's side
+        cut, below = tree.below( leaving )
+        city_side = below if cut >= plants else ~below
+        rows, cols = city_side[ :plants ].nonzero()[0], ( ~city_side[ plants: ] ).nonzero()[0]
+        if not len( rows ) or not len( cols ): return None
+        u, v = tree.duals()
+        reduced = costs[ ix_( rows, cols ) ] - u[ rows, None ] - v[ None, cols ]
+        k, l = unravel_index( argmin( reduced ), reduced.shape )
+        i, j = int( rows[ k ] ), int( cols[ l ] )
+
+        cycle = array( tree.path( i, plants + j ) )
+        theta = -flows[ leaving ]
+        flows[ cycle[ 0::2 ] ] -= theta
+        flows[ cycle[ 1::2 ] ] += theta
+        flows[ leaving ] = theta
+        tree.pivot( i, j, leaving )
+    return None
+
+# /----------------| Warm start |----------------\
+def _warm_start( previous: Solution, costs, supply, demand ):
+    # Returns the previous basis when it is still optimal, a tree to pivot from when it is still feasible, or None.
+    # Bases that were never optimal (a heuristic plan, a solve cut short) can only be started from
+    if previous is None or previous.basis is None or previous.status not in ( OPTIMAL, NOT_SOLVED ): return None
+    basis_rows, basis_cols, flows = ( item.copy() for item in previous.basis )
+    plants, cities = costs.shape
+    if previous.supply.shape != ( plants, cities - 1 ) or len( basis_rows ) != plants + cities - 1: return None
+
+    same_rhs = (
+        allclose( bincount( basis_rows, flows, plants ), supply ) and 
+        allclose( bincount( basis_cols, flows, cities ), demand )
+    )
+    # Optimal for the current costs: the old duals still fit every basic cell and price no cell below zero
+    optimal = previous.status == OPTIMAL and previous.duals is not None
+    if optimal:
+        u, v = previous.duals
+        optimal = (
+            allclose( costs[ basis_rows, basis_cols ], u[ basis_rows ] + v[ basis_cols ] ) and
+            ( costs - u[ :, None ] - v[ None, : ] ).min() >= -TOLERANCE
+        )
+    # Only non-basic costs moved and all of them stay within their reduced cost range: nothing to solve
+    if same_rhs and optimal: return basis_rows, basis_cols, flows, None
+
+    tree = _Tree( costs, basis_rows, basis_cols )
+    if not same_rhs:
+        flows = tree.flows( supply, demand )
+        if flows.min() < -TOLERANCE:
+            # With unchanged costs the basis is still dual feasible, so dual pivots restore the flows
+            if not optimal: return None
+            flows = dual_modi( costs, tree, flows )
+            if flows is None: return None
+        flows = flows.clip( 0 )
+    return basis_rows, basis_cols, flows, tree
+
+# /----------------| Solver |----------------\
+def transportation_simplex( costs, supply, demand, max_iter: int = None, warm_start: Solution = None, time_limit: float = None ):
+    with phase( 'build' ):
+        costs, supply, demand, surplus = balance( costs, supply, demand )
+    return solve_balanced( costs, supply, demand, max_iter, warm_start, time_limit )
+
+def solve_balanced( costs, supply, demand, max_iter: int = None, warm_start: Solution = None, time_limit: float = None ):
+    # costs and demand already carry the dummy city as their last column, e.g. from balance(); 
+    # the dummy requirement is set here from the supply surplus
+    plants, cities = costs.shape[0], costs.shape[1] - 1
+    surplus = supply.sum() - demand[ :cities ].sum()
+    if surplus < -TOLERANCE:
+        return Solution( INFEASIBLE, None, zeros(( plants, cities )) )
+    demand[ cities ] = max( surplus, 0.0 )
+
+    # Finding the starting basis (Vogel or the previous one) counts as part of the solver run;
+    # past the time limit the current basis is returned as not solved
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    with phase( 'solve' ):
+        start = _warm_start( warm_start, costs, supply, demand )
+        if start is None:
+            basis_rows, basis_cols, flows = vogel( costs, supply, demand )
+            status, basis_rows, basis_cols, flows, duals = modi( costs, basis_rows, basis_cols, flows, max_iter, deadline = deadline )
+        elif start[3] is None:
+            basis_rows, basis_cols, flows = start[ :3 ]
+            status, duals = OPTIMAL, warm_start.duals
+        else:
+            basis_rows, basis_cols, flows, tree = start
+            status, basis_rows, basis_cols, flows, duals = modi( costs, basis_rows, basis_cols, flows, max_iter, tree, deadline )
+
+    with phase( 'extract' ):
+        shipped = zeros( costs.shape )
+        shipped[ basis_rows, basis_cols ] = flows
+        shipped = shipped[ :, :cities ]
+        objective = float(( shipped * costs[ :, :cities ] ).sum())
+    return Solution( status, objective, shipped, ( basis_rows, basis_cols, flows ), duals )
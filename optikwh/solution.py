@@ -0,0 +1,21 @@
+from numpy import ndarray
+
+# Status codes follow PuLP's LpStatus so callers can keep comparing against them
+OPTIMAL = 1
+NOT_SOLVED = 0
+INFEASIBLE = -1
+UNBOUNDED = -2
+STATUS = { OPTIMAL: 'Optimal', NOT_SOLVED: 'Not Solved', INFEASIBLE: 'Infeasible', UNBOUNDED: 'Unbounded' }
+
+class Solution:
+    def __init__( self, status: int, objective: float, supply: ndarray, basis: tuple = None, duals: tuple = None, model = None, solver: str = None, bound: float = None ):
+        self.status = status
+        self.objective = objective
+        self.supply = supply
+        self.basis = basis
+        self.duals = duals
+        self.model = model
+        # The backend that found it, when chosen automatically or by a race
+        self.solver = solver
+        # Lowest objective any plan can reach, from a search that stops short of proving its plan optimal
+        self.bound = bound
@@ -0,0 +1,151 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock, local
+from time import sleep, time
+
+# Stores keep pickled objects by key; lock( key ) serializes read-modify-write cycles on one key
+
+# /----------------| In-process LRU |----------------\
+class MemoryStore:
+    # For development and single worker deployments; entries are lost when the process exits
+    def __init__( self, max_entries: int = 256 ):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.locks = {}
+        self.guard = Lock()
+
+    def get( self, key: str ):
+        with self.guard:
+            data = self.entries.get( key )
+            if data is None: return None
+            self.entries.move_to_end( key )
+        return pickle.loads( data )
+
+    def put( self, key: str, value ):
+        data = pickle.dumps( value, protocol=pickle.HIGHEST_PROTOCOL )
+        with self.guard:
+            self.entries[ key ] = data
+            self.entries.move_to_end( key )
+            while len( self.entries ) > self.max_entries:
+                evicted, _ = self.entries.popitem( last=False )
+                self.locks.pop( evicted, None )
+
+    def delete( self, key: str ):
+        with self.guard:
+            self.entries.pop( key, None )
+
+    @contextmanager
+    def lock( self, key: str ):
+        with self.guard: key_lock = self.locks.setdefault( key, Lock() )
+        with key_lock: yield
+
+# /----------------| Files on a shared disk |----------------\
+class DiskStore:
+    # One pickle per key in a directory every worker can reach; writes are atomic renames
+    def __init__( self, directory: str, timeout: float = 10.0, stale: float = 60.0 ):
+        self.directory = directory
+        self.timeout = timeout
+        self.stale = stale
+        os.makedirs( directory, exist_ok=True )
+
+    def _path( self, key: str, suffix: str = '.pkl' ):
+        if not key.isalnum(): raise ValueError( f'Invalid session key {key!r}' )
+        return os.path.join( self.directory, key + suffix )
+
+    def get( self, key: str ):
+        try:
+            with open( self._path( key ), 'rb' ) as file: return pickle.load( file )
+        except FileNotFoundError: return None
+
+    def put( self, key: str, value ):
+        descriptor, temporary = tempfile.mkstemp( dir=self.directory, suffix='.tmp' )
+        try:
+            with os.fdopen( descriptor, 'wb' ) as file: pickle.dump( value, file, protocol=pickle.HIGHEST_PROTOCOL )
+            os.replace( temporary, self._path( key ) )
+        except BaseException:
+            if os.path.exists( temporary ): os.remove( temporary )
+            raise
+
+    def delete( self, key: str ):
+        for path in ( self._path( key ), self._path( key, '.lock' ) ):
+            try: os.remove( path )
+            except FileNotFoundError: pass
+
+    @contextmanager
+    def lock( self, key: str ):
+        # A lock file created exclusively works across processes on every platform; abandoned ones expire
+        path = self._path( key, '.lock' )
+        deadline = time() + self.timeout
+        while True:
+            try:
+                os.close( os.open( path, os.O_CREAT | os.O_EXCL | os.O_WRONLY ) )
+                break
+            except FileExistsError:
+                try:
+                    if time() - os.path.getmtime( path ) > self.stale: os.remove( path )
+                except FileNotFoundError: pass
+                if time() > deadline: raise TimeoutError( f'Session { key } is locked' )
+                sleep( 0.01 )
+        try: yield
+        finally:
+            try: os.remove( path )
+            except FileNotFoundError: pass
+
+# /----------------| SQLite database |----------------\
+class SQLiteStore:
+    # One table in a database file shared by every worker; lock( key ) holds the database write lock
+    def __init__( self, path: str, timeout: float = 10.0 ):
+        self.path = path
+        self.timeout = timeout
+        self.local = local()
+        connection = self._connection()
+        connection.execute( 'PRAGMA journal_mode=WAL' )
+        connection.execute( 'CREATE TABLE IF NOT EXISTS sessions ( key TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL )' )
+
+    def _connection( self ):
+        # One connection per thread, in autocommit mode unless a lock is held
+        connection = getattr( self.local, 'connection', None )
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect( self.path, timeout=self.timeout, isolation_level=None )
+        return connection
+
+    def get( self, key: str ):
+        connection = self._connection()
+        row = connection.execute( 'SELECT data FROM sessions WHERE key = ?', ( key, ) ).fetchone()
+        return None if row is None else pickle.loads( row[0] )
+
+    def put( self, key: str, value ):
+        data = pickle.dumps( value, protocol=pickle.HIGHEST_PROTOCOL )
+        connection = self._connection()
+        connection.execute( 'INSERT OR REPLACE INTO sessions ( key, data, updated ) VALUES ( ?, ?, ? )', ( key, data, time() ) )
+
+    def delete( self, key: str ):
+        connection = self._connection()
+        connection.execute( 'DELETE FROM sessions WHERE key = ?', ( key, ) )
+
+    def purge( self, max_age: float ):
+        connection = self._connection()
+        connection.execute( 'DELETE FROM sessions WHERE updated < ?', ( time() - max_age, ) )
+
+    @contextmanager
+    def lock( self, key: str ):
+        connection = self._connection()
+        connection.execute( 'BEGIN IMMEDIATE' )
+        try: yield
+        except BaseException:
+            connection.execute( 'ROLLBACK' )
+            raise
+        connection.execute( 'COMMIT' )
+
+# /----------------| Store selection |----------------\
+def make_store( url: str = 'memory' ):
+    # memory, disk:<directory> or sqlite:<database file>
+    kind, _, path = url.partition( ':' )
+    if kind == 'memory': return MemoryStore()
+    if kind == 'disk' and path: return DiskStore( path )
+    if kind == 'sqlite' and path: return SQLiteStore( path )
+    raise ValueError( f'Unknown session store {url!r}; use memory, disk:<directory> or sqlite:<file>' )
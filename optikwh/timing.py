@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from threading import local
+from time import perf_counter
+
+# Phases are only timed while a recorder is active on the current thread or an observer is registered
+_active = local()
+_observers = []
+
+def observe( observer ):
+    # observer( phase, seconds ) is called after every phase, on any thread
+    _observers.append( observer )
+    return observer
+
+@contextmanager
+def record():
+    # Collects { phase: seconds } for everything timed on this thread inside the block
+    timings = {}
+    previous = getattr( _active, 'timings', None )
+    _active.timings = timings
+    try: yield timings
+    finally: _active.timings = previous
+
+@contextmanager
+def phase( name: str ):
+    timings = getattr( _active, 'timings', None )
+    if timings is None and not _observers:
+        yield
+        return
+    start = perf_counter()
+    try: yield
+    finally:
+        seconds = perf_counter() - start
+        if timings is not None: timings[ name ] = timings.get( name, 0.0 ) + seconds
+        for observer in _observers: observer( name, seconds )
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app imports its modules (utils, Pages, optikwh) from the repository root and reads Data/ relative to it
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, ROOT )
+os.chdir( ROOT )
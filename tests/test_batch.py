@@ -0,0 +1,14 @@
+from numpy import ones, array, stack
+from numpy.testing import assert_array_equal
+
+from optikwh.batch import solve_batch
+
+def test_plans_do_not_depend_on_chunking():
+    # Every route costs the same and requirements shift between scenarios, so each has many optimal plans
+    costs = ones(( 3, 4 ))
+    requirements = stack([ array([ 10.0, 20.0, 30.0, 40.0 ])[ [ k % 4, ( k + 1 ) % 4, ( k + 2 ) % 4, ( k + 3 ) % 4 ] ] for k in range( 12 ) ])
+    supply = array([ 40.0, 40.0, 40.0 ])
+    plans = [ solve_batch( costs, supply, requirements, workers = 1, chunksize = chunksize ) for chunksize in ( 1, 5, 12 ) ]
+    for objectives, statuses, supplies in plans[ 1: ]:
+        assert_array_equal( objectives, plans[0][0] )
+        assert_array_equal( supplies, plans[0][2] )
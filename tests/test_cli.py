@@ -0,0 +1,10 @@
+import csv
+import os
+from io import StringIO
+
+from optikwh.cli import main
+
+def test_directories_skip_tables_that_are_not_problems( capsys ):
+    assert main([ 'solve', 'Data' ]) == 0
+    rows = { row['file']: row['status'] for row in csv.DictReader( StringIO( capsys.readouterr().out ) ) }
+    assert rows == { os.path.join( 'Data', 'cities.csv' ): 'Skipped', os.path.join( 'Data', 'sample.csv' ): 'Optimal' }
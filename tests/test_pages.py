@@ -0,0 +1,65 @@
+import json
+from uuid import uuid4
+
+import pytest
+
+import app
+
+# /----------------| Dash requests |----------------\
+def _call( client, outputs: list, inputs: list, state: list, changed: str ):
+    # One callback request the way the browser sends it; outputs are ( id, property ) pairs
+    output = outputs[0] if len( outputs ) == 1 else None
+    payload = {
+        'output': f'{ output[0] }.{ output[1] }' if output else '..' + '...'.join( f'{ id }.{ prop }' for id, prop in outputs ) + '..',
+        'outputs': { 'id': output[0], 'property': output[1] } if output else [ { 'id': id, 'property': prop } for id, prop in outputs ],
+        'inputs': [ { 'id': id, 'property': prop, 'value': value } for id, prop, value in inputs ],
+        'state': [ { 'id': id, 'property': prop, 'value': value } for id, prop, value in state ],
+        'changedPropIds': [ changed ]
+    }
+    response = client.post( '/_dash-update-component', json = payload )
+    assert response.status_code in ( 200, 204 ), response.data[:500]
+    return json.loads( response.data ) if response.status_code == 200 else None
+
+@pytest.fixture
+def unsolved_shape_edit():
+    # A city added and its solve cancelled: the stored plan still has the old number of cities
+    session = uuid4().hex
+    with app.sessions.edit( session ) as transportation: transportation.add( axis = 1 )
+    transportation = app.sessions.load( session )
+    assert transportation.supply.shape != transportation.costs.shape
+    return app.server.test_client(), session
+
+# /----------------| Result pages |----------------\
+@pytest.mark.parametrize( 'path', [ '/cities', '/plants', '/map', '/input' ] )
+def test_pages_render_without_a_plan_for_the_current_shape( unsolved_shape_edit, path ):
+    client, session = unsolved_shape_edit
+    page = _call( client, [ ( 'page-content', 'children' ) ], [ ( 'url', 'pathname', path ) ], [ ( 'session-id', 'data', session ) ], 'url.pathname' )
+    if path in ( '/cities', '/plants' ): assert 'There is no optimal plan' in json.dumps( page )
+
+def test_result_figures_stay_empty_without_a_plan( unsolved_shape_edit ):
+    client, session = unsolved_shape_edit
+    state = [ ( 'session-id', 'data', session ) ]
+    for path, graph in ( ( '/cities', 'city-total-cost-plot' ), ( '/plants', 'plant-total-supply-plot' ) ):
+        figure = _call( client, [ ( graph, 'figure' ) ], [ ( 'url', 'pathname', path ) ], state, 'url.pathname' )
+        assert figure is None or not figure['response']
+
+def test_globe_has_no_routes_without_a_plan( unsolved_shape_edit ):
+    client, session = unsolved_shape_edit
+    globe = _call(
+        client, [ ( 'globe', 'figure' ) ],
+        [ ( { 'type': 'dropdown', 'target': 'Cities', 'index': [ 'ALL' ] }, 'value', [] ), ( { 'type': 'dropdown', 'target': 'Plants', 'index': [ 'ALL' ] }, 'value', [] ),
+          ( 'url', 'pathname', '/map' ), ( 'distance-apply', 'n_clicks', None ) ],
+        [ ( 'distance-per-km', 'value', 1 ), ( 'distance-fee', 'value', 0 ), ( 'session-id', 'data', session ) ], 'url.pathname'
+    )
+    names = [ trace.get( 'name' ) for trace in globe['response']['globe']['figure']['data'] ]
+    assert names == [ 'Cities', 'Plants' ]
+
+def test_results_table_after_a_cancelled_solve( unsolved_shape_edit ):
+    # Clicking the "Solve cancelled." alert asks for the results table
+    client, session = unsolved_shape_edit
+    results = _call(
+        client, [ ( 'problem-results', 'children' ) ],
+        [ ( 'problem-status', 'n_clicks', 1 ), ( 'solve-job', 'data', { 'id': 'cancelled', 'state': 'cancelled' } ) ],
+        [ ( 'session-id', 'data', session ) ], 'problem-status.n_clicks'
+    )
+    assert 'There is no plan for the current inputs.' in json.dumps( results )
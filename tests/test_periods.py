@@ -0,0 +1,17 @@
+from numpy import array
+import pytest
+
+from optikwh.periods import solve_periods
+
+COSTS = array([[ 1.0, 2.0 ], [ 3.0, 1.0 ]])
+
+def test_profiles_of_different_lengths():
+    solutions = solve_periods( COSTS, [ 5, 5 ], [ [ 1, 1 ], [ 2, 2 ], [ 1, 1 ] ], supplies = [ [ 5, 5 ], [ 5, 5 ] ] )
+    assert next( solutions ).objective == 2.0
+    next( solutions )
+    with pytest.raises( ValueError, match='same number of periods' ): next( solutions )
+
+def test_errors_inside_a_period_are_not_relabelled():
+    # A requirement vector of the wrong length fails in the solve itself
+    with pytest.raises( ValueError ) as error: list( solve_periods( COSTS, [ 5, 5 ], [ [ 1, 1, 1 ] ], supplies = [ [ 5, 5 ] ] ) )
+    assert 'same number of periods' not in str( error.value )
@@ -0,0 +1,34 @@
+from threading import Thread
+from time import sleep, perf_counter
+
+from optikwh.scheduler import SolveScheduler
+
+class _Model:
+    def __init__( self, seconds: float = 0.0 ):
+        self.version, self.solved_version, self.seconds = 1, None, seconds
+
+    def solve( self ):
+        sleep( self.seconds )
+        self.solved_version = self.version
+
+def _request_all( scheduler: SolveScheduler, requests: list ):
+    results = [ None ] * len( requests )
+    def run( index, model, key ): results[ index ] = scheduler.request( model, key )
+    threads = [ Thread( target=run, args=( index, model, key ) ) for index, ( model, key ) in enumerate( requests ) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    return results
+
+def test_requests_for_one_key_coalesce_and_are_forgotten():
+    scheduler, model = SolveScheduler( 0.05 ), _Model()
+    results = _request_all( scheduler, [ ( model, 'session' ) ] * 5 )
+    assert results.count( True ) == 1
+    assert scheduler.stats() == { 'solves': 1, 'skipped': 0, 'dropped': 4 }
+    assert scheduler.latest == {} and scheduler.locks == {}
+
+def test_keys_solve_side_by_side():
+    # One session's long solve must not hold up another session's
+    scheduler = SolveScheduler( 0 )
+    start = perf_counter()
+    assert _request_all( scheduler, [ ( _Model( 0.5 ), 'slow' ), ( _Model( 0.5 ), 'other' ) ] ) == [ True, True ]
+    assert perf_counter() - start < 0.9
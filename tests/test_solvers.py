@@ -0,0 +1,22 @@
+from numpy import full, nan, array
+import pytest
+
+from optikwh.backends import SOLVERS
+from optikwh.periods import solve_periods
+from optikwh.solution import OPTIMAL, INFEASIBLE
+
+# Every route cleared: nothing can ship, so only requirements of zero are met
+NO_ROUTES = full(( 2, 3 ), nan )
+SUPPLY = array([ 5.0, 5.0 ])
+
+@pytest.mark.parametrize( 'solver', sorted( SOLVERS ) )
+@pytest.mark.parametrize( 'requirements, status, objective', [ ( [ 0, 0, 0 ], OPTIMAL, 0.0 ), ( [ 0, 1, 0 ], INFEASIBLE, None ) ] )
+def test_no_routes( solver, requirements, status, objective ):
+    solution = SOLVERS[ solver ]( NO_ROUTES, SUPPLY, array( requirements, dtype=float ) )
+    assert ( solution.status, solution.objective ) == ( status, objective )
+    assert solution.supply.shape == NO_ROUTES.shape and not solution.supply.any()
+
+@pytest.mark.parametrize( 'solver', [ 'simplex', 'highs', 'cbc' ] )
+def test_no_routes_over_periods( solver ):
+    solutions = solve_periods( NO_ROUTES, SUPPLY, [ [ 0, 0, 0 ], [ 0, 1, 0 ] ], solver )
+    assert [ ( solution.status, solution.objective ) for solution in solutions ] == [ ( OPTIMAL, 0.0 ), ( INFEASIBLE, None ) ]
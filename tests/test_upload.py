@@ -0,0 +1,30 @@
+import base64
+from io import BytesIO
+
+import pytest
+
+from optikwh.io import read_upload, UploadError
+
+def _upload( payload: bytes, mime: str = 'text/csv' ):
+    return f'data:{ mime };base64,' + base64.b64encode( payload ).decode()
+
+def _xlsx( rows: list ):
+    from openpyxl import Workbook
+    book = Workbook()
+    for row in rows: book.active.append( row )
+    buffer = BytesIO()
+    book.save( buffer )
+    return buffer.getvalue()
+
+@pytest.mark.parametrize( 'filename, payload', [
+    ( 'header.csv', b',City 1,City 2,\n' ),
+    ( 'requirements.csv', b',City 1,City 2,\nCity requirement,10,20,\n' ),
+    ( 'routes.csv', b'plant,city,cost\n' ),
+    ( 'header.xlsx', _xlsx([ [ None, 'City 1', 'City 2', None ] ]) ),
+], ids = [ 'csv header', 'requirements only', 'edge list header', 'xlsx header' ] )
+def test_tables_without_data_are_rejected( filename, payload ):
+    with pytest.raises( UploadError, match='No plants or cities' ): read_upload( _upload( payload ), filename, max_rows = 36, max_cols = 36 )
+
+def test_sample_upload():
+    with open( 'Data/sample.csv', 'rb' ) as file: costs, supply, requirements, _ = read_upload( _upload( file.read() ), 'sample.csv' )
+    assert costs.shape == ( len( supply ), len( requirements ) )
@@ -1,38 +1,137 @@
-import os
-import base64
-import tempfile
-
-from pandas import read_csv, read_excel, Series, DataFrame
-from pulp import LpProblem, LpMinimize, LpVariable, LpContinuous, value, PULP_CBC_CMD
-from numpy import ones, array, sum, argmax, argmin
+from pandas import isna, Series, DataFrame
+from numpy import ones, zeros, array, sum, nanargmax, nanargmin, isfinite, where, nanmean, append
 import math
-from dash import html
+from math import ceil
+from collections import OrderedDict
+from threading import Lock
+from uuid import uuid4
+from contextlib import contextmanager
+from dash import dash_table, html, dcc
 import dash_bootstrap_components as dbc
 
-CITIES = read_csv( 'Data/cities.csv' )
+from optikwh.backends import SOLVERS, configure
+from optikwh.cache import SolutionCache, SOLUTION_CACHE
+from optikwh.solution import NOT_SOLVED, INFEASIBLE, OPTIMAL, STATUS, Solution
+from optikwh.sensitivity import analyse
+from optikwh.heuristics import heuristic_solution, gap
+from optikwh.fixedcharge import solve_fixed_charge
+from optikwh.jobs import report
+from optikwh.presolve import diagnose, add_dummy_plant
+from optikwh.io import read_problem, read_upload, MAX_UPLOAD_BYTES
+from optikwh.locations import load_gazetteer
+from optikwh.distance import distance_costs
+from optikwh.store import MemoryStore
+from optikwh.timing import phase
+from optikwh.metrics import SOLVES, stats_metrics
+from optikwh.scheduler import SolveScheduler
+
+GAZETTEER = load_gazetteer()
+CITIES = GAZETTEER.frame
+GRID_ROWS, GRID_COLS = 20, 12
+# Above this many nodes the result pages draw one combined figure instead of a pie per node
+MAX_PIES = 12
 
 class Transportation:
-    def __init__( self, costs: DataFrame, plant_supply: Series, city_requirements: Series ):
+    def __init__( self, costs: DataFrame, plant_supply: Series, city_requirements: Series, solver: str = 'cbc', cache: SolutionCache = SOLUTION_CACHE, capacities: DataFrame = None, balance: bool = False, fixed_costs: Series = None ):
+        # Blank (NaN) or infinite costs are routes that do not exist; capacities are NaN where unlimited
         self.costs = costs
         self.plant_supply = plant_supply
         self.city_requirements = city_requirements
-        self.problem, self.kwh, self.supply = None, None, None
+        self.capacities = capacities
+        self.solver = solver
+        # Unmet requirements are bought from a penalty plant instead of making the problem infeasible
+        self.balance = balance
+        # Paid by every plant that ships anything, which makes plant opening part of the solve; None leaves it out
+        self.fixed_costs = fixed_costs
+        self.cache = cache
+        self.uid = uuid4().hex
+        self.problem, self.supply, self.solution = None, None, None
+        self.status, self.objective = None, None
+        self.diagnosis, self.unmet = None, None
+        # A heuristic plan shown while the exact solve runs, for the model version it was built from
+        self.provisional, self.provisional_version = None, None
+        # Bumped on every model edit so unchanged models are never solved twice
+        self.version, self.solved_version = 0, None
         self.solve()
 
+    def __getstate__( self ):
+        # Sessions are pickled into the store: the process wide cache and solver models stay behind
+        state = self.__dict__.copy()
+        state['cache'] = self.cache is not None
+        state['problem'] = None
+        if self.solution is not None:
+            solution = self.solution
+            state['solution'] = Solution( solution.status, solution.objective, solution.supply, solution.basis, solution.duals, bound = solution.bound )
+        return state
+
+    def __setstate__( self, state ):
+        self.__dict__.update( state )
+        self.cache = SOLUTION_CACHE if state['cache'] else None
+
+    def touch( self ):
+        self.version += 1
+
     def get_from_file( self, file_path: str ):
-        format = file_path.split('.')[-1]
-        match format:
-            case 'csv': data = read_csv( file_path, index_col=0 )
-            case 'xlsx': data = read_excel( file_path, index_col=0 )
-            case 'xls': data = read_excel( file_path, index_col=0 )
-            case _: raise ValueError("Unsupported file format")
+        self.costs, self.plant_supply, self.city_requirements, self.capacities = read_problem( file_path )
+        self._reset_fixed_costs()
+        self.touch()
 
-        city_requirements = Series( data.iloc[-1,:-1], name='City requirements' )
-        plant_supply = Series(data.iloc[:-1, -1], name='Plant supply')
+    def get_from_upload( self, contents: str, filename: str, max_bytes: int = MAX_UPLOAD_BYTES, max_size: int = None ):
+        # Parsed from memory; limits are enforced while the payload is decoded
+        self.costs, self.plant_supply, self.city_requirements, self.capacities = read_upload( 
+            contents, filename, max_bytes = max_bytes, max_rows = max_size, max_cols = max_size 
+        )
+        self._reset_fixed_costs()
+        self.touch()
+    
+    def set_cost( self, plant, city, value ):
+        if self.costs.loc[ plant, city ] == value or isna( self.costs.loc[ plant, city ] ) and isna( value ): return
+        self.costs.loc[ plant, city ] = value
+        self.touch()
 
-        self.costs = data.drop(data.index[-1]).drop(data.columns[-1], axis=1)
-        self.plant_supply = plant_supply
-        self.city_requirements = city_requirements
+    def set_supply( self, plant, value ):
+        if self.plant_supply.loc[ plant ] == value: return
+        self.plant_supply.loc[ plant ] = value
+        self.touch()
+
+    def set_requirement( self, city, value ):
+        if self.city_requirements.loc[ city ] == value: return
+        self.city_requirements.loc[ city ] = value
+        self.touch()
+    
+    def _reset_fixed_costs( self ):
+        # Problem files carry no fixed costs: loaded plants start free to open
+        if self.fixed_costs is not None: self.fixed_costs = Series( 0.0, index=self.costs.index, name='Fixed cost' )
+
+    def set_fixed_charge( self, enabled: bool ):
+        if ( self.fixed_costs is not None ) == bool( enabled ): return
+        self.fixed_costs = Series( 0.0, index=self.costs.index, name='Fixed cost' ) if enabled else None
+        self.touch()
+
+    def set_fixed_cost( self, plant, value ):
+        if self.fixed_costs.loc[ plant ] == value: return
+        self.fixed_costs.loc[ plant ] = value
+        self.touch()
+
+    def rename( self, plants: list, cities: list ):
+        # New names for every plant and city, in order; everything indexed by them follows
+        self.costs.index, self.costs.columns = plants, cities
+        self.plant_supply.index = plants
+        self.city_requirements.index = cities
+        if self.capacities is not None: self.capacities.index, self.capacities.columns = plants, cities
+        if self.fixed_costs is not None: self.fixed_costs.index = plants
+        self.touch()
+
+    def set_balance( self, balance: bool ):
+        if self.balance == bool( balance ): return
+        self.balance = bool( balance )
+        self.touch()
+
+    def set_distance_costs( self, per_km: float = 1.0, fee: float = 0.0 ):
+        # Every route costs a fixed fee plus a rate per km between the named locations
+        costs = distance_costs( self.costs.index, self.costs.columns, per_km, fee, GAZETTEER )
+        self.costs = DataFrame( costs, index=self.costs.index, columns=self.costs.columns )
+        self.touch()
     
     def delete( self, index: int = 0, axis: int = 0 ):
         if axis: 
@@ -43,6 +142,9 @@ class Transportation:
             index = self.costs.index[ index ]
             self.costs.drop( index, axis = axis, inplace=True )
             self.plant_supply.drop( index = index, inplace=True )
+            if self.fixed_costs is not None: self.fixed_costs.drop( index = index, inplace=True )
+        if self.capacities is not None: self.capacities.drop( index, axis = axis, inplace=True )
+        self.touch()
     
     def add( self, axis: int = 0 ):
         if axis:
@@ -51,81 +153,249 @@ class Transportation:
         else: 
             self.costs.loc[ f'Plant {self.costs.shape[0]+1}', : ] = ones( self.costs.shape[1] )
             self.plant_supply.loc[ f'Plant {self.plant_supply.shape[0]+1}' ] = 0
+            if self.fixed_costs is not None: self.fixed_costs.loc[ self.costs.index[-1] ] = 0
+        if self.capacities is not None: self.capacities = self.capacities.reindex( index=self.costs.index, columns=self.costs.columns )
+        self.touch()
     
-    def to_html( self ):
-        table_content = [
-            html.Tr(
-                [ html.Th(idx) ] + [
-                    html.Td( dbc.Input( 
-                        value = cell, 
-                        id = {'type': 'costs-cell', 'index': f'{idx}-{jdx}'}, 
-                        type='number', 
-                        min = 0 ), 
-                        style={'min-width':'176px'}
-                    )
-                    for jdx, cell in row.items()
-                ] + [ html.Td( 
-                    dbc.Input( 
-                        value = self.plant_supply.iloc[ list( self.costs.index ).index( idx ) ], 
-                        id = {'type': 'plant-cell', 'index': idx}, 
-                        type='number', 
-                        min = 0
-                    ), style={'min-width':'176px'} )
+    def window( 
+        self, row_page: int = 0, col_page: int = 0, rows: int = GRID_ROWS, cols: int = GRID_COLS, 
+        values: array = None, supply: array = None, requirements: array = None 
+    ):
+        # One page of plants by one page of cities plus their supply and requirements; ids are positions.
+        # Fixed costs are edited next to the supply and left out of result views
+        fixed = self.fixed_costs is not None and values is None
+        values = self.costs.values if values is None else values
+        supply = self.plant_supply.values if supply is None else supply
+        requirements = self.city_requirements.values if requirements is None else requirements
+        plants = range( row_page * rows, min(( row_page + 1 ) * rows, self.costs.shape[0] ) )
+        cities = range( col_page * cols, min(( col_page + 1 ) * cols, self.costs.shape[1] ) )
+
+        columns = [ { 'name': '', 'id': '__plant__', 'editable': False } ] + [
+            { 'name': str( self.costs.columns[ j ] ), 'id': f'{j}', 'type': 'numeric', 'on_change': { 'action': 'coerce', 'failure': 'default' } }
+            for j in cities
+        ] + [ { 'name': 'Plant supply', 'id': '__supply__', 'type': 'numeric', 'on_change': { 'action': 'coerce', 'failure': 'default' } } ] + (
+            [ { 'name': 'Fixed cost', 'id': '__fixed__', 'type': 'numeric', 'on_change': { 'action': 'coerce', 'failure': 'default' } } ] if fixed else []
+        )
+
+        data = [
+            dict(
+                [ ( '__row__', i ), ( '__plant__', str( self.costs.index[ i ] ) ), ( '__supply__', _cell( supply[ i ] ) ) ] +
+                ( [ ( '__fixed__', _cell( self.fixed_costs.iloc[ i ] ) ) ] if fixed else [] ) +
+                [ ( f'{j}', _cell( values[ i, j ] ) ) for j in cities ]
+            ) for i in plants
+        ] + [ dict(
+            [ ( '__row__', None ), ( '__plant__', 'City requirement' ), ( '__supply__', None ) ] +
+            ( [ ( '__fixed__', None ) ] if fixed else [] ) +
+            [ ( f'{j}', _cell( requirements[ j ] ) ) for j in cities ]
+        ) ]
+        return columns, data
+
+    def to_html( 
+        self, rows: int = GRID_ROWS, cols: int = GRID_COLS, id: str = 'cost-grid', 
+        values: array = None, supply: array = None, requirements: array = None 
+    ):
+        # Only the visible window is rendered and shipped; paging through plants and cities fetches the next one
+        columns, data = self.window( 0, 0, rows, cols, values, supply, requirements )
+        editable = values is None
+        return [
+            dash_table.DataTable(
+                id = id,
+                columns = columns,
+                data = data,
+                editable = editable,
+                page_action = 'custom',
+                page_current = 0,
+                page_size = rows,
+                page_count = max( 1, ceil( self.costs.shape[0] / rows ) ),
+                style_cell = { 'minWidth': '96px', 'fontFamily': 'Nunito Sans' },
+                style_header = { 'fontWeight': 'bold' },
+                style_data_conditional = [ 
+                    { 'if': { 'column_id': '__plant__' }, 'fontWeight': 'bold' },
+                    { 'if': { 'filter_query': '{__plant__} = "City requirement"' }, 'fontWeight': 'bold' }
                 ]
-            ) for idx, row in self.costs.iterrows() 
-        ] + [ html.Tr(
-            [ html.Th( 'City requirement' ) ] + [
-                html.Td( 
-                    dbc.Input( value = item, id = {'type': 'city-cell', 'index': idx}, type='number', min = 0 ),
-                    style={'min-width':'176px'}
-                ) for idx, item in self.city_requirements.items()
-            ])
+            ),
+            dbc.Pagination(
+                id = f'{id}-columns',
+                max_value = max( 1, ceil( self.costs.shape[1] / cols ) ),
+                active_page = 1,
+                first_last = True,
+                previous_next = True,
+                fully_expanded = False,
+                className = 'mt-2'
+            )
         ]
-        return [dbc.Table([
-            html.Thead([
-                html.Tr(
-                    [html.Th('')] + 
-                    [html.Th(col) for col in self.costs.columns] + 
-                    [html.Th('Plant supply')]
-                )
-            ]),
-            html.Tbody(table_content)
-        ], className='table primary')]
     
-    def solve( self ):
-        
+    def solve( self, progress = None ):
+        # progress( objective, bound, nodes ) follows a fixed-charge search while it runs
+        version = self.version
         costs = self.costs.copy().values
         city_requirements = self.city_requirements.copy().values
         plant_supply = self.plant_supply.copy().values
 
-        cities = len( city_requirements )
-        plants = len( plant_supply )
-        
-        problem = LpProblem( 'Min_supply', LpMinimize )
+        capacities = self.capacities.values if self.capacities is not None else None
 
-        kwh = array([ 
-            [ LpVariable( f'Plant{i+1}ToCity{j+1}', lowBound=0, cat=LpContinuous ) for j in range( cities ) ] 
-            for i in range( plants ) 
-        ])
+        # Totals and routes alone often show the problem cannot be solved, so the solver is not called
+        with phase( 'presolve' ):
+            self.diagnosis = diagnose( costs, plant_supply, city_requirements, capacities )
+        balanced = self.balance and not self.diagnosis.feasible and not self.diagnosis.negative
+        if balanced:
+            costs, plant_supply, city_requirements, capacities = add_dummy_plant( costs, plant_supply, city_requirements, capacities )
+        elif not self.diagnosis.feasible:
+            self.solution, self.problem, self.unmet = None, None, None
+            self.status, self.objective = INFEASIBLE, None
+            self.supply = zeros( costs.shape )
+            self.solved_version = version
+            SOLVES.inc( 'presolve', STATUS[ INFEASIBLE ] )
+            return
 
-        f = sum( kwh*costs )
-        problem += f
+        # Cache keys leave fixed costs out, so fixed-charge solves are not cached
+        fixed = self.fixed_costs is not None
+        key = self.cache.key( costs, plant_supply, city_requirements, capacities ) if self.cache is not None and not fixed else None
+        solution = self.cache.get( key ) if key else None
+        if fixed:
+            # Plants open only when they ship; the penalty plant opens for free
+            fixed_costs = append( self.fixed_costs.values, 0.0 ) if balanced else self.fixed_costs.values
+            solution = solve_fixed_charge( costs, plant_supply, city_requirements, fixed_costs, capacities, progress = progress )
+        elif solution is None:
+            # The last optimal basis and duals let single-cell edits re-solve in a few pivots;
+            # a model of another shape starts from its provisional plan instead
+            warm_start = self.solution
+            provisional = self.provisional if self.provisional_version == version else None
+            if provisional is not None and ( warm_start is None or warm_start.supply.shape != provisional.supply.shape ): warm_start = provisional
+            solution = SOLVERS[ self.solver ]( costs, plant_supply, city_requirements, warm_start = warm_start, capacities = capacities )
+            if key and solution.status != NOT_SOLVED: self.cache.put( key, solution )
 
-        supplies = sum( kwh, axis = 1 )
-        for i, supply in enumerate( supplies ):
-          problem += supply <= plant_supply[ i ]
+        self.solution = solution
+        self.problem = solution.model
+        self.status = solution.status
+        self.objective = solution.objective
+        self.supply = solution.supply
+        self.unmet = None
+        if balanced and solution.objective is not None:
+            # The penalty plant is the last row; its shipments are the unmet requirements
+            self.supply, self.unmet = solution.supply[ :-1 ], solution.supply[ -1 ]
+            self.objective = solution.objective - float( self.unmet @ costs[ -1 ] )
+        self.solved_version = version
+        SOLVES.inc( getattr( solution, 'solver', None ) or self.solver, STATUS.get( solution.status, str( solution.status ) ) )
+    
+    def preview( self, method: str = 'vogel' ):
+        # A feasible plan from a construction heuristic, in a fraction of the solve time; None when presolve rules
+        # the model out, a route is missing or capacitated, or plants have fixed costs the heuristics ignore
+        if self.fixed_costs is not None: return None
+        costs = self.costs.values
+        capacities = self.capacities.values if self.capacities is not None else None
+        if not isfinite( costs ).all() or capacities is not None and isfinite( capacities ).any(): return None
+        if not diagnose( costs, self.plant_supply.values, self.city_requirements.values ).feasible: return None
+        self.provisional = heuristic_solution( costs, self.plant_supply.values, self.city_requirements.values, method )
+        self.provisional_version = self.version
+        return self.provisional
 
-        supplies = sum( kwh, axis = 0 )
-        for i, supply in enumerate( supplies ):
-          problem += supply >= city_requirements[ i ]
+    def has_plan( self ):
+        # A plan for the current plants and cities: a shape edit leaves the last one behind until its solve finishes
+        return self.objective is not None and self.supply is not None and self.supply.shape == self.costs.shape
 
-        problem.solve( PULP_CBC_CMD(msg=False) )
-        problem.objective.value()
+    def shipments( self ):
+        # What the results grid shows: the provisional plan while the current model is still being solved
+        if self.solved_version != self.version and self.provisional is not None and self.provisional_version == self.version:
+            return self.provisional.supply
+        return self.supply
+
+    def gap( self ):
+        # How far the provisional plan was from the optimum found for the same model
+        if self.provisional is None or self.provisional_version != self.solved_version or self.status != OPTIMAL: return None
+        return gap( self.provisional.objective, self.objective )
+
+    def mip_gap( self ):
+        # How far the fixed-charge plan may be from the optimum, from the bound its search proved
+        if self.solution is None or self.solution.bound is None or self.version != self.solved_version: return None
+        return gap( self.solution.objective, self.solution.bound )
+
+    def sensitivity( self ):
+        # Duals, reduced costs and ranging of the current optimum, see optikwh.sensitivity; None when the model changed
+        # since its solve, has route capacities or fixed costs, or leaves requirements to the penalty plant whose cost
+        # would set every dual
+        if self.status != OPTIMAL or self.version != self.solved_version or self.unmet is not None: return None
+        if self.fixed_costs is not None: return None
+        if self.capacities is not None and isfinite( self.capacities.values ).any(): return None
+        return analyse( self.costs.values, self.plant_supply.values, self.city_requirements.values, self.solution )
+
+def needs_job( transportation: Transportation, job_size: int ):
+    # Large instances and fixed-charge searches are solved in background jobs, never inside a request
+    return transportation.costs.size > job_size or transportation.fixed_costs is not None
+
+def solve_job( transportation: Transportation, limits: dict ):
+    # Runs in a background job process, which starts without the server's solver limits; the solved model is sent
+    # back to the session, fixed-charge searches report their best plan and bound on the way
+    configure( **limits )
+    transportation.solve( progress = lambda objective, bound, nodes: report( objective = objective, bound = bound, nodes = nodes ) )
+    return transportation
+
+class FigureMemo:
+    # Rendered figures and page statistics, rebuilt only when the model or its solution changes
+    def __init__( self, max_entries: int = 64 ):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits, self.misses = 0, 0
+        self.lock = Lock()
+
+    def get( self, transportation: Transportation, name: str, build, *args ):
+        key = ( transportation.uid, transportation.version, transportation.solved_version, name ) + args
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end( key )
+                self.hits += 1
+                return self.entries[ key ]
+            self.misses += 1
+        with phase( name ):
+            value = build( transportation, *args )
+        with self.lock:
+            self.entries[ key ] = value
+            while len( self.entries ) > self.max_entries: self.entries.popitem( last=False )
+        return value
+
+    def clear( self ):
+        with self.lock: self.entries.clear()
+
+    def stats( self ):
+        return { 'entries': len( self.entries ), 'hits': self.hits, 'misses': self.misses }
+
+FIGURE_MEMO = FigureMemo()
+# Coalesces the solves of every page in this process
+SCHEDULER = SolveScheduler()
+stats_metrics( 'optikwh_solution_cache', SOLUTION_CACHE.stats, 'Solution cache hits and misses.', 'Solution cache entries and bytes.' )
+stats_metrics( 'optikwh_figure_memo', FIGURE_MEMO.stats, 'Memoized figure hits and misses.', 'Memoized figure entries.' )
+stats_metrics( 'optikwh_scheduler', SCHEDULER.stats, 'Solve requests solved, skipped as unchanged and dropped as stale.' )
+
+class Sessions:
+    # Per session models in a server side store, so every worker process sees the same state
+    def __init__( self, factory, store = None ):
+        self.factory = factory
+        self.store = store if store is not None else MemoryStore()
+
+    def load( self, session: str ):
+        transportation = self.store.get( session ) if session else None
+        if transportation is None:
+            transportation = self.factory()
+            if session: self.store.put( session, transportation )
+        return transportation
+
+    @contextmanager
+    def edit( self, session: str ):
+        # Load, change and save one session while no other request can write it
+        with self.store.lock( session ):
+            transportation = self.load( session )
+            yield transportation
+            self.store.put( session, transportation )
+
+    def save_solution( self, session: str, solved: Transportation ):
+        # Solves run outside the session lock; the result is kept only if the model was not edited meanwhile
+        with self.store.lock( session ):
+            transportation = self.load( session )
+            if transportation.version != solved.solved_version or transportation.solved_version == solved.solved_version: 
+                return transportation
+            self.store.put( session, solved )
+            return solved
 
-        self.problem = problem
-        self.kwh = kwh
-        self.supply = get_supply( kwh )
-    
 class Citybag:
 
     def __init__( self, transportation: Transportation ):
@@ -133,44 +403,44 @@ class Citybag:
         self.set( transportation )
 
     def set( self, transportation: Transportation ):
-        self.cities = DataFrame([
-            dict( CITIES[ CITIES['city'] == city].iloc[0]) 
-            if city in CITIES['city'].values 
-            else {'city': city, 'lat': 0.0, 'lng': 0.0} 
-            for city in transportation.city_requirements.index
-        ])
-
-        self.plants = DataFrame([
-            dict( CITIES[ CITIES['city'] == city].iloc[0]) 
-            if city in CITIES['city'].values 
-            else {'city': city, 'lat': 0.0, 'lng': 0.0} 
-            for city in transportation.plant_supply.index
-        ])
+        # Unknown names are placed at (0, 0)
+        names = list( transportation.city_requirements.index )
+        lat, lng = GAZETTEER.coordinates( names )
+        self.cities = DataFrame({ 'city': names, 'lat': lat, 'lng': lng })
+
+        names = list( transportation.plant_supply.index )
+        lat, lng = GAZETTEER.coordinates( names )
+        self.plants = DataFrame({ 'city': names, 'lat': lat, 'lng': lng })
     
     def get( self, idx: int ):
         return dict( self.cities.iloc[ idx ] )
 
-def save_uploaded_file( filename: str, content ):
-    temp_dir = tempfile.mkdtemp()
-    file_extension = filename.split('.')[-1]
-    temp_file_path = os.path.join(temp_dir, f"temp.{file_extension}")
-    with open(temp_file_path, 'wb') as f:
-        f.write(base64.b64decode(content))
-    return temp_file_path
+def no_plan_heading( title: str, graph: str ):
+    # Result pages of a model without a plan; the page's main graph stays so its callback has an output
+    return html.Div([
+        html.H2( title, style={ 'text-align':'center' } ),
+        html.Hr(),
+        dbc.Alert( [ html.I(className="bi bi-x-octagon-fill me-2"), 'There is no optimal plan for the current inputs.' ], color='danger' ),
+        dcc.Graph( id=graph )
+    ], style={ 'margin':'32px' } )
 
-def get_supply( kwh: array ):
-    return array([ [ value(item) for item in column ] for column in kwh ])
+def _cell( value ):
+    return float( value ) if value is not None and isfinite( value ) else None
 
 def get_max( items: array, index: list ):
-    idx = argmax( items )
+    idx = nanargmax( items )
     return index[ idx ], items[ idx ]
 
 def get_min( items: array, index: list ):
-    idx = argmin( items )
+    idx = nanargmin( items )
     return index[ idx ], items[ idx ]
 
-def calculate_money_spent( supply: array, costs: array ):
-    return sum(supply * costs, axis=0)
+def calculate_money_spent( supply: array, costs: array, axis: int = 0 ):
+    return sum(supply * where( isfinite( costs ), costs, 0 ), axis=axis)
+
+def calculate_average_cost( costs: array, axis: int = 0 ):
+    # Missing routes do not count towards the average
+    return nanmean( where( isfinite( costs ), costs, float('nan') ), axis=axis )
 
 def calculate_energy_sent( supply: array, max_supply: array ):
     return ((supply.T / max_supply) * 100 ).T